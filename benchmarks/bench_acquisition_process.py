@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+采集进程基准：保存负载下的通知处理延迟
+按设备包速率 (默认 100 包/秒) 定时投递模拟数据包，经过与 BleReceiver 相同的重组 -> 解码 -> 写共享内存路径，
+记录每个包从预定到达时刻到处理完成的延迟。同时在主进程中运行保存负载 (大数组转 CSV 写盘) 与
+一个按 EEGLogger 方式读取共享内存的录制线程。
+
+    thread  : 接收循环与保存负载位于同一进程 (现有方式)
+    process : 接收循环位于独立的采集进程 (AcquisitionProcess 方式)
+
+运行: python benchmarks/bench_acquisition_process.py [--seconds 10] [--save-rows 200000]
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from external_modules.ble_transport import SIMULATED_SYNC, SimulatedHeadset, SimulationConfig  # noqa: E402
+from external_modules.packet_ring import PacketRingBuffer  # noqa: E402
+from external_modules.shm_ring import RingInlet, SharedSampleRing  # noqa: E402
+
+DEVICE = "SIM_MSM"
+
+
+def make_packets(seconds):
+    headset = SimulatedHeadset(DEVICE, SimulationConfig(seed=0))
+    n = int(seconds * headset.packet_rate)
+    return [headset.next_packet() for _ in range(n)], 1.0 / headset.packet_rate
+
+
+def run_receiver(packets, interval, ring_name):
+    """按计划时刻逐包处理，返回每包延迟 (秒)"""
+    profile = SimulatedHeadset(DEVICE, SimulationConfig()).profile
+    packet_ring = PacketRingBuffer(profile.data_length, sync_word=SIMULATED_SYNC)
+    decoder = profile.make_decoder()
+    ring = SharedSampleRing.attach(ring_name)
+    sample_period = 1.0 / ring.sample_rate
+
+    async def main():
+        latencies = np.empty(len(packets))
+        t0 = time.perf_counter() + 0.1
+        for i, data in enumerate(packets):
+            target = t0 + i * interval
+            delay = target - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            packet_ring.feed(data)
+            for frame in packet_ring.frames():
+                chunk = np.ascontiguousarray(decoder.decode(frame).T, dtype=np.float32)
+                now = time.perf_counter()
+                ring.write(chunk, now - np.arange(len(chunk) - 1, -1, -1) * sample_period)
+            latencies[i] = time.perf_counter() - target
+        return latencies
+
+    try:
+        return asyncio.run(main())
+    finally:
+        ring.close()
+
+
+def _child(packets, interval, ring_name, result_queue):
+    result_queue.put(run_receiver(packets, interval, ring_name))
+
+
+def save_load(stop_event, rows, stats):
+    """模拟 EEGLogger._save_to_file：list -> 数组 -> 除以 120 -> CSV"""
+    try:
+        import pandas as pd
+    except ImportError:
+        pd = None
+    rng = np.random.default_rng(1)
+    data = rng.integers(-(1 << 23), 1 << 23, size=(rows, 9)).tolist()
+    path = os.path.join(tempfile.gettempdir(), f"bench_save_{os.getpid()}.csv")
+    while not stop_event.is_set():
+        arr = np.array(data) / 120.0
+        if pd is not None:
+            pd.DataFrame(arr).to_csv(path)
+        else:
+            np.savetxt(path, arr, delimiter=",")
+        stats['saves'] += 1
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def recorder(stop_event, ring, stats):
+    """按 EEGLogger._bg_loop 的方式持续拉取共享内存"""
+    inlet = RingInlet(ring)
+    while not stop_event.is_set():
+        chunk, _ = inlet.pull_chunk(timeout=0.2)
+        stats['samples'] += len(chunk)
+
+
+def run_mode(mode, packets, interval, save_rows):
+    ring = SharedSampleRing(channels=9, capacity=500 * 30, sample_rate=500.0)
+    stop_event = threading.Event()
+    stats = {'saves': 0, 'samples': 0}
+    threads = [threading.Thread(target=recorder, args=(stop_event, ring, stats), daemon=True)]
+    if save_rows:
+        threads.append(threading.Thread(target=save_load, args=(stop_event, save_rows, stats), daemon=True))
+    try:
+        if mode == 'process':
+            ctx = multiprocessing.get_context('spawn')
+            result_queue = ctx.Queue()
+            proc = ctx.Process(target=_child, args=(packets, interval, ring.name, result_queue))
+            proc.start()
+            for t in threads:
+                t.start()
+            latencies = result_queue.get()
+            proc.join()
+        else:
+            for t in threads:
+                t.start()
+            latencies = run_receiver(packets, interval, ring.name)
+        stop_event.set()
+        for t in threads:
+            t.join()
+    finally:
+        ring.close()
+        ring.unlink()
+    return latencies * 1e3, stats
+
+
+def report(label, latencies, stats):
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    late = (latencies > 10.0).mean() * 100
+    print(f"{label:<22} p50={p50:6.2f}ms  p95={p95:6.2f}ms  p99={p99:7.2f}ms  "
+          f"max={latencies.max():7.2f}ms  >10ms={late:5.1f}%  "
+          f"saves={stats['saves']}  recorded={stats['samples']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=10.0, help="每种模式的投递时长")
+    parser.add_argument("--save-rows", type=int, default=200000, help="每次保存的采样点数 (0 关闭保存负载)")
+    args = parser.parse_args()
+
+    packets, interval = make_packets(args.seconds)
+    print(f"{len(packets)} packets at {1 / interval:.0f} packets/s, save load {args.save_rows} rows, "
+          f"cpus={os.cpu_count()}")
+    for mode in ('thread', 'process'):
+        report(f"{mode} / idle", *run_mode(mode, packets, interval, 0))
+        report(f"{mode} / save load", *run_mode(mode, packets, interval, args.save_rows))
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+波形预览数据通路基准
+按 LSL pull_chunk 的节奏 (每块 10 个采样点) 模拟一段录制，比较每秒数据的显示开销:
+    queue : 旧 xw_web_C8 写法，每次循环把段内累积数据 np.array(...) / 120 pickle 后放入 multiprocessing.Queue
+            (此处只计 pickle.dumps + pickle.loads，不含管道传输；30 秒分段后清零)
+    shm   : DisplayStream 写入共享内存 -> DisplayReader 按 30 fps 读取新增采样 -> min/max 抽取到屏幕宽度
+输出各自的 CPU 占比与每秒经过 pickle 的数据量。
+
+运行: python benchmarks/bench_display_stream.py [--seconds 60] [--rate 500] [--channels 9] [--width 1600]
+"""
+
+import argparse
+import os
+import pickle
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from external_modules.display_stream import DisplayReader, DisplayStream  # noqa: E402
+
+CHUNK = 10
+SEGMENT_SECONDS = 30
+FPS = 30
+
+
+def chunks(n_samples, channels, rate):
+    rng = np.random.default_rng(0)
+    block = rng.integers(-(1 << 23), 1 << 23, size=(1000, channels)).astype(np.float64)
+    for start in range(0, n_samples, CHUNK):
+        i = start % 1000
+        yield block[i:i + CHUNK].tolist(), [(start + j) / rate for j in range(CHUNK)]
+
+
+def run_queue(n_samples, channels, rate):
+    eeg_data = []
+    pickled = 0
+    t0 = time.process_time()
+    for sample, timestamps in chunks(n_samples, channels, rate):
+        eeg_data = eeg_data + sample
+        payload = pickle.dumps(np.array(eeg_data) / 120)
+        pickle.loads(payload)
+        pickled += len(payload)
+        if timestamps[-1] % SEGMENT_SECONDS < CHUNK / rate:
+            eeg_data = []
+    return time.process_time() - t0, pickled
+
+
+def run_shm(n_samples, channels, rate, width):
+    stream = DisplayStream(sample_rate=rate)
+    reader = DisplayReader(stream)
+    next_frame = 0.0
+    frames = 0
+    t0 = time.process_time()
+    try:
+        for sample, timestamps in chunks(n_samples, channels, rate):
+            stream.write(sample, timestamps)
+            if timestamps[-1] >= next_frame:
+                next_frame += 1.0 / FPS
+                if reader.poll():
+                    reader.decimated(width)
+                    frames += 1
+        return time.process_time() - t0, frames
+    finally:
+        stream.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=60.0)
+    parser.add_argument("--rate", type=int, default=500)
+    parser.add_argument("--channels", type=int, default=9)
+    parser.add_argument("--width", type=int, default=1600)
+    args = parser.parse_args()
+
+    n = int(args.seconds * args.rate)
+    q_cpu, q_bytes = run_queue(n, args.channels, args.rate)
+    s_cpu, frames = run_shm(n, args.channels, args.rate, args.width)
+    print(f"{args.seconds:g} s @ {args.rate} Hz x {args.channels} ch, chunks of {CHUNK}")
+    print(f"{'path':<7}{'CPU':>10}{'CPU share':>12}{'pickled/s':>14}")
+    print(f"{'queue':<7}{q_cpu:>9.2f}s{q_cpu / args.seconds * 100:>11.1f}%"
+          f"{q_bytes / args.seconds / 1e6:>12.1f}MB")
+    print(f"{'shm':<7}{s_cpu:>9.2f}s{s_cpu / args.seconds * 100:>11.1f}%{0:>12.1f}MB  ({frames} frames)")
+    print(f"display CPU x{q_cpu / s_cpu:.0f} lower")
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+帧解码微基准
+对比原 notification_handler 中的逐点 int.from_bytes 循环与 FrameDecoder 的向量化解码，
+并校验两者输出逐位一致。
+
+运行: python benchmarks/bench_frame_decoder.py [--packets 2000] [--batch 20]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from external_modules.frame_decoder import FrameDecoder, SAMPLES_PER_FRAME  # noqa: E402
+
+# (名称, data_length, head_len, single_frame, trigger_length)
+LAYOUTS = [
+    ("BCI_BLE", 144, 2, 24, SAMPLES_PER_FRAME),
+    ("MSM", 140, 3, 24, 1),
+]
+CHANNEL_NUM = 8
+
+
+def legacy_decode(data, channel_num, head_len, single_frame, trigger_length):
+    """原 notification_handler 中的解码循环（仅去掉推流部分）"""
+    data_eeg = data[head_len: head_len + single_frame * SAMPLES_PER_FRAME]
+    trigger_start = head_len + single_frame * SAMPLES_PER_FRAME
+    data_trigger = data[trigger_start: trigger_start + trigger_length]
+    raw_data_one_frame = np.zeros([channel_num + 1, SAMPLES_PER_FRAME])
+    for frame_idx in range(0, SAMPLES_PER_FRAME):
+        for ch_idx in range(0, channel_num):
+            raw_data_one_frame[ch_idx][frame_idx] = int.from_bytes(
+                data_eeg[(3 * ch_idx + single_frame * frame_idx):(3 * ch_idx + single_frame * frame_idx + 3)],
+                byteorder="big", signed=True)
+        if trigger_length == SAMPLES_PER_FRAME:
+            raw_data_one_frame[channel_num][frame_idx] = int.from_bytes(
+                data_trigger[frame_idx: frame_idx + 1], byteorder="big", signed=False)
+        else:
+            raw_data_one_frame[channel_num][frame_idx] = int.from_bytes(
+                data_trigger, byteorder="big", signed=False)
+    return raw_data_one_frame
+
+
+def run(n_packets, batch):
+    rng = np.random.default_rng(0)
+    for name, data_length, head_len, single_frame, trigger_length in LAYOUTS:
+        payload = rng.integers(0, 256, size=(n_packets, data_length), dtype=np.uint8)
+        packets = [bytes(row) for row in payload]
+        decoder = FrameDecoder(CHANNEL_NUM, data_length, head_len, single_frame, trigger_length)
+
+        t0 = time.perf_counter()
+        legacy = [legacy_decode(list(p), CHANNEL_NUM, head_len, single_frame, trigger_length) for p in packets]
+        t_legacy = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        single = [decoder.decode(p) for p in packets]
+        t_single = time.perf_counter() - t0
+
+        blob = payload.tobytes()
+        step = batch * data_length
+        t0 = time.perf_counter()
+        batched = [decoder.decode(blob[i:i + step]) for i in range(0, len(blob), step)]
+        t_batch = time.perf_counter() - t0
+
+        expected = np.concatenate(legacy, axis=1)
+        identical = (
+            np.array_equal(expected.astype(np.int32), np.concatenate(single, axis=1))
+            and np.array_equal(expected.astype(np.int32), np.concatenate(batched, axis=1))
+            # legacy 输出为 float64，确认转换前后数值完全一致
+            and np.array_equal(expected, np.concatenate(single, axis=1).astype(np.float64))
+        )
+
+        print(f"[{name}] packets={n_packets} channels={CHANNEL_NUM}")
+        print(f"  legacy loop     : {t_legacy / n_packets * 1e6:8.2f} us/packet")
+        print(f"  vectorized      : {t_single / n_packets * 1e6:8.2f} us/packet "
+              f"(x{t_legacy / t_single:.1f})")
+        print(f"  vectorized x{batch:<3d}: {t_batch / n_packets * 1e6:8.2f} us/packet "
+              f"(x{t_legacy / t_batch:.1f})")
+        print(f"  bit-identical   : {identical}")
+        if not identical:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--packets", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=20, help="批量解码时每批包含的数据包数")
+    args = parser.parse_args()
+    run(args.packets, args.batch)
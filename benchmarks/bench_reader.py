@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+数据集加载基准：eeg_reader (memmap) 与整文件读取 CSV
+生成 N 个被试 x M 首歌 (500Hz, 8 EEG + trigger) 的实验文件夹并登记到 catalog，比较:
+    eeg_reader: open_dataset(song=...) 打开全部被试 -> 每首歌读取一个 10 秒窗口 + events
+    csv       : 旧分析流程，逐文件整表读取 (pandas.read_csv，未安装时 np.genfromtxt)，
+                只实际读取 --csv-files 个文件，按单文件耗时推算整个数据集
+
+运行: python benchmarks/bench_reader.py [--subjects 60] [--songs 4] [--minutes 3] [--dir /tmp]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from external_modules import eeg_recording  # noqa: E402
+from external_modules.eeg_reader import open_dataset  # noqa: E402
+from external_modules.session_catalog import SessionCatalog  # noqa: E402
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+SAMPLE_RATE = 500
+SONGS = ["江南", "晴天", "稻香", "夜曲", "七里香", "青花瓷"]
+
+
+def build_dataset(root, subjects, songs, minutes):
+    rng = np.random.default_rng(0)
+    n = int(minutes * 60 * SAMPLE_RATE)
+    counts = rng.integers(-(1 << 23), 1 << 23, size=(n, 9), dtype=np.int32)
+    counts[:, -1] = 0
+    counts[::5000, -1] = 7
+    catalog = SessionCatalog(root)
+    csv_paths = []
+    for _ in range(subjects):
+        folder = catalog.allocate_session(day="0101")
+        for i in range(songs):
+            base = os.path.join(folder, f"Category_{i + 1}_{SONGS[i % len(SONGS)]}")
+            eeg_recording.write_recording(base + eeg_recording.EXTENSION, counts, SAMPLE_RATE, duration=n / SAMPLE_RATE)
+            catalog.add_eegrec(base + eeg_recording.EXTENSION)
+            csv_paths.append(base + ".csv")
+    return counts, csv_paths
+
+
+def bench_reader(root, song):
+    t0 = time.perf_counter()
+    recordings = open_dataset(root, song=song)
+    t_open = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    total = 0
+    for rec in recordings:
+        window = rec.get_data(60, 70)
+        total += window.shape[1] + len(rec.events)
+    t_window = time.perf_counter() - t0
+    return len(recordings), t_open, t_window
+
+
+def bench_csv(counts, csv_paths, files):
+    arr = counts / 120.0
+    for path in csv_paths[:files]:
+        if pd is not None:
+            pd.DataFrame(arr).to_csv(path)
+        else:
+            np.savetxt(path, np.column_stack([np.arange(len(arr)), arr]), delimiter=",",
+                       header="," + ",".join(str(i) for i in range(arr.shape[1])), comments="")
+    t0 = time.perf_counter()
+    for path in csv_paths[:files]:
+        if pd is not None:
+            pd.read_csv(path, index_col=0).to_numpy()
+        else:
+            np.genfromtxt(path, delimiter=",", skip_header=1)
+    return (time.perf_counter() - t0) / files
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subjects", type=int, default=60)
+    parser.add_argument("--songs", type=int, default=4)
+    parser.add_argument("--minutes", type=float, default=3.0)
+    parser.add_argument("--csv-files", type=int, default=2)
+    parser.add_argument("--dir", default=tempfile.gettempdir())
+    args = parser.parse_args()
+
+    root = os.path.join(args.dir, "bench_reader_offlinedata")
+    shutil.rmtree(root, ignore_errors=True)
+    try:
+        counts, csv_paths = build_dataset(root, args.subjects, args.songs, args.minutes)
+        n_rec, t_open, t_window = bench_reader(root, SONGS[0])
+        per_csv = bench_csv(counts, csv_paths, args.csv_files)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print(f"{args.subjects} subjects x {args.songs} songs, {args.minutes:g} min each "
+          f"(CSV reader: {'pandas' if pd is not None else 'np.genfromtxt'})")
+    print(f"eeg_reader: song '{SONGS[0]}' -> {n_rec} recordings, open {t_open * 1e3:.1f} ms, "
+          f"10 s window + events {t_window * 1e3:.1f} ms")
+    print(f"csv       : {per_csv:.2f} s per file -> {per_csv * n_rec:.1f} s for the same song, "
+          f"{per_csv * len(csv_paths):.1f} s for the whole dataset")
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+xw_web_C8.received_data 采集循环基准
+按 LSL pull_chunk 的形式 (list of lists，每块 10 个采样点) 送入一段 30 秒数据，比较每段的 CPU 耗时:
+    old: eeg_data = eeg_data + sample，每次循环把整段累积数据 np.array(...) / 120 送往显示队列
+    new: SampleBuffer 追加 + SampleRing 固定显示窗口，显示按 DISPLAY_FPS 限频 (按模拟时间计)
+同时给出段末 (最慢) 100 次循环的平均耗时，old 随段内时间线性增长。
+
+运行: python benchmarks/bench_received_data.py [--rate 500] [--channels 9] [--seconds 30]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from external_modules.sample_buffer import SampleBuffer, SampleRing  # noqa: E402
+
+CHUNK = 10
+DISPLAY_SECONDS = 10
+DISPLAY_FPS = 30
+
+
+def chunks(n_samples, channels):
+    rng = np.random.default_rng(0)
+    block = rng.integers(-(1 << 23), 1 << 23, size=(1000, channels)).astype(np.float64)
+    for start in range(0, n_samples, CHUNK):
+        i = start % 1000
+        yield block[i:i + CHUNK].tolist(), [start + j for j in range(CHUNK)]
+
+
+def run_old(n_samples, channels):
+    times = []
+    eeg_data = []
+    for sample, timestamps in chunks(n_samples, channels):
+        t0 = time.perf_counter()
+        eeg_data = eeg_data + sample
+        display = np.array(eeg_data) / 120
+        times.append(time.perf_counter() - t0)
+    del display
+    return np.array(times)
+
+
+def run_new(n_samples, channels, rate):
+    times = []
+    buffer = SampleBuffer(capacity=int(n_samples * 1.2))
+    ring = SampleRing(rate * DISPLAY_SECONDS)
+    next_display = 0.0
+    for sample, timestamps in chunks(n_samples, channels):
+        t0 = time.perf_counter()
+        buffer.extend(sample, timestamps)
+        ring.extend(sample)
+        sim_time = timestamps[-1] / rate
+        if sim_time >= next_display:
+            next_display = sim_time + 1.0 / DISPLAY_FPS
+            display = ring.latest() / 120
+        times.append(time.perf_counter() - t0)
+    buffer.take()
+    return np.array(times)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rate", type=int, default=500)
+    parser.add_argument("--channels", type=int, default=9)
+    parser.add_argument("--seconds", type=float, default=30.0)
+    args = parser.parse_args()
+
+    n = int(args.seconds * args.rate)
+    old = run_old(n, args.channels)
+    new = run_new(n, args.channels, args.rate)
+    print(f"{len(old)} chunks per {args.seconds:g} s segment @ {args.rate} Hz x {args.channels} ch")
+    print(f"{'loop':<6}{'total CPU':>12}{'first 100':>14}{'last 100':>14}{'CPU share':>12}")
+    for name, t in (("old", old), ("new", new)):
+        print(f"{name:<6}{t.sum():>11.2f}s{t[:100].mean() * 1e3:>12.3f}ms{t[-100:].mean() * 1e3:>12.3f}ms"
+              f"{t.sum() / args.seconds * 100:>11.1f}%")
+    print(f"segment CPU x{old.sum() / new.sum():.0f} lower")
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+录制格式基准：CSV 与 .eegrec 二进制格式
+对 1 小时 9 通道 (8 EEG + trigger) 500Hz 数据，比较写入耗时、读取耗时与文件大小。
+CSV 使用旧版 EEGLogger 的写法 (除以 120 后 pd.DataFrame.to_csv)；未安装 pandas 时改用 np.savetxt。
+
+运行: python benchmarks/bench_recording_format.py [--minutes 60] [--dir /tmp]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from external_modules import eeg_recording  # noqa: E402
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+
+def make_counts(minutes, sample_rate=500, channels=9):
+    rng = np.random.default_rng(0)
+    n = int(minutes * 60 * sample_rate)
+    counts = rng.integers(-(1 << 23), 1 << 23, size=(n, channels), dtype=np.int32)
+    counts[:, -1] = 0
+    counts[::5000, -1] = 7
+    return counts
+
+
+def bench_csv(counts, path):
+    t0 = time.perf_counter()
+    arr = counts / 120.0
+    if pd is not None:
+        pd.DataFrame(arr).to_csv(path)
+    else:
+        np.savetxt(path, arr, delimiter=",")
+    t_write = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    if pd is not None:
+        loaded = pd.read_csv(path, index_col=0).to_numpy()
+    else:
+        loaded = np.loadtxt(path, delimiter=",")
+    t_read = time.perf_counter() - t0
+    max_err = float(np.abs(loaded * 120.0 - counts).max())
+    return t_write, t_read, os.path.getsize(path), max_err
+
+
+def bench_binary(counts, path, sample_rate=500):
+    t0 = time.perf_counter()
+    eeg_recording.write_recording(path, counts, sample_rate, first_timestamp=0.0)
+    t_write = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    header, mm = eeg_recording.open_recording(path)
+    loaded = eeg_recording.to_physical(mm, header, scale_trigger=True)
+    t_read = time.perf_counter() - t0
+    max_err = float(np.abs(loaded * 120.0 - counts).max())
+
+    # 随机读取 10 秒窗口：memmap 只触及所需页面
+    t0 = time.perf_counter()
+    header, mm = eeg_recording.open_recording(path)
+    start = len(mm) // 2
+    window = np.asarray(mm[start:start + 10 * sample_rate])
+    t_window = time.perf_counter() - t0
+    del mm, window
+    return t_write, t_read, os.path.getsize(path), max_err, t_window
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--minutes", type=float, default=60.0)
+    parser.add_argument("--dir", default=tempfile.gettempdir())
+    args = parser.parse_args()
+
+    counts = make_counts(args.minutes)
+    csv_path = os.path.join(args.dir, "bench_recording.csv")
+    bin_path = os.path.join(args.dir, "bench_recording" + eeg_recording.EXTENSION)
+    print(f"{len(counts)} samples x {counts.shape[1]} channels ({args.minutes:g} min @ 500 Hz), "
+          f"CSV writer: {'pandas' if pd is not None else 'np.savetxt'}")
+    try:
+        c_write, c_read, c_size, c_err = bench_csv(counts, csv_path)
+        b_write, b_read, b_size, b_err, b_window = bench_binary(counts, bin_path)
+    finally:
+        for path in (csv_path, bin_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    print(f"{'format':<8}{'write':>10}{'read':>10}{'size':>12}{'max |err| (counts)':>22}")
+    print(f"{'csv':<8}{c_write:>9.2f}s{c_read:>9.2f}s{c_size / 1e6:>10.1f}MB{c_err:>22.3g}")
+    print(f"{'eegrec':<8}{b_write:>9.2f}s{b_read:>9.2f}s{b_size / 1e6:>10.1f}MB{b_err:>22.3g}")
+    print(f"speedup write x{c_write / b_write:.0f}, read x{c_read / b_read:.0f}, size 1/{c_size / b_size:.1f}; "
+          f"10 s window via memmap: {b_window * 1e3:.2f} ms")
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+录制缓冲区内存基准
+模拟 EEGLogger 以 10 个采样点为一块从 LSL 拉取 (pull_chunk 返回 list of lists) 一首 10 分钟、
+1 kHz、16 通道 + trigger 的歌曲，比较:
+    list       : 旧写法 buffer.extend(chunk) -> list(buffer) -> np.array(data) / 120
+    SampleBuffer: int32 预分配缓冲区 -> take() 交出视图 -> 写文件前无需再转换
+统计录制结束时缓冲区占用 (tracemalloc current) 与停止保存阶段的峰值。
+
+运行: python benchmarks/bench_sample_buffer.py [--minutes 10] [--rate 1000] [--channels 16]
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from external_modules.sample_buffer import SampleBuffer  # noqa: E402
+
+CHUNK = 10
+
+
+def chunks(n_samples, columns):
+    rng = np.random.default_rng(0)
+    block = rng.integers(-(1 << 23), 1 << 23, size=(1000, columns)).astype(np.float32)
+    for start in range(0, n_samples, CHUNK):
+        i = start % 1000
+        # 与 pylsl 一样每次产生新的 Python float 对象
+        yield block[i:i + CHUNK].tolist()
+
+
+def run_list(n_samples, columns):
+    buffer = []
+    t0 = time.perf_counter()
+    for chunk in chunks(n_samples, columns):
+        buffer.extend(chunk)
+    t_record = time.perf_counter() - t0
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    t0 = time.perf_counter()
+    data_to_save = list(buffer)     # stop_recording
+    buffer = []
+    arr = np.array(data_to_save) / 120.0    # _save_to_file
+    t_stop = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    del data_to_save, arr, buffer
+    return t_record, t_stop, retained, peak
+
+
+def run_sample_buffer(n_samples, columns, rate):
+    buffer = SampleBuffer(capacity=rate * 60)
+    t0 = time.perf_counter()
+    for chunk in chunks(n_samples, columns):
+        buffer.extend(chunk)
+    t_record = time.perf_counter() - t0
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    t0 = time.perf_counter()
+    counts, timestamps = buffer.take()  # stop_recording：交出视图，无复制
+    t_stop = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    grow_count = buffer.grow_count
+    del counts, timestamps, buffer
+    return t_record, t_stop, retained, peak, grow_count
+
+
+def measure(func, *args):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        return func(*args)
+    finally:
+        tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--minutes", type=float, default=10.0)
+    parser.add_argument("--rate", type=int, default=1000)
+    parser.add_argument("--channels", type=int, default=16)
+    args = parser.parse_args()
+
+    n = int(args.minutes * 60 * args.rate)
+    columns = args.channels + 1
+    raw = n * columns * 4
+    print(f"{n} samples x {columns} columns ({args.minutes:g} min @ {args.rate} Hz), "
+          f"raw int32 size {raw / 1e6:.1f} MB")
+
+    l_rec, l_stop, l_ret, l_peak = measure(run_list, n, columns)
+    s_rec, s_stop, s_ret, s_peak, grows = measure(run_sample_buffer, n, columns, args.rate)
+
+    print(f"{'buffer':<14}{'retained':>12}{'stop peak':>12}{'record':>10}{'stop+convert':>14}")
+    print(f"{'list':<14}{l_ret / 1e6:>10.1f}MB{l_peak / 1e6:>10.1f}MB{l_rec:>9.2f}s{l_stop:>13.3f}s")
+    print(f"{'SampleBuffer':<14}{s_ret / 1e6:>10.1f}MB{s_peak / 1e6:>10.1f}MB{s_rec:>9.2f}s{s_stop:>13.3f}s")
+    print(f"retained x{l_ret / s_ret:.1f} smaller, stop peak x{l_peak / s_peak:.1f} smaller, "
+          f"{grows} geometric grow(s)")
@@ -14,24 +14,36 @@ from PyQt6.QtCore import QThread, pyqtSignal
 
 try:
     from external_modules.ble_receive_eeg_trigger import BleReceiver
+    from external_modules.multi_device import MultiDeviceAcquisition, format_stats
+    from external_modules.acquisition_process import AcquisitionProcess
 except ImportError:
     BleReceiver = None
+    MultiDeviceAcquisition = None
+    AcquisitionProcess = None
 
 logger = logging.getLogger("BLEWorker")
 
 class BLEWorker(QThread):
     """
     后台线程，负责运行 asyncio 事件循环，处理 BLE 连接和通信
+    device_name 可为逗号分隔的多个设备名，此时在同一事件循环中并发采集所有设备
+    use_process 为 True 时 (仅单设备) 接收与解码在独立进程中运行，数据经共享内存读取
     """
     status_changed = pyqtSignal(str)  # 状态更新信号
     connection_success = pyqtSignal(bool) # 连接结果信号
 
-    def __init__(self, device_name: str, log_path: str):
+    def __init__(self, device_name: str, log_path: str, capture_path: Optional[str] = None,
+                 use_process: bool = False):
         super().__init__()
         self.device_name = device_name
+        self.device_names = [name.strip() for name in device_name.split(',') if name.strip()]
         self.log_path = log_path
+        self.capture_path = capture_path
         self.loop = None
         self.receiver: Optional[BleReceiver] = None
+        self.manager: Optional[MultiDeviceAcquisition] = None
+        self.use_process = use_process
+        self.acquisition: Optional[AcquisitionProcess] = None
         self.running = True
         self.connected = False
 
@@ -41,13 +53,21 @@ class BLEWorker(QThread):
             self.status_changed.emit("错误: 无法导入 BleReceiver 模块")
             self.connection_success.emit(False)
             return
+        if len(self.device_names) > 1:
+            if self.use_process:
+                logger.warning("Acquisition process mode supports a single device, using in-process mode")
+            self._run_multi()
+            return
+        if self.use_process:
+            self._run_process()
+            return
 
         try:
             self.loop = asyncio.new_event_loop()
             asyncio.set_event_loop(self.loop)
             
             self.status_changed.emit(f"正在初始化 BLE 接收器 (设备: {self.device_name})...")
-            self.receiver = BleReceiver(self.device_name, self.log_path)
+            self.receiver = BleReceiver(self.device_name, self.log_path, capture_path=self.capture_path)
             
             self.status_changed.emit("正在扫描设备...")
             # 寻找设备
@@ -99,6 +119,41 @@ class BLEWorker(QThread):
 
             self.loop.run_until_complete(ble_main_task())
             
+        except Exception as e:
+            logger.error(f"BLE Error: {e}")
+            self.status_changed.emit(f"BLE 错误: {str(e)}")
+            self.connection_success.emit(False)
+        finally:
+            if self.receiver:
+                self.receiver.close_capture()
+            if self.loop:
+                self.loop.close()
+
+    def _run_multi(self):
+        """多设备模式：由 MultiDeviceAcquisition 在同一事件循环中并发连接"""
+        try:
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+
+            self.status_changed.emit(f"正在初始化多设备采集 ({', '.join(self.device_names)})...")
+            self.manager = MultiDeviceAcquisition(self.device_names, self.log_path, capture_path=self.capture_path)
+
+            self.status_changed.emit("正在扫描设备...")
+            missing = self.loop.run_until_complete(self.manager.discover())
+            if len(missing) == len(self.device_names):
+                self.status_changed.emit("未找到设备，请检查设备是否开启")
+                self.connection_success.emit(False)
+                return
+            if missing:
+                self.status_changed.emit(f"部分设备未找到: {', '.join(missing)}")
+                logger.warning(f"Devices not found: {missing}")
+
+            self.connected = True
+            self.connection_success.emit(True)
+            self.status_changed.emit("已连接，正在接收数据...")
+            self.loop.run_until_complete(
+                self.manager.run(report_callback=lambda stats: self.status_changed.emit(format_stats(stats)))
+            )
         except Exception as e:
             logger.error(f"BLE Error: {e}")
             self.status_changed.emit(f"BLE 错误: {str(e)}")
@@ -107,26 +162,74 @@ class BLEWorker(QThread):
             if self.loop:
                 self.loop.close()
 
+    def _run_process(self):
+        """独立进程模式：转发采集进程的状态消息，直到进程退出"""
+        try:
+            self.status_changed.emit(f"正在启动采集进程 (设备: {self.device_name})...")
+            self.acquisition = AcquisitionProcess(self.device_name, self.log_path, self.capture_path)
+            self.acquisition.start()
+            while True:
+                for kind, value in self.acquisition.poll(timeout=0.2):
+                    if kind == 'status':
+                        self.status_changed.emit(value)
+                    elif kind == 'connected':
+                        self.connected = value
+                        if not value:
+                            self.status_changed.emit("未找到设备，请检查设备是否开启")
+                        self.connection_success.emit(value)
+                    elif kind == 'exit':
+                        return
+                if not self.running:
+                    self.acquisition.stop()
+                    return
+        except Exception as e:
+            logger.error(f"Acquisition process error: {e}")
+            self.status_changed.emit(f"BLE 错误: {str(e)}")
+            self.connection_success.emit(False)
+
+    def make_shared_inlet(self):
+        """独立进程模式下返回读取共享内存的 inlet，其他模式返回 None"""
+        if self.acquisition is None:
+            return None
+        return self.acquisition.make_inlet()
+
     def send_trigger(self, tag: int):
         """
         发送 Trigger 信号
         :param tag: 1-255 的整数
         """
-        if not self.connected or not self.loop or not self.receiver:
+        if self.acquisition is not None and self.connected:
+            logger.info(f"Forwarding trigger to acquisition process: {tag} (0x{tag:02X})")
+            self.acquisition.send_trigger(tag)
+            return
+        if not self.connected or not self.loop or not (self.receiver or self.manager):
             logger.warning("尝试发送 Trigger 但设备未连接")
             return
 
         data = bytearray([0xFF, tag])
         logger.info(f"Scheduling trigger send: {tag} (0x{tag:02X})")
-        
-        asyncio.run_coroutine_threadsafe(
-            self.receiver.send_control_command(data), 
-            self.loop
-        )
+
+        if self.manager:
+            coro = self.manager.send_trigger(tag)
+        else:
+            coro = self.receiver.send_control_command(data)
+        asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def get_link_stats(self, device_name: Optional[str] = None):
+        """返回接收端累计丢包计数，未连接或协议不含序号时返回 None"""
+        if self.manager:
+            return self.manager.get_link_stats(device_name or self.device_names[0])
+        if self.acquisition is not None:
+            return self.acquisition.link_stats
+        if not self.receiver:
+            return None
+        return self.receiver.get_link_stats()
 
     def stop(self):
         """停止线程"""
         self.running = False
+        if self.manager:
+            self.manager.stop(self.loop)
         if self.receiver:
             self.receiver.is_receiving = False
             if hasattr(self.receiver, 'event'):
@@ -4,28 +4,101 @@ import threading
 import logging
 import pandas as pd
 import numpy as np
-from pylsl import StreamInlet, resolve_stream
+from pylsl import StreamInlet, resolve_byprop, resolve_stream
+
+from external_modules.log_pipeline import ThroughputStats
+from external_modules import eeg_recording
+from external_modules.sample_buffer import SampleBuffer
+from external_modules.save_edf import BdfWriter
+from external_modules.session_catalog import SessionCatalog
+
+# 录制文件格式：'binary' 为 int32 原始计数 (.eegrec，可 memmap)，'csv' 为旧版除以 120 的 CSV
+RECORDING_FORMAT = 'binary'
+EXPORT_CSV = False  # binary 格式下是否额外导出一份 CSV
+# binary 格式下边录边写：数据块由专用写入线程追加到歌曲文件并定期 fsync，内存占用与歌曲长度无关
+STREAMING_WRITE = True
+# 额外写入整场实验的连续 BDF+ 文件 (24 位)，歌曲起止与 trigger 以标注形式保存，可直接导入 EEGLAB / MNE
+BDF_SESSION_ON = True
+# stop_recording(end_timestamp=...) 时等待该时刻之前的采样到达的最长时间 (秒)，超时后按已收到的数据结束
+DRAIN_TIMEOUT = 0.5
+# stop_recording(until_code=...) 时等待设备 trigger 写入数据的最长时间 (秒)，含蓝牙往返延迟
+TRIGGER_WAIT_TIMEOUT = 1.5
 
 # 配置日志
 logger = logging.getLogger("EEGLogger")
 
+class StreamRecorder:
+    """单个 LSL EEG 流的连接状态与录制缓冲"""
+
+    def __init__(self, device=None):
+        # device 为 None 时自动选择最佳 EEG 流 (单设备模式)，否则按 source_id 匹配对应设备
+        self.device = device
+        self.inlet = None
+        # 独立采集进程模式下读取共享内存的 inlet (RingInlet)，设置后不再解析 LSL 流
+        self.shared_inlet = None
+        self.buffer = SampleBuffer()  # 非流式写入时的 int32 录制缓冲
+        self.chunk_count = 0
+        self.sample_count = 0
+        self.last_data_time = 0.0
+        self.first_timestamp = None  # 本次录制首个采样点的 LSL 时间戳
+        self.markers = []  # 本次录制期间的事件标记 [(LSL 时间戳, trigger 码, 标签)]
+        self.drained = False  # 已收到时间戳不早于 EEGLogger.stop_at 的采样 (及 stop_code)
+        self.code_seen = False  # trigger 通道中已出现 EEGLogger.stop_code
+        self.writer = None  # 流式写入模式下本次录制的 RecordingWriter
+        self.session_writer = None  # 整场实验的 BdfWriter，第一首歌开始时创建
+        self.next_resolve_time = 0.0
+        # 可选：返回 BLE 接收端累计丢包计数 (dict) 的回调，用于按歌曲统计链路质量
+        self.link_stats_provider = None
+        self.link_stats_start = None
+
+    @property
+    def label(self):
+        return self.device or "default"
+
+    def file_name(self, base):
+        """多设备时每个设备单独一个文件: {base}_{设备名}"""
+        return f"{base}_{self.device}" if self.device else base
+
+    def read_link_stats(self):
+        """读取 BLE 接收端当前的累计丢包计数"""
+        if self.link_stats_provider is None:
+            return None
+        try:
+            return self.link_stats_provider()
+        except Exception as e:
+            logger.warning(f"Failed to read link stats ({self.label}): {e}")
+            return None
+
+    def link_stats_delta(self):
+        """计算本次录制期间的丢包计数增量"""
+        end = self.read_link_stats()
+        if not end or not self.link_stats_start:
+            return None
+        return {key: end[key] - self.link_stats_start.get(key, 0) for key in end}
+
+
 class EEGLogger:
-    def __init__(self, base_dir):
+    def __init__(self, base_dir, device_names=None):
         self.base_dir = base_dir
         self.save_path = None
+        self.catalog = None  # offlinedata/catalog.sqlite，分配实验文件夹并登记每个保存的录制文件
         self.is_recording = False
         self.stop_event = threading.Event()
         self.data_lock = threading.Lock() # 数据访问锁
         self.current_filename = "EEG_data" # 默认文件名
-        self.buffer = []
-        self.inlet = None
+        # 按音频结束时间截断：只保留时间戳不晚于 stop_at 的采样，各流都收到该时刻的数据后结束录制
+        self.stop_at = None
+        self.stop_code = None  # 不截断，继续录制直到 trigger 通道出现该码
+        self.stop_requested = 0.0
+        self.stop_deadline = 0.0
+        self.streams = self._make_streams(device_names)
         self.session_index = 0
-        self.session_chunk_count = 0
-        self.session_sample_count = 0
         self.bg_chunk_counter = 0
         self.last_chunk_log_time = 0.0
-        self.last_data_time = 0.0
         self.no_data_reconnect_sec = 1.5
+        self.sample_rate = eeg_recording.read_sample_rate()
+        # LSL 拉取吞吐量汇总 (每 10 秒一条)，代替逐块日志
+        self.pull_stats = ThroughputStats(logger, "EEG pull", interval=10.0, unit='chunks')
         
         # 初始化时就确定好保存路径，避免每次start_recording都新建
         self._setup_folder()
@@ -35,6 +108,46 @@ class EEGLogger:
         self.bg_thread.daemon = True
         self.bg_thread.start()
 
+    @staticmethod
+    def _make_streams(device_names):
+        if device_names and len(device_names) > 1:
+            return [StreamRecorder(name) for name in device_names]
+        return [StreamRecorder()]
+
+    @property
+    def inlet(self):
+        """单设备模式下的 LSL inlet；多设备时为第一个设备的 inlet"""
+        return self.streams[0].inlet
+
+    def set_devices(self, device_names):
+        """
+        设置需要录制的设备列表 (多于一个时每个设备分别录制到各自的文件)
+        已连接的同名流会被保留
+        """
+        with self.data_lock:
+            if self.is_recording:
+                logger.warning("Cannot change devices while recording")
+                return
+            new_streams = self._make_streams(device_names)
+            old = {rec.device: rec for rec in self.streams}
+            self.streams = [old.get(rec.device, rec) for rec in new_streams]
+        logger.info(f"EEG logger devices: {[rec.label for rec in self.streams]}")
+
+    def attach_inlet(self, inlet, device=None):
+        """使用外部提供的 inlet (例如采集进程的共享内存 RingInlet) 代替 LSL 流"""
+        for rec in self.streams:
+            if rec.device == device or len(self.streams) == 1:
+                rec.shared_inlet = inlet
+                rec.inlet = inlet
+                rec.last_data_time = time.time()
+        logger.info(f"EEG logger attached to shared inlet: {type(inlet).__name__}")
+
+    def set_link_stats_provider(self, provider, device=None):
+        """登记某个设备的丢包计数回调 (单设备模式 device 为 None)"""
+        for rec in self.streams:
+            if rec.device == device or len(self.streams) == 1:
+                rec.link_stats_provider = provider
+
     def start_recording(self, filename):
         """
         开始录制单首歌曲的数据 (线程安全)
@@ -48,21 +161,76 @@ class EEGLogger:
         with self.data_lock:
             self.session_index += 1
             self.current_filename = filename
-            self.buffer = [] # 清空缓存
             self.is_recording = True
             self.start_time = time.time() # 记录开始时间
-            self.session_chunk_count = 0
-            self.session_sample_count = 0
-            self.last_data_time = self.start_time
+            self.stop_at = None
+            self.stop_code = None
+            for rec in self.streams:
+                rec.buffer = SampleBuffer(capacity=int(self.sample_rate * 60)) # 清空缓存
+                rec.chunk_count = 0
+                rec.sample_count = 0
+                rec.last_data_time = self.start_time
+                rec.first_timestamp = None
+                rec.markers = []
+                rec.drained = False
+                rec.code_seen = False
+                rec.link_stats_start = rec.read_link_stats()
+                if BDF_SESSION_ON:
+                    if rec.session_writer is None:
+                        path = os.path.join(self.save_path,
+                                            rec.file_name(f"session_{time.strftime('%H%M%S')}") + ".bdf")
+                        rec.session_writer = BdfWriter(path, self.sample_rate, start_time=self.start_time)
+                        logger.info(f"BDF session recording: {path}")
+                    rec.session_writer.annotate(f"Song start: {filename}")
+                if self._streaming:
+                    path = os.path.join(self.save_path, rec.file_name(filename) + eeg_recording.EXTENSION)
+                    rec.writer = eeg_recording.RecordingWriter(path, self.sample_rate, start_time=self.start_time,
+                                                               device=rec.device)
         
-        if self.inlet is None:
-            logger.warning("EEG Stream not connected yet! Data may be lost.")
+        for rec in self.streams:
+            if rec.inlet is None:
+                logger.warning(f"EEG Stream not connected yet ({rec.label})! Data may be lost.")
         
         logger.info(
             f"EEG recording started for: {filename} | session={self.session_index} | save_path={self.save_path}"
         )
 
-    def _select_best_stream(self, streams):
+    def add_marker(self, label, code=None, timestamp=None):
+        """
+        记录一个事件标记 (EventMarker 的监听者，线程安全)
+        写入整场 BDF 的标注；录制中时保存歌曲文件后写入同名 .events.tsv，按时间戳定位到采样点
+        """
+        with self.data_lock:
+            for rec in self.streams:
+                if rec.session_writer is not None:
+                    rec.session_writer.annotate(label, timestamp=timestamp)
+                if self.is_recording and timestamp is not None:
+                    rec.markers.append((timestamp, code, label))
+
+    @property
+    def stop_pending(self):
+        """stop_recording(end_timestamp) 之后、等待音频结束前的数据到达期间为 True"""
+        return self.stop_at is not None
+
+    @property
+    def _streaming(self):
+        return STREAMING_WRITE and RECORDING_FORMAT == 'binary'
+
+    def close(self):
+        """结束录制并关闭整场实验的 BDF 文件 (程序退出前调用)"""
+        self.stop_recording()
+        with self.data_lock:
+            writers = [rec.session_writer for rec in self.streams if rec.session_writer is not None]
+            for rec in self.streams:
+                rec.session_writer = None
+        for writer in writers:
+            try:
+                writer.close()
+                logger.info(f"BDF session saved: {writer.path} ({writer.records} records)")
+            except Exception as e:
+                logger.error(f"Failed to close BDF session {writer.path}: {e}")
+
+    def _select_best_stream(self, streams, device=None):
         """从候选流中选择最可能是当前BLE推送的EEG流。"""
         if not streams:
             return None
@@ -71,21 +239,33 @@ class EEGLogger:
             score = 0
             if stream.type() == "EEG":
                 score += 10
-            if stream.name() == "TestStream":
-                score += 5
-            if stream.source_id() == "my EEG device":
-                score += 5
+            if device is not None:
+                if stream.source_id() != device:
+                    continue
+            else:
+                if stream.name() == "TestStream":
+                    score += 5
+                if stream.source_id() == "my EEG device":
+                    score += 5
             candidates.append((score, stream.created_at(), stream))
+        if not candidates:
+            return None
         candidates.sort(key=lambda x: (x[0], x[1]), reverse=True)
         return candidates[0][2]
 
-    def _connect_inlet(self):
+    def _connect_inlet(self, rec):
         """解析并连接LSL流，返回是否连接成功。"""
-        streams = resolve_stream('type', 'EEG')
-        best_stream = self._select_best_stream(streams)
+        if rec.shared_inlet is not None:
+            rec.inlet = rec.shared_inlet
+            return True
+        if rec.device is None:
+            streams = resolve_stream('type', 'EEG')
+        else:
+            streams = resolve_byprop('source_id', rec.device, timeout=1.0)
+        best_stream = self._select_best_stream(streams, rec.device)
         if best_stream is None:
             return False
-        self.inlet = StreamInlet(best_stream, max_chunklen=10)
+        rec.inlet = StreamInlet(best_stream, max_chunklen=10)
         logger.info(
             "EEG stream connected. "
             f"name={best_stream.name()} | type={best_stream.type()} | "
@@ -94,41 +274,88 @@ class EEGLogger:
         )
         return True
 
-    def stop_recording(self):
-        """停止录制并异步保存文件 (线程安全)"""
-        data_to_save = []
+    def stop_recording(self, end_timestamp=None, session_index=None, until_code=None):
+        """
+        停止录制并异步保存文件 (线程安全)
+        :param end_timestamp: 可选，音频结束的 LSL 时间；给定时继续采集直到各流都收到该时刻的数据
+                              (最长 DRAIN_TIMEOUT 秒)，并丢弃其后的采样，使录制与音频严格等长
+        :param session_index: 可选，仅当当前录制仍是该序号时才停止
+        :param until_code: 可选 (需同时给定 end_timestamp)，设备 trigger 码；给定时不截断，继续采集直到
+                           各流的 trigger 通道出现该码 (最长 TRIGGER_WAIT_TIMEOUT 秒)，使结束 trigger 留在
+                           录制文件中，音频结束位置由 .events.tsv 中的标记给出
+        """
+        if end_timestamp is not None:
+            with self.data_lock:
+                if not self.is_recording:
+                    return
+                self.stop_at = float(end_timestamp)
+                self.stop_code = until_code
+                self.stop_requested = time.time()
+                self.stop_deadline = self.stop_requested + (
+                    DRAIN_TIMEOUT if until_code is None else TRIGGER_WAIT_TIMEOUT)
+            waiting = "samples up to audio end" if until_code is None else f"trigger {until_code}"
+            logger.info(f"Stopping EEG recording at t={end_timestamp:.4f} (waiting for {waiting})")
+            return
+
+        save_tasks = []
+        finalize_tasks = []
         duration = 0
-        save_filename = ""
 
         with self.data_lock:
-            if not self.is_recording:
+            if not self.is_recording or session_index not in (None, self.session_index):
                 return
                 
             logger.info("Stopping EEG recording...")
             self.is_recording = False
-            duration = time.time() - self.start_time
-            save_filename = self.current_filename
+            # 截断模式下时长按请求停止的时刻计算，不含等待数据到达的时间
+            stop_time = self.stop_requested if self.stop_at is not None and self.stop_code is None else time.time()
+            self.stop_at = None
+            self.stop_code = None
+            duration = stop_time - self.start_time
             
-            # 获取数据副本
-            if self.buffer:
-                data_to_save = list(self.buffer)
-                self.buffer = [] # 立即清空
-            logger.info(
-                f"Stop summary | session={self.session_index} | filename={save_filename} | "
-                f"chunks={self.session_chunk_count} | samples={self.session_sample_count} | "
-                f"buffered_samples={len(data_to_save)} | duration={duration:.2f}s"
-            )
+            for rec in self.streams:
+                save_filename = rec.file_name(self.current_filename)
+                link_stats = rec.link_stats_delta()
+                if rec.session_writer is not None:
+                    rec.session_writer.annotate(f"Song end: {self.current_filename}")
+                if rec.writer is not None:
+                    logger.info(
+                        f"Stop summary | session={self.session_index} | filename={save_filename} | "
+                        f"chunks={rec.chunk_count} | samples={rec.sample_count} | streamed | "
+                        f"duration={duration:.2f}s"
+                    )
+                    finalize_tasks.append((rec.writer, save_filename, link_stats, rec.markers))
+                    rec.writer = None
+                    continue
+                # 交出已填充部分并换上空缓冲区，不复制数据
+                data_to_save, timestamps = rec.buffer.take()
+                logger.info(
+                    f"Stop summary | session={self.session_index} | filename={save_filename} | "
+                    f"chunks={rec.chunk_count} | samples={rec.sample_count} | "
+                    f"buffered_samples={len(data_to_save)} | duration={duration:.2f}s"
+                )
+                save_tasks.append(
+                    (data_to_save, timestamps, save_filename, link_stats, rec.first_timestamp, rec.device,
+                     rec.markers)
+                )
         
         # 异步保存数据，不阻塞主线程
-        if data_to_save:
+        for data_to_save, timestamps, save_filename, link_stats, first_timestamp, device, markers in save_tasks:
+            if len(data_to_save):
+                threading.Thread(
+                    target=self._save_to_file,
+                    args=(data_to_save, duration, save_filename, link_stats, first_timestamp, self.start_time,
+                          timestamps, device, markers)
+                ).start()
+            else:
+                logger.warning(
+                    f"No data recorded to save | session={self.session_index} | filename={save_filename}"
+                )
+        for writer, save_filename, link_stats, markers in finalize_tasks:
             threading.Thread(
-                target=self._save_to_file,
-                args=(data_to_save, duration, save_filename)
+                target=self._finalize_stream,
+                args=(writer, duration, save_filename, link_stats, self.session_index, markers)
             ).start()
-        else:
-            logger.warning(
-                f"No data recorded to save | session={self.session_index} | filename={save_filename}"
-            )
             
         logger.info("EEG recording stopped (Save task submitted)")
 
@@ -137,115 +364,231 @@ class EEGLogger:
         logger.info("Background EEG monitoring thread started.")
         
         while True:
-            # 1. 确保流连接
-            if self.inlet is None:
+            streams = self.streams
+            if self.stop_at is not None:
+                self._check_drained(streams)
+            # 多个流时平分拉取超时，保证整体循环响应速度不变
+            pull_timeout = 0.2 / len(streams)
+            if all(rec.inlet is None for rec in streams) and len(streams) == 1:
+                # 1. 确保流连接
+                # resolve_stream 会阻塞直到找到流
+                # 这里是后台线程，阻塞是可以接受的
                 try:
-                    # resolve_stream 会阻塞直到找到流
-                    # 这里是后台线程，阻塞是可以接受的
-                    # logger.info("Waiting for EEG stream...")
-                    if self._connect_inlet():
-                        self.last_data_time = time.time()
+                    if self._connect_inlet(streams[0]):
+                        streams[0].last_data_time = time.time()
                     else:
                         time.sleep(1)
                 except Exception as e:
                     logger.error(f"Stream resolution error: {e}")
                     time.sleep(1)
                 continue
-            
-            # 2. 拉取数据
-            try:
-                # timeout设为较小值，保证循环响应速度
-                chunk, timestamps = self.inlet.pull_chunk(timeout=0.2)
-                if chunk:
-                    chunk_len = len(chunk)
-                    self.bg_chunk_counter += 1
-                    self.last_data_time = time.time()
-                    session_samples = 0
-                    buffer_len = 0
-                    with self.data_lock:
-                        if self.is_recording:
-                            self.session_chunk_count += 1
-                            self.session_sample_count += chunk_len
-                            self.buffer.extend(chunk)
-                            session_samples = self.session_sample_count
-                            buffer_len = len(self.buffer)
+
+            connected = 0
+            for rec in streams:
+                if rec.inlet is None:
                     now = time.time()
-                    if self.is_recording and (
-                        self.bg_chunk_counter % 50 == 0 or now - self.last_chunk_log_time >= 5
-                    ):
-                        self.last_chunk_log_time = now
-                        logger.info(
-                            f"EEG chunk received | chunk_samples={chunk_len} | "
-                            f"session={self.session_index} | session_samples={session_samples} | "
-                            f"buffer_len={buffer_len}"
-                        )
-                elif self.is_recording and time.time() - self.last_data_time > self.no_data_reconnect_sec:
-                    logger.warning(
-                        f"No EEG chunk for {self.no_data_reconnect_sec:.1f}s while recording, reconnecting inlet..."
+                    if now < rec.next_resolve_time:
+                        continue
+                    rec.next_resolve_time = now + 2.0
+                    try:
+                        if self._connect_inlet(rec):
+                            rec.last_data_time = time.time()
+                    except Exception as e:
+                        logger.error(f"Stream resolution error ({rec.label}): {e}")
+                    continue
+                connected += 1
+                # 2. 拉取数据
+                self._pull(rec, pull_timeout)
+            if not connected:
+                time.sleep(0.2)
+
+    def _check_drained(self, streams):
+        """stop_recording(end_timestamp) 之后：各流都收到音频结束时刻的数据 (及结束 trigger) 或超时后结束录制"""
+        with self.data_lock:
+            if self.stop_at is None:
+                return
+            drained = all(rec.drained for rec in streams)
+            if not drained and time.time() <= self.stop_deadline:
+                return
+            session_index = self.session_index
+        if not drained:
+            if self.stop_code is not None:
+                logger.warning(f"Timed out waiting for trigger {self.stop_code} in EEG data, stopping with received data")
+            else:
+                logger.warning("Timed out waiting for EEG samples up to audio end, stopping with received data")
+        self.stop_recording(session_index=session_index)
+
+    def _pull(self, rec, timeout):
+        """从单个流拉取一次数据并写入录制缓冲"""
+        try:
+            # timeout设为较小值，保证循环响应速度
+            chunk, timestamps = rec.inlet.pull_chunk(timeout=timeout)
+            if len(chunk):
+                t_start = time.perf_counter()
+                chunk_len = len(chunk)
+                self.bg_chunk_counter += 1
+                rec.last_data_time = time.time()
+                session_samples = 0
+                buffer_len = 0
+                with self.data_lock:
+                    if rec.session_writer is not None:
+                        # 歌曲间隙的数据也写入连续的 BDF 文件
+                        rec.session_writer.append(chunk, timestamps)
+                    if self.is_recording and self.stop_at is not None and len(timestamps):
+                        if self.stop_code is None:
+                            # 截断到音频结束时刻
+                            keep = int(np.searchsorted(np.asarray(timestamps), self.stop_at, side='right'))
+                            if keep < len(timestamps):
+                                rec.drained = True
+                                chunk, timestamps = chunk[:keep], timestamps[:keep]
+                                chunk_len = keep
+                        else:
+                            # 保留全部采样，等待结束 trigger 出现在 trigger 通道 (最后一列)
+                            rec.code_seen = rec.code_seen or bool(np.any(np.asarray(chunk)[:, -1] == self.stop_code))
+                            rec.drained = rec.code_seen and timestamps[-1] > self.stop_at
+                    if self.is_recording and chunk_len:
+                        if rec.first_timestamp is None and len(timestamps):
+                            rec.first_timestamp = float(timestamps[0])
+                        rec.chunk_count += 1
+                        rec.sample_count += chunk_len
+                        if rec.writer is not None:
+                            rec.writer.append(chunk, timestamps)
+                        else:
+                            rec.buffer.extend(chunk, timestamps)
+                        session_samples = rec.sample_count
+                        buffer_len = len(rec.buffer)
+                self.pull_stats.record(busy_time=time.perf_counter() - t_start)
+                now = time.time()
+                if self.is_recording and (
+                    self.bg_chunk_counter % 50 == 0 or now - self.last_chunk_log_time >= 5
+                ):
+                    self.last_chunk_log_time = now
+                    logger.info(
+                        f"EEG chunk received | stream={rec.label} | chunk_samples={chunk_len} | "
+                        f"session={self.session_index} | session_samples={session_samples} | "
+                        f"buffer_len={buffer_len}"
                     )
-                    self.inlet = None
-            except Exception as e:
-                logger.error(f"Error pulling data: {e}")
-                self.inlet = None # 触发重连
-                time.sleep(0.5)
+            elif self.is_recording and time.time() - rec.last_data_time > self.no_data_reconnect_sec:
+                logger.warning(
+                    f"No EEG chunk for {self.no_data_reconnect_sec:.1f}s while recording ({rec.label}), "
+                    f"reconnecting inlet..."
+                )
+                rec.inlet = None
+        except Exception as e:
+            logger.error(f"Error pulling data ({rec.label}): {e}")
+            rec.inlet = None # 触发重连
+            time.sleep(0.5)
 
     def _setup_folder(self):
         """
-        设置保存文件夹，自动编号
-        仿照 xw_web_C8.py 的逻辑: offlinedata/EEGdata-{MMDD}-{index}
+        设置保存文件夹，自动编号: offlinedata/EEGdata-{MMDD}-{index}
+        编号由 offlinedata/catalog.sqlite 分配，与 xw_web_C8.py 共用
         """
         # 如果已经创建了文件夹，就不再创建
         if self.save_path and os.path.exists(self.save_path):
             return
 
-        offline_dir = os.path.join(self.base_dir, 'offlinedata')
-        if not os.path.exists(offline_dir):
-            os.makedirs(offline_dir)
-            
-        current_time = time.strftime("%m%d", time.localtime())    
-        folder_index = 1
-        target_path = os.path.join(offline_dir, f"EEGdata-{current_time}-{folder_index}")
-        
-        # 检查文件夹是否存在且非空
-        while os.path.exists(target_path) and os.listdir(target_path):
-            folder_index += 1
-            target_path = os.path.join(offline_dir, f"EEGdata-{current_time}-{folder_index}")
-        
-        self.save_path = target_path
-        os.makedirs(self.save_path, exist_ok=True)
+        if self.catalog is None:
+            self.catalog = SessionCatalog(os.path.join(self.base_dir, 'offlinedata'))
+        devices = ",".join(rec.device for rec in self.streams if rec.device) or None
+        self.save_path = self.catalog.allocate_session(device=devices)
         logger.info(f"EEG data will be saved to: {self.save_path}")
 
-    def _save_to_file(self, data, duration=None, filename=None):
-        """保存完整数据到文件"""
-        if not data:
+    def _register(self, filepath, shape, duration, gap_samples, link_stats, device, first_timestamp):
+        """在 session 目录中登记已保存的录制文件，失败只记录警告"""
+        try:
+            self.catalog.add_recording(
+                filepath, shape[0], shape[1], self.sample_rate, duration=duration, gap_samples=gap_samples,
+                link_stats=link_stats, device=device, first_timestamp=first_timestamp,
+            )
+        except Exception as e:
+            logger.warning(f"Failed to update session catalog for {filepath}: {e}")
+
+    def _save_to_file(self, counts, duration=None, filename=None, link_stats=None, first_timestamp=None,
+                      start_time=None, timestamps=None, device=None, markers=None):
+        """保存完整数据到文件 (counts / timestamps 为 SampleBuffer 交出的 int32 计数与 LSL 时间戳)"""
+        if not len(counts):
             return
             
         try:
-            # 参考 xw_web_C8.py 的处理：除以 120
-            arr = np.array(data) / 120.0
             
             # 构造完整路径
             # 格式要求：体现歌曲类别
             # 如果未提供filename，使用当前的（可能不安全，但在stop_recording中已处理）
             fname = filename if filename else self.current_filename
-            full_filename = f"{fname}.csv"
-            filepath = os.path.join(self.save_path, full_filename)
+            gap_samples = int((counts[:, 0] == eeg_recording.MISSING).sum())
             
             # 保存
-            pd.DataFrame(arr).to_csv(filepath)
-            file_size = os.path.getsize(filepath)
-            
-            samples = len(data)
-            msg = f"Saved EEG data to {filepath} (shape: {arr.shape}, bytes: {file_size})"
+            if RECORDING_FORMAT == 'csv':
+                filepath = os.path.join(self.save_path, f"{fname}.csv")
+                # 参考 xw_web_C8.py 的处理：除以 120，丢包占位为 NaN
+                arr = np.where(counts == eeg_recording.MISSING, np.nan, counts / 120.0)
+                pd.DataFrame(arr).to_csv(filepath)
+                if timestamps is not None:
+                    eeg_recording.write_timestamps(filepath, timestamps, self.sample_rate)
+            else:
+                filepath = os.path.join(self.save_path, f"{fname}{eeg_recording.EXTENSION}")
+                eeg_recording.write_recording(
+                    filepath, counts, self.sample_rate, first_timestamp=first_timestamp, timestamps=timestamps,
+                    start_time=start_time, duration=duration, link_stats=link_stats,
+                    gap_samples=gap_samples, device=device,
+                )
+                if EXPORT_CSV:
+                    eeg_recording.export_csv(filepath)
             
-            if duration and duration > 0:
-                rate = samples / duration
-                msg += f". Duration: {duration:.2f}s, Effective Rate: {rate:.2f} Hz"
-                
+            msg = self._save_summary(filepath, counts.shape, duration, gap_samples, link_stats)
             logger.info(msg)
+            self._save_events(filepath, markers, first_timestamp)
+            self._register(filepath, counts.shape, duration, gap_samples, link_stats, device, first_timestamp)
         except Exception as e:
             logger.error(f"Failed to save data: {e}")
 
+    def _finalize_stream(self, writer, duration, filename, link_stats, session_index, markers=None):
+        """流式写入模式：写完剩余数据并回填文件头"""
+        try:
+            header = writer.finalize(duration=duration, link_stats=link_stats, gap_samples=writer.missing_samples)
+            if header is None:
+                logger.warning(f"No data recorded to save | session={session_index} | filename={filename}")
+                return
+            shape = (header['samples'], header['channels'])
+            logger.info(self._save_summary(writer.path, shape, duration, writer.missing_samples, link_stats))
+            self._save_events(writer.path, markers, header.get('first_timestamp'))
+            self._register(writer.path, shape, duration, writer.missing_samples, link_stats, header.get('device'),
+                           header.get('first_timestamp'))
+            if EXPORT_CSV:
+                eeg_recording.export_csv(writer.path)
+        except Exception as e:
+            logger.error(f"Failed to finalize streamed recording {writer.path}: {e}")
+
+    def _save_events(self, filepath, markers, first_timestamp):
+        """写入事件标记旁路文件，失败只记录警告"""
+        if not markers:
+            return
+        try:
+            count = eeg_recording.write_events(filepath, markers, self.sample_rate, first_timestamp)
+            logger.info(f"Saved {count} event markers to {eeg_recording.events_path(filepath)}")
+        except Exception as e:
+            logger.warning(f"Failed to save event markers for {filepath}: {e}")
+
+    @staticmethod
+    def _save_summary(filepath, shape, duration, gap_samples, link_stats):
+        file_size = os.path.getsize(filepath)
+        samples = shape[0]
+        msg = f"Saved EEG data to {filepath} (shape: {shape}, bytes: {file_size})"
+        
+        if duration and duration > 0:
+            rate = samples / duration
+            msg += f". Duration: {duration:.2f}s, Effective Rate: {rate:.2f} Hz"
+
+        # 丢包占位采样点在 LSL 中为 NaN
+        msg += f". Gap-filled samples: {gap_samples}"
+        if link_stats:
+            total = link_stats['received'] + link_stats['lost']
+            loss = link_stats['lost'] / total * 100 if total else 0.0
+            msg += (f", Packets lost: {link_stats['lost']} ({loss:.2f}%), "
+                    f"duplicates: {link_stats['duplicates']}")
+        return msg
+
     def _save_chunk(self, data, index):
         """(Deprecated)"""
         pass
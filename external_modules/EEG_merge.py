@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+分段录制合并
+xw_web_C8 每 30 秒保存一段 EEG-offline-data-{k}.csv (及同名 .ts 时间戳)，停止保存后由本模块按编号顺序
+合并为一个 {name}.eegrec (或 BDF+ / EDF+)：
+
+    - 逐段读取、逐段写出，内存占用只与单段长度有关，不随录制时长增长
+    - 同名 .eegrec 分段 (csv_convert 转换结果) 优先于 CSV
+    - 连续性检查：分段编号是否连续、段内采样数与时间戳跨度是否一致、相邻两段边界处时间戳是否衔接，
+      结果写入合并文件的文件头 (merge_report)，BDF 中以 "Segment gap" 标注
+    - start_merge() 在后台线程中执行，可等待采集线程写完最后一段后再开始，不阻塞界面
+
+用法:
+    start_merge(save_path, name, first_segment=0, wait=flushed_event, last_segment=lambda: state['last_segment'])
+    python external_modules/EEG_merge.py offlinedata/EEGdata-0209-1 song_name --format bdf
+"""
+
+import argparse
+import glob
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+try:
+    from . import eeg_recording
+    from .csv_convert import read_csv_counts
+    from .save_edf import BdfWriter
+    from .session_catalog import SessionCatalog
+except ImportError:
+    import eeg_recording
+    from csv_convert import read_csv_counts
+    from save_edf import BdfWriter
+    from session_catalog import SessionCatalog
+
+SEGMENT_PREFIX = "EEG-offline-data-"
+WAIT_TIMEOUT = 60.0         # 等待采集线程写完最后一段的最长时间 (秒)
+GAP_TOLERANCE = 1.5         # 边界处时间戳间隔超过 GAP_TOLERANCE 个采样周期视为不连续
+SPAN_TOLERANCE = 0.01       # 段内采样数与时间戳跨度的允许偏差 (比例)
+HEADER_ISSUES = 20          # 文件头 (4 KB) 中最多记录的检查结果条数
+
+
+def list_segments(save_path, first_segment=0, last_segment=None):
+    """
+    按编号返回 [(k, path)]，同一编号优先使用 .eegrec
+    :param last_segment: 最后一个分段编号 (含)；同一文件夹中之前较长的保存会留下编号更大的旧分段，需排除
+    """
+    found = {}
+    for path in glob.glob(os.path.join(save_path, SEGMENT_PREFIX + "*")):
+        match = re.match(rf"^{re.escape(SEGMENT_PREFIX)}(\d+)(\.csv|{re.escape(eeg_recording.EXTENSION)})$",
+                         os.path.basename(path))
+        if not match or int(match.group(1)) < first_segment:
+            continue
+        if last_segment is not None and int(match.group(1)) > last_segment:
+            continue
+        k = int(match.group(1))
+        if k not in found or match.group(2) == eeg_recording.EXTENSION:
+            found[k] = path
+    return sorted(found.items())
+
+
+def read_segment(path):
+    """读取单段：(int32 计数, 时间戳或 None)"""
+    if path.endswith(eeg_recording.EXTENSION):
+        _, counts = eeg_recording.open_recording(path)
+        counts = np.asarray(counts)
+    else:
+        counts = read_csv_counts(path)
+    timestamps = eeg_recording.open_timestamps(path)
+    if timestamps is not None:
+        timestamps = np.asarray(timestamps) if len(timestamps) == len(counts) else None
+    return counts, timestamps
+
+
+def check_segment(k, counts, timestamps, sample_rate):
+    """段内检查：采样数应与时间戳跨度一致"""
+    if timestamps is None or len(timestamps) < 2 or not np.isfinite(timestamps[[0, -1]]).all():
+        return None
+    expected = (timestamps[-1] - timestamps[0]) * sample_rate + 1
+    if abs(len(counts) - expected) > max(SPAN_TOLERANCE * expected, 1):
+        return {'segment': k, 'issue': 'span', 'samples': len(counts), 'expected': int(round(expected))}
+    return None
+
+
+def check_boundary(k, previous_last, first, sample_rate):
+    """相邻两段边界：下一段首个时间戳应紧接上一段最后一个"""
+    if previous_last is None or first is None or not (np.isfinite(previous_last) and np.isfinite(first)):
+        return None
+    period = 1.0 / sample_rate
+    gap = first - previous_last
+    if abs(gap - period) > GAP_TOLERANCE * period:
+        return {'segment': k, 'issue': 'gap', 'seconds': float(gap - period),
+                'samples': int(round((gap - period) * sample_rate))}
+    return None
+
+
+def eeg_merge(save_path, name, first_segment=0, fmt='eegrec', wait=None, sample_rate=None, last_segment=None):
+    """
+    将 save_path 下编号在 [first_segment, last_segment] 内的分段合并为 {name}.eegrec / .bdf / .edf
+    :param wait: 可选 threading.Event，采集线程写完最后一段后置位
+    :param last_segment: 最后一个分段编号；写完之后才能确定时可传入无参函数，在等待结束后调用
+    :return: 合并报告 dict，没有分段时返回 None
+    """
+    if wait is not None and not wait.wait(WAIT_TIMEOUT):
+        print(f"等待分段写入超时 ({WAIT_TIMEOUT:.0f}s)，使用已写出的分段合并")
+    if callable(last_segment):
+        last_segment = last_segment()
+    if last_segment is None:
+        print("最后一个分段编号未知，合并所有编号不小于起始编号的分段")
+    segments = list_segments(save_path, first_segment, last_segment)
+    if not segments:
+        print(f"未找到需要合并的分段: {save_path}")
+        return None
+    sample_rate = sample_rate or eeg_recording.read_sample_rate()
+    out_path = os.path.join(save_path, f"{name}{eeg_recording.EXTENSION if fmt == 'eegrec' else '.' + fmt}")
+    t0 = time.perf_counter()
+    issues = []
+    expected_k = segments[0][0]
+    previous_last = None
+    samples = 0
+    gap_samples = 0
+    first_timestamp = None
+    writer = None
+    for k, path in segments:
+        if k != expected_k:
+            issues.append({'segment': k, 'issue': 'missing segments', 'from': expected_k, 'to': k - 1})
+        expected_k = k + 1
+        counts, timestamps = read_segment(path)
+        if not len(counts):
+            continue
+        if writer is None:
+            if fmt == 'eegrec':
+                writer = eeg_recording.RecordingWriter(out_path, sample_rate, start_time=os.path.getmtime(path),
+                                                       first_segment=k)
+            else:
+                writer = BdfWriter(out_path, sample_rate, fmt=fmt, start_time=os.path.getmtime(path))
+        issue = check_segment(k, counts, timestamps, sample_rate)
+        if issue:
+            issues.append(issue)
+        first = float(timestamps[0]) if timestamps is not None else None
+        boundary = check_boundary(k, previous_last, first, sample_rate)
+        if boundary:
+            issues.append(boundary)
+            if fmt != 'eegrec':
+                writer.annotate("Segment gap", duration=boundary['seconds'] if boundary['seconds'] > 0 else None)
+        if first_timestamp is None:
+            first_timestamp = first
+        previous_last = float(timestamps[-1]) if timestamps is not None else None
+        writer.append(counts, timestamps)
+        samples += len(counts)
+        gap_samples += int((counts[:, 0] == eeg_recording.MISSING).sum())
+        del counts, timestamps
+
+    report = {'path': out_path, 'segments': len(segments), 'samples': samples, 'issues': issues,
+              'elapsed': time.perf_counter() - t0}
+    if writer is None:
+        print(f"分段均为空，未生成合并文件: {save_path}")
+        return None
+    if fmt != 'eegrec':
+        writer.close()
+    else:
+        header = writer.finalize(gap_samples=gap_samples, segments=len(segments), merge_issues=len(issues),
+                                 merge_report=issues[:HEADER_ISSUES])
+        if header['samples'] != samples:
+            issues.append({'issue': 'written samples', 'samples': header['samples'], 'expected': samples})
+        try:
+            SessionCatalog(os.path.dirname(os.path.abspath(save_path))).add_recording(
+                out_path, samples, header['channels'], sample_rate, duration=samples / sample_rate,
+                gap_samples=gap_samples, first_timestamp=first_timestamp)
+        except Exception as e:
+            print("更新 session 目录失败: {}".format(e))
+
+    report['elapsed'] = time.perf_counter() - t0
+    print(f"已合并 {len(segments)} 段 -> {out_path} ({samples} 个采样点, {report['elapsed']:.1f}s)")
+    for issue in issues:
+        print(f"  连续性检查: {issue}")
+    return report
+
+
+def start_merge(save_path, name, first_segment=0, fmt='eegrec', wait=None, on_done=None, last_segment=None):
+    """
+    在后台线程中合并分段
+    :param on_done: 可选回调，参数为合并报告 (失败时为 None)
+    :return: 已启动的线程
+    """
+    def run():
+        report = None
+        try:
+            report = eeg_merge(save_path, name, first_segment, fmt, wait, last_segment=last_segment)
+        except Exception as e:
+            print(f"合并分段失败: {e}")
+        if on_done is not None:
+            on_done(report)
+
+    thread = threading.Thread(target=run, name=f"EEGMerge-{name}")
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge EEG-offline-data-{k} segments")
+    parser.add_argument("save_path")
+    parser.add_argument("name")
+    parser.add_argument("--first", type=int, default=0, help="从该编号的分段开始合并")
+    parser.add_argument("--last", type=int, default=None, help="合并到该编号的分段为止 (含)")
+    parser.add_argument("--format", default="eegrec", choices=["eegrec", "bdf", "edf"])
+    args = parser.parse_args()
+    eeg_merge(args.save_path, args.name, args.first, args.format, last_segment=args.last)
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+独立采集进程
+BleReceiver 在单独的进程中完成蓝牙接收、帧解码与 LSL 推流，不再与 GUI、EEGLogger 的拉取线程
+以及保存线程 (to_csv 等) 争抢同一个 GIL。解码后的采样点同时写入 SharedSampleRing，
+主进程通过 RingInlet 直接读取共享内存，无需 pickle。
+
+进程间通信:
+    命令队列 (主进程 -> 采集进程): ('trigger', tag) / ('stop',)
+    状态队列 (采集进程 -> 主进程): ('ring', 共享内存名) / ('status', 文本) / ('connected', bool) /
+                                   ('stats', 丢包计数 dict, 电量) / ('exit', None)
+"""
+
+import asyncio
+import multiprocessing
+import os
+import queue
+import sys
+import time
+
+try:
+    from .shm_ring import RingInlet, SharedSampleRing
+except ImportError:
+    from shm_ring import RingInlet, SharedSampleRing
+
+RING_SECONDS = 30.0         # 共享内存环形缓冲区可容纳的时长 (秒)
+STATS_INTERVAL = 1.0        # 采集进程上报丢包计数与电量的间隔 (秒)
+
+
+def _acquisition_main(device_name, log_dir, capture_path, ring_seconds, cmd_queue, status_queue):
+    """采集进程入口"""
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    from external_modules.ble_receive_eeg_trigger import BleReceiver
+
+    receiver = BleReceiver(device_name, log_dir, capture_path=capture_path)
+    ring = SharedSampleRing(channels=receiver.channel_num + 1,
+                            capacity=int(receiver.sample_rate * ring_seconds),
+                            sample_rate=receiver.sample_rate)
+    receiver.lsl_pusher.sinks.append(ring)
+    try:
+        status_queue.put(('ring', ring.name))
+        status_queue.put(('status', "正在扫描设备..."))
+        found = receiver.get_ble_mac_address_specefic(max_retries=3)
+        status_queue.put(('connected', found))
+        if found:
+            status_queue.put(('status', f"设备已找到: {receiver.m_device_mac_address}"))
+            asyncio.run(_serve(receiver, cmd_queue, status_queue))
+    except Exception as e:
+        status_queue.put(('status', f"BLE 错误: {e}"))
+    finally:
+        receiver.close_capture()
+        receiver.lsl_pusher.sinks.remove(ring)
+        status_queue.put(('exit', None))
+        ring.close()
+        ring.unlink()
+
+
+async def _serve(receiver, cmd_queue, status_queue):
+    from external_modules.multi_device import start_device
+
+    recv_task = asyncio.create_task(receiver.start_notification())
+    status_queue.put(('status', "正在发送初始化指令..."))
+    if await start_device(receiver):
+        status_queue.put(('status', "已连接，正在接收数据..."))
+    last_stats = 0.0
+    while not recv_task.done():
+        try:
+            command = cmd_queue.get_nowait()
+        except queue.Empty:
+            now = time.monotonic()
+            if now - last_stats >= STATS_INTERVAL:
+                last_stats = now
+                status_queue.put(('stats', receiver.get_link_stats(), receiver.battery_level))
+            await asyncio.sleep(0.05)
+            continue
+        if command[0] == 'trigger':
+            try:
+                await receiver.send_control_command(bytearray([0xFF, command[1]]))
+            except Exception as e:
+                status_queue.put(('status', f"Trigger 发送失败: {e}"))
+        elif command[0] == 'stop':
+            receiver.is_receiving = False
+            event = getattr(receiver, 'event', None)
+            if event is None:
+                recv_task.cancel()
+            else:
+                event.set()
+    try:
+        await recv_task
+    except asyncio.CancelledError:
+        pass
+
+
+class AcquisitionProcess:
+    """
+    主进程一侧的采集进程句柄
+    :param device_name: 设备名称
+    :param log_dir: 接收器日志目录
+    :param capture_path: 可选，原始蓝牙数据捕获文件
+    """
+
+    def __init__(self, device_name, log_dir, capture_path=None, ring_seconds=RING_SECONDS):
+        # spawn 与 Windows 行为一致，且不会把 Qt 等状态 fork 进子进程
+        ctx = multiprocessing.get_context('spawn')
+        self.cmd_queue = ctx.Queue()
+        self.status_queue = ctx.Queue()
+        self.process = ctx.Process(
+            target=_acquisition_main,
+            args=(device_name, log_dir, capture_path, ring_seconds, self.cmd_queue, self.status_queue),
+            name=f"Acquisition-{device_name}", daemon=True)
+        self.ring = None
+        self.link_stats = None
+        self.battery_level = None
+        self.exited = False
+
+    def start(self):
+        self.process.start()
+
+    def poll(self, timeout=0.2):
+        """
+        处理采集进程上报的消息，共享内存连接与统计信息在内部更新
+        :return: 其余消息 (status / connected / exit) 的列表
+        """
+        messages = []
+        try:
+            message = self.status_queue.get(timeout=timeout)
+            while True:
+                kind, value = message[0], message[1]
+                if kind == 'ring':
+                    self.ring = SharedSampleRing.attach(value)
+                elif kind == 'stats':
+                    self.link_stats, self.battery_level = value, message[2]
+                else:
+                    if kind == 'exit':
+                        self.exited = True
+                    messages.append((kind, value))
+                message = self.status_queue.get_nowait()
+        except queue.Empty:
+            pass
+        if not self.exited and not self.process.is_alive():
+            self.exited = True
+            messages.append(('exit', None))
+        return messages
+
+    def make_inlet(self):
+        """返回读取共享内存的 inlet，共享内存尚未就绪时返回 None"""
+        return RingInlet(self.ring) if self.ring is not None else None
+
+    def send_trigger(self, tag):
+        self.cmd_queue.put(('trigger', tag))
+
+    def stop(self, timeout=3.0):
+        """通知采集进程结束，超时后强制终止"""
+        if self.process.is_alive():
+            self.cmd_queue.put(('stop',))
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join(1.0)
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+蓝牙原始数据捕获与离线回放模块
+
+捕获文件格式 (小端):
+    文件头: MAGIC (8 字节) | 设备名长度 uint16 | 设备名 UTF-8 | 捕获开始的 wall time float64
+    记录:   到达时间 int64 (相对捕获开始的单调时钟纳秒) | 数据长度 uint16 | 通知原始字节
+
+回放时将每条通知按原始时间间隔 (1×、N× 或最快速度) 送入 BleReceiver.notification_handler，
+经过与在线采集完全相同的重组、解码、LSL 推流路径，可在没有蓝牙的机器上复现问题与压测。
+
+用法:
+    python external_modules/ble_capture.py replay offlinedata/EEGdata-0209-1/ble_raw.bcap --speed 4
+    python external_modules/ble_capture.py replay capture.bcap --speed 0 --record .
+"""
+
+import argparse
+import asyncio
+import os
+import struct
+import sys
+import time
+
+from pylsl import local_clock
+
+MAGIC = b"BLECAP\x00\x01"
+_NAME_LEN = struct.Struct("<H")
+_START_TIME = struct.Struct("<d")
+_RECORD = struct.Struct("<qH")
+FLUSH_INTERVAL_NS = 1_000_000_000   # 至少每秒刷新一次文件缓冲
+
+
+class CaptureWriter:
+    """将每条通知及其到达时间追加写入捕获文件"""
+
+    def __init__(self, path, device_name):
+        self.path = path
+        capture_dir = os.path.dirname(path)
+        if capture_dir:
+            os.makedirs(capture_dir, exist_ok=True)
+        self._file = open(path, "wb", buffering=1 << 16)
+        name = device_name.encode("utf-8")
+        self._file.write(MAGIC + _NAME_LEN.pack(len(name)) + name + _START_TIME.pack(time.time()))
+        self._t0 = time.monotonic_ns()
+        self._last_flush = 0
+        self.records = 0
+        self.bytes = 0
+
+    def write(self, data):
+        if self._file is None:
+            return
+        t = time.monotonic_ns() - self._t0
+        self._file.write(_RECORD.pack(t, len(data)))
+        self._file.write(data)
+        self.records += 1
+        self.bytes += len(data)
+        if t - self._last_flush >= FLUSH_INTERVAL_NS:
+            self._file.flush()
+            self._last_flush = t
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_capture(path):
+    """
+    读取捕获文件
+    :return: (header, records)，header 为 dict，records 为 (t_ns, bytes) 列表
+    """
+    with open(path, "rb") as f:
+        blob = f.read()
+    if not blob.startswith(MAGIC):
+        raise ValueError(f"不是有效的捕获文件: {path}")
+    pos = len(MAGIC)
+    (name_len,) = _NAME_LEN.unpack_from(blob, pos)
+    pos += _NAME_LEN.size
+    device_name = blob[pos:pos + name_len].decode("utf-8")
+    pos += name_len
+    (start_time,) = _START_TIME.unpack_from(blob, pos)
+    pos += _START_TIME.size
+
+    records = []
+    view = memoryview(blob)
+    while pos + _RECORD.size <= len(blob):
+        t_ns, length = _RECORD.unpack_from(blob, pos)
+        pos += _RECORD.size
+        if pos + length > len(blob):
+            break   # 采集中断导致的不完整记录
+        records.append((t_ns, view[pos:pos + length]))
+        pos += length
+    header = {'device': device_name, 'start_time': start_time, 'records': len(records)}
+    return header, records
+
+
+class CaptureReplayer:
+    """
+    将捕获文件回放到 BleReceiver
+    :param speed: 回放倍速，1 为实时，0 为不等待的最快速度
+    """
+
+    def __init__(self, path, receiver, speed=1.0):
+        self.path = path
+        self.receiver = receiver
+        self.speed = speed
+        self.header, self.records = read_capture(path)
+
+    async def run(self):
+        receiver = self.receiver
+        clock_origin = local_clock()
+        # LSL 时间戳按原始到达时间轴推算，与回放倍速无关
+        current = {'t': 0.0}
+        receiver.lsl_pusher.clock = lambda: clock_origin + current['t']
+        receiver.lsl_pusher.reset()
+
+        wall_start = time.perf_counter()
+        for i, (t_ns, payload) in enumerate(self.records):
+            t = t_ns / 1e9
+            if self.speed > 0:
+                delay = wall_start + t / self.speed - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            elif i % 100 == 0:
+                await asyncio.sleep(0)
+            current['t'] = t
+            await receiver.notification_handler(None, payload)
+        elapsed = time.perf_counter() - wall_start
+        span = self.records[-1][0] / 1e9 if self.records else 0.0
+        return {'records': len(self.records), 'capture_span': span, 'elapsed': elapsed}
+
+
+def _replay_main(args):
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    from external_modules.ble_receive_eeg_trigger import BleReceiver
+
+    header, _ = read_capture(args.capture)
+    device = args.device or header['device']
+    log_dir = os.path.dirname(os.path.abspath(args.capture))
+    receiver = BleReceiver(device, log_dir)
+    replayer = CaptureReplayer(args.capture, receiver, args.speed)
+    print(f"Replaying {header['records']} notifications from {device} at "
+          f"{'max' if args.speed <= 0 else f'{args.speed:g}x'} speed")
+
+    eeg_logger = None
+    if args.record:
+        from eeg_logger import EEGLogger
+        eeg_logger = EEGLogger(args.record)
+        deadline = time.time() + 10
+        while eeg_logger.inlet is None and time.time() < deadline:
+            time.sleep(0.1)
+        eeg_logger.start_recording(f"replay_{os.path.splitext(os.path.basename(args.capture))[0]}")
+
+    result = asyncio.run(replayer.run())
+    if eeg_logger:
+        time.sleep(1.0)     # 等待 LSL 缓冲中的剩余数据被拉取
+        eeg_logger.stop_recording()
+    print(f"Done: {result['records']} notifications, capture span {result['capture_span']:.2f}s, "
+          f"replayed in {result['elapsed']:.2f}s")
+    if receiver.seq_tracker is not None:
+        print(f"Link stats: {receiver.get_link_stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BLE raw capture replay")
+    sub = parser.add_subparsers(dest="command", required=True)
+    replay = sub.add_parser("replay", help="回放捕获文件")
+    replay.add_argument("capture")
+    replay.add_argument("--speed", type=float, default=1.0, help="回放倍速，0 表示最快")
+    replay.add_argument("--device", help="覆盖捕获文件中记录的设备名")
+    replay.add_argument("--record", metavar="BASE_DIR", help="同时用 EEGLogger 录制到 BASE_DIR/offlinedata")
+    _replay_main(parser.parse_args())
@@ -21,7 +21,6 @@ import time
 import json
 import logging
 
-from bleak import BleakClient, BleakScanner
 from jinja2.bccache import bc_magic
 import numpy as np
 import pandas as pd
@@ -29,28 +28,52 @@ from pylsl import StreamInfo, StreamOutlet
 import scipy.io as sio
 import configparser
 
+try:
+    from .device_profiles import resolve_profile
+    from .lsl_output import ChunkedLslPusher
+    from .sequence_tracker import SequenceTracker
+    from .log_pipeline import install_queue_logging, RateLimiter, ThroughputStats
+    from .ble_capture import CaptureWriter
+    from .ble_transport import create_transport
+except ImportError:
+    from device_profiles import resolve_profile
+    from lsl_output import ChunkedLslPusher
+    from sequence_tracker import SequenceTracker
+    from log_pipeline import install_queue_logging, RateLimiter, ThroughputStats
+    from ble_capture import CaptureWriter
+    from ble_transport import create_transport
 
 DEBUG_PRINT_ON = True
 LOG_ON = True
 DEBUG_ON = True
+LSL_CHUNK_ON = True   # 每帧一次 push_chunk，时间戳按采样计数推算；False 时沿用逐点 push_sample
+DEFAULT_SAMPLE_RATE = 500
+GAP_FILL_ON = True    # 检测到丢包时推送 NaN 占位采样点，保持时间轴连续（仅分块推流模式）
+MAX_GAP_FILL_PACKETS = 64   # 超过该包数的长时间中断不再填充，仅推进时间轴
+LINK_QUALITY_INTERVAL = 1.0  # 链路质量流推送间隔 (秒)
+PACKET_LOG_INTERVAL = 5.0    # 抽样记录单个数据包 / 丢包告警的最小间隔 (秒)
+STATS_LOG_INTERVAL = 10.0    # 接收吞吐量汇总日志间隔 (秒)
 SAMPLES_PER_FRAME = 5
 TRIGGER_LENGTH = 1
 CH_NUM = 8 + 1        # 8个通道 + 1个trigger通道
 g_data_counter = 0
 g_timer_begin = 0
 g_timer_end = 0
-raw_data = []
+RING_CAPACITY_FRAMES = 64     # 每个接收器重组缓冲区可容纳的数据帧数
 
 
 class BleReceiver:
-    def __init__(self,device, log_file_path: str, battery_queue=None):
+    def __init__(self,device, log_file_path: str, battery_queue=None, capture_path=None, transport=None,
+                 stream_name='TestStream', source_id='my EEG device'):
         self.word = ""
-        self.channel_num = self.read_config_CHlen() - 1
-        # self.channel_num = 8
-        # CH_NUM = self.channel_num + 1
+        # 设备布局在创建接收器时解析一次，名称中的 _C16 等后缀优先于配置文件通道数
+        self.profile = resolve_profile(device, self.read_config_CHlen() - 1)
+        self.channel_num = self.profile.channel_num
         self.data = np.empty((self.channel_num + 1, 0))
         self.is_receiving = True
         self.battery_queue = battery_queue
+        self.battery_level = None
+        self.data_counter = 0   # 本接收器的帧计数（多设备时互不干扰）
         # self.event = asyncio.Event()
 
         self.m_devices = None
@@ -61,8 +84,27 @@ class BleReceiver:
         self.bci_ble_names = self.read_config()
         self.m_client = None
         self.m_client_serv = None
-        self.info = StreamInfo(name='TestStream', type='EEG', channel_format='float32', channel_count=self.channel_num + 1, source_id='my EEG device')
-        self.outlet = StreamOutlet(self.info)
+        # 传输层：设备名以 SIM 开头时为进程内模拟设备，否则为 bleak
+        self.transport = transport if transport is not None else create_transport(device)
+        self.frame_decoder = self.profile.make_decoder()
+        self.packet_ring = self.profile.make_ring(sync_word=self.transport.sync_word,
+                                                  capacity_frames=RING_CAPACITY_FRAMES)
+        self.sample_rate = self.read_config_sample_rate()
+        self.info = StreamInfo(name=stream_name, type='EEG', channel_count=self.channel_num + 1,
+                               nominal_srate=self.sample_rate, channel_format='float32', source_id=source_id)
+        self.seq_tracker = SequenceTracker() if self.profile.seq_offset is not None else None
+        link = self.info.desc().append_child("link_quality")
+        link.append_child_value("sequence_tracking", "1" if self.seq_tracker else "0")
+        link.append_child_value("gap_fill", "nan" if (GAP_FILL_ON and LSL_CHUNK_ON) else "none")
+        link.append_child_value("counters_stream", f"{self.info.name()}_Quality")
+        self.outlet = StreamOutlet(self.info, chunk_size=SAMPLES_PER_FRAME)
+        self.lsl_pusher = ChunkedLslPusher(self.outlet, self.sample_rate)
+        # 链路质量计数 (received, lost, duplicates, filled_samples) 以不规则采样率单独推流
+        self.quality_info = StreamInfo(name=f"{self.info.name()}_Quality", type='LinkQuality', channel_count=4,
+                                       nominal_srate=0, channel_format='float32',
+                                       source_id=f"{self.info.source_id()}_quality")
+        self.quality_outlet = StreamOutlet(self.quality_info)
+        self.last_quality_push = 0.0
 
         self.log_file_path = log_file_path
         if os.path.isdir(self.log_file_path):
@@ -81,6 +123,18 @@ class BleReceiver:
                 self.logger.addHandler(file_handler)
             else:
                 self.logger.addHandler(logging.NullHandler())
+        # 文件写入移到后台线程，接收回调只做入队
+        install_queue_logging(self.logger)
+        self.packet_log_limiter = RateLimiter(PACKET_LOG_INTERVAL)
+        self.gap_log_limiter = RateLimiter(PACKET_LOG_INTERVAL)
+        self.rx_stats = ThroughputStats(self.logger, f"BLE rx {device}", interval=STATS_LOG_INTERVAL)
+        # 原始通知捕获文件，可用 ble_capture.py replay 离线回放
+        self.capture = CaptureWriter(capture_path, device) if capture_path else None
+        if LOG_ON:
+            if self.capture is not None:
+                self.logger.info(f"Raw BLE capture enabled: {capture_path}")
+            self.logger.info(f"Device profile resolved: {self.profile.key} | packet={self.profile.data_length} bytes | "
+                             f"notify={self.profile.notify_handle} | write={self.profile.write_handle}")
 
     def read_config(self):
         config = configparser.ConfigParser()
@@ -95,7 +149,7 @@ class BleReceiver:
     async def find_ble_devices(self):
         if DEBUG_PRINT_ON:
             self.logger.info("Scanning ble devices...")
-        self.m_devices = await BleakScanner.discover()
+        self.m_devices = await self.transport.discover()
         if DEBUG_PRINT_ON:
             for dev in self.m_devices:
                 # 安全获取 rssi，如果不存在则默认为 -100
@@ -147,7 +201,7 @@ class BleReceiver:
     # 接收数据
     async def start_notification(self):
         try:
-            async with BleakClient(self.m_device_mac_address) as self.m_client:
+            async with self.transport.client(self.m_device_mac_address) as self.m_client:
                 if DEBUG_PRINT_ON:
                     print("BCI_BLE device connected")
                 if hasattr(self.m_client, '_acquire_mtu'):
@@ -169,15 +223,12 @@ class BleReceiver:
                 #         for char in service.characteristics:
                 #             print("\t\t", char)
                 self.event = asyncio.Event()
-                is_ble = "ble" in self.m_device_name.lower()
-                is_msm = "msm" in self.m_device_name.lower()
-                
-                if is_ble and not is_msm:
-                    await self.m_client.start_notify(42, self.notification_handler)
-                else:
-                    await self.m_client.start_notify(5, self.notification_handler)
-                
+                if self.seq_tracker is not None:
+                    self.seq_tracker.reset()
+                await self.m_client.start_notify(self.profile.notify_handle, self.notification_handler)
+
                 await self.event.wait()  # 持续接收数据，直到进程终止
+                self.close_capture()
         except Exception as e:
             if DEBUG_PRINT_ON:
                 print(f"连接异常: {str(e)}")
@@ -186,107 +237,119 @@ class BleReceiver:
             await self.start_notification()
             # await self.m_client.stop_notify(42)
 
+    def handle_packet_gap(self, missing):
+        """处理序号缺口：登记丢失的采样点，必要时推送 NaN 占位数据"""
+        n_samples = missing * self.profile.samples_per_frame
+        fill = GAP_FILL_ON and missing <= MAX_GAP_FILL_PACKETS
+        if LSL_CHUNK_ON:
+            try:
+                self.lsl_pusher.skip(n_samples, self.channel_num + 1 if fill else None)
+            except Exception as push_err:
+                if LOG_ON:
+                    self.logger.error(f"LSL Push Error: {push_err}")
+                return
+            if fill:
+                self.seq_tracker.filled_samples += n_samples
+        if LOG_ON and self.gap_log_limiter.ready():
+            self.logger.warning(f"Packet gap: {missing} packet(s) lost | total_lost={self.seq_tracker.lost} | "
+                                f"loss={self.seq_tracker.loss_ratio * 100:.2f}% | "
+                                f"suppressed_gap_logs={self.gap_log_limiter.take_suppressed()}")
+
+    def publish_link_quality(self):
+        """按 LINK_QUALITY_INTERVAL 推送累计链路质量计数"""
+        if self.seq_tracker is None:
+            return
+        now = time.monotonic()
+        if now - self.last_quality_push < LINK_QUALITY_INTERVAL:
+            return
+        self.last_quality_push = now
+        tracker = self.seq_tracker
+        try:
+            self.quality_outlet.push_sample([float(tracker.received), float(tracker.lost),
+                                             float(tracker.duplicates), float(tracker.filled_samples)])
+        except Exception as push_err:
+            if LOG_ON:
+                self.logger.error(f"LSL Quality Push Error: {push_err}")
+
+    def close_capture(self):
+        """结束原始数据捕获并关闭文件"""
+        if self.capture is not None:
+            if LOG_ON:
+                self.logger.info(f"Raw BLE capture closed: {self.capture.records} notifications, "
+                                 f"{self.capture.bytes} bytes")
+            self.capture.close()
+            self.capture = None
+
+    def get_link_stats(self):
+        """返回本次会话的丢包统计；协议不含序号时返回 None"""
+        if self.seq_tracker is None:
+            return None
+        return self.seq_tracker.snapshot()
+
     # 接收数据回调函数
     async def notification_handler(self, sender, data):
-        global g_data_counter, g_timer_begin, g_timer_end, raw_data
+        global g_timer_begin, g_timer_end
         if self.is_receiving:
-            is_ble = "ble" in self.m_device_name.lower()
-            is_msm = "msm" in self.m_device_name.lower()
-            
-            if is_ble and not is_msm:
-                head_len = 2
-                if self.channel_num == 8:
-                    data_length = 144
-                    single_frame = 24
-                    battery_slice = slice(138, 140)
-            else:
-                head_len = 3
-                if self.channel_num == 8:
-                    data_length = 140
-                    single_frame = 24
-                    battery_slice = slice(136, 138)
-            # print(len(data))
-            if LOG_ON:
-                # 强制记录每次接收的数据长度，以便排查
-                self.logger.info(f"Received BLE data len: {len(data)}")
-                if DEBUG_PRINT_ON:
-                    self.logger.debug('have received buffer')
-                    self.logger.debug('len: %d', len(data))
+            if self.capture is not None:
+                self.capture.write(data)
+            t_start = time.perf_counter()
+            if LOG_ON and self.packet_log_limiter.ready():
+                # 抽样记录数据包长度以便排查，逐包统计见 rx_stats 汇总日志
+                self.logger.info(f"Received BLE data len: {len(data)} (sampled)")
+                if DEBUG_PRINT_ON and self.logger.isEnabledFor(logging.DEBUG):
                     self.logger.debug('data: %s', bytes(data).hex())
-            if len(data) == data_length:
-                raw_data = []
-            raw_data.extend(data)
-            if len(raw_data) >= data_length:
-                # print(len(raw_data))
-                data = raw_data[:data_length]
-                # print(len(data))
-                raw_data[:data_length] = []
-                # print(len(data))
-                # print(order)
-                # print(int.from_bytes(order, byteorder="little", signed=False))
-                data_eeg = data[head_len: head_len + single_frame * SAMPLES_PER_FRAME]
-                if is_ble and not is_msm:
-                    data_trigger = data[head_len + single_frame * SAMPLES_PER_FRAME: head_len + single_frame * SAMPLES_PER_FRAME + SAMPLES_PER_FRAME]
-                else:
-                    data_trigger = data[head_len + single_frame * SAMPLES_PER_FRAME: head_len + single_frame * SAMPLES_PER_FRAME + TRIGGER_LENGTH]
-                
+            ring = self.packet_ring
+            ring.feed(data)
+            for frame in ring.frames():
+                # frame 为指向环形缓冲区的 memoryview，下一次 feed 之前有效
+                if self.seq_tracker is not None:
+                    missing = self.seq_tracker.update(frame[self.profile.seq_offset])
+                    if missing < 0:
+                        continue    # 重复或过期的包
+                    if missing:
+                        self.handle_packet_gap(missing)
                 # 解析电量
-                if self.battery_queue is not None and g_data_counter % 50 == 0:
+                if self.data_counter % 50 == 0:
                     try:
-                        battery_bytes = data[battery_slice]
+                        battery_bytes = frame[self.profile.battery_slice]
                         battery_level = int.from_bytes(battery_bytes, byteorder="big", signed=False)
-                        # print("电量:",battery_level)
+                        self.battery_level = battery_level
                         # 使用非阻塞方式放入队列，防止队列满时阻塞
-                        if not self.battery_queue.full():
+                        if self.battery_queue is not None and not self.battery_queue.full():
                             self.battery_queue.put(battery_level)
                     except Exception as e:
                         if LOG_ON:
                             self.logger.error(f"Error parsing battery: {e}")
 
-                # Frame_header_A = data[0]
-                # Frame_header_B = data[1]
-                # order = data[2]
-                # print(data_trigger)
-                g_data_counter = g_data_counter + 1
-                # battery = data[136:138]
-                raw_data_one_frame = np.zeros([self.channel_num + 1, SAMPLES_PER_FRAME])
-                for frame_idx in range(0, SAMPLES_PER_FRAME):
-                    for ch_idx in range(0, self.channel_num):
-                        raw_data_one_frame[ch_idx][frame_idx] = int.from_bytes(data_eeg[(3 * ch_idx + single_frame * frame_idx):
-                                                                                        (3 * ch_idx + single_frame * frame_idx + 3)],
-                                                                                        byteorder="big", signed=True)
-                    if is_ble and not is_msm:
-                        raw_data_one_frame[self.channel_num][frame_idx] = int.from_bytes(data_trigger[frame_idx: frame_idx + 1], byteorder="big", signed=False)
-                    else:
-                        raw_data_one_frame[self.channel_num][frame_idx] = int.from_bytes(data_trigger, byteorder="big", signed=False)
-                    # raw_data_one_frame[9][frame_idx] = Frame_header_A
-                    # raw_data_one_frame[10][frame_idx] = Frame_header_B
-                    # raw_data_one_frame[11][frame_idx] = len(data)
-                    # raw_data_one_frame[12][frame_idx] = len(data)
-                    
+                # Frame_header_A = frame[0]
+                # Frame_header_B = frame[1]
+                # order = frame[2]
+                self.data_counter = self.data_counter + 1
+                raw_data_one_frame = self.frame_decoder.decode(frame)
 
                 # 得到的单帧数据raw_data_one_frame，一帧内有SAMPLES_PER_FRAME个采样点
-                # 得到的所有数据raw_data
-                # print('have received data')
-                if LOG_ON and g_data_counter % 100 == 0:
-                     self.logger.info(f"Pushing sample to LSL (Frame {g_data_counter})")
+                if LOG_ON and self.data_counter % 100 == 0:
+                     self.logger.info(f"Pushing sample to LSL (Frame {self.data_counter}, "
+                                      f"resync={ring.resync_count}, relearn={ring.relearn_count}, "
+                                      f"dropped_bytes={ring.dropped_bytes})")
 
-                for j in range(raw_data_one_frame.shape[1]):
-                    # 必须确保传递给 push_sample 的列表元素都是标准 Python float 或 int 类型
-                    # 避免 LSL 底层因 numpy 数据类型报错而导致推流静默失败
-                    sample_list = []
-                    for i in range(raw_data_one_frame.shape[0]):
-                        sample_list.append(float(raw_data_one_frame[i, j]))
-                        
+                if LSL_CHUNK_ON:
                     try:
-                        self.outlet.push_sample(sample_list, timestamp=time.time())
+                        self.lsl_pusher.push(raw_data_one_frame)
                     except Exception as push_err:
                         if LOG_ON:
                             self.logger.error(f"LSL Push Error: {push_err}")
-                    # sio.savemat("raw_data.mat", {"rawData": raw_data_one_frame[:,j]})
-                # raw_data = np.concatenate((raw_data, raw_data_one_frame), axis=1)
-                # t = 0
-                if DEBUG_ON and (g_data_counter >= 50):
+                else:
+                    # 必须确保传递给 push_sample 的列表元素都是标准 Python float 类型
+                    # 避免 LSL 底层因 numpy 数据类型报错而导致推流静默失败
+                    for sample_list in raw_data_one_frame.T.astype(np.float64).tolist():
+                        try:
+                            self.outlet.push_sample(sample_list, timestamp=time.time())
+                        except Exception as push_err:
+                            if LOG_ON:
+                                self.logger.error(f"LSL Push Error: {push_err}")
+                self.publish_link_quality()
+                if DEBUG_ON and (self.data_counter >= 50):
                     # print('have received data')
                     # print(f"当前 MTU: {self.m_client.mtu_size}")
                     # try:
@@ -304,7 +367,9 @@ class BleReceiver:
                 #     g_timer_end = time.perf_counter()
                 #     # timestamps = [t / 256]
                 #     print("receive data cost:", g_timer_end - g_timer_begin, "\tlen:", len(data))
-                    g_data_counter = 0
+                    self.data_counter = 0
+            if LOG_ON:
+                self.rx_stats.record(len(data), time.perf_counter() - t_start)
         else:
             self.event.set()
 
@@ -318,6 +383,15 @@ class BleReceiver:
         channel_names = eval(config['Channel']['channel_names'])
         return len(channel_names)
 
+    def read_config_sample_rate(self):
+        """读取设备标称采样率 (Hz)，未配置时使用 DEFAULT_SAMPLE_RATE"""
+        config = configparser.ConfigParser()
+        config_name = os.path.join(os.path.dirname(__file__), 'BHBconfig.ini')
+        if not os.path.exists(config_name):
+            config_name = 'external_modules/BHBconfig.ini'
+        config.read(config_name, encoding='utf-8')
+        return config.getfloat('Sampling', 'sample_rate', fallback=DEFAULT_SAMPLE_RATE)
+
     def process_commands(self,queue,host,port):
         """处理来自socket的指令"""
         while not self.m_client:
@@ -379,14 +453,8 @@ class BleReceiver:
         # char = self.m_client.get_characteristic(WRITE_CH1)
         if self.m_client and self.m_client.is_connected:
             if DEBUG_PRINT_ON:
-                print(f"Sending control command char 40: {command_data}")
-            is_ble = "ble" in self.m_device_name.lower()
-            is_msm = "msm" in self.m_device_name.lower()
-            
-            if is_ble and not is_msm:
-                await self.m_client.write_gatt_char(40, command_data)
-            else:
-                await self.m_client.write_gatt_char(8, command_data)
+                print(f"Sending control command char {self.profile.write_handle}: {command_data}")
+            await self.m_client.write_gatt_char(self.profile.write_handle, command_data)
 
     def run_async(self, coro):
         """在子线程中运行异步协程"""
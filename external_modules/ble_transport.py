@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+蓝牙传输层
+BleReceiver 通过 transport 对象扫描与连接设备，而不是直接依赖 BleakScanner / BleakClient:
+    await transport.discover()        -> 设备列表 (含 name / address / rssi 属性)
+    transport.client(address)         -> 异步上下文管理器，提供 start_notify / write_gatt_char /
+                                         is_connected / services / mtu_size
+
+BleakTransport 对应真实硬件；SimulatedTransport 在进程内模拟一个或多个头戴设备，
+按 device_profiles 中的帧格式生成数据 (序号、trigger、电量字段)，并响应 0x02 / 0xFF 控制指令，
+用于无硬件时的端到端压测。设备名以 "SIM" 开头时自动使用模拟设备，例如 SIM_MSM、SIM_MSM_C16、
+SIM_BCI_BLE。模拟参数读取自 BHBconfig.ini 的 [Simulation] 段。
+"""
+
+import asyncio
+import configparser
+import os
+import random
+from types import SimpleNamespace
+
+import numpy as np
+
+try:
+    from .device_profiles import resolve_profile
+except ImportError:
+    from device_profiles import resolve_profile
+
+SIMULATED_PREFIX = "SIM"
+SIMULATED_SYNC = b"\xAA\x55"    # 模拟设备使用的帧头
+
+
+class BleakTransport:
+    """基于 bleak 的真实蓝牙传输"""
+    sync_word = None    # 真实设备帧头取自 DeviceProfile.sync_word，未登记时由 PacketRingBuffer 学习
+
+    async def discover(self):
+        from bleak import BleakScanner
+        return await BleakScanner.discover()
+
+    def client(self, address):
+        from bleak import BleakClient
+        return BleakClient(address)
+
+
+class SimulationConfig:
+    """模拟设备参数"""
+
+    def __init__(self, sample_rate=500.0, packet_rate=0.0, jitter_ms=0.0, drop_rate=0.0,
+                 fragment_size=0, auto_start=False, seed=None):
+        self.sample_rate = sample_rate
+        self.packet_rate = packet_rate          # 每秒数据包数，0 表示按 sample_rate 推算
+        self.jitter_ms = jitter_ms              # 每包额外随机延迟上限
+        self.drop_rate = drop_rate              # 丢包概率 (序号照常递增)
+        self.fragment_size = fragment_size      # >0 时将每包拆分为该长度的多次通知
+        self.auto_start = auto_start            # True 时无需 0x02 0x01 指令即开始发送
+        self.seed = seed
+
+    @classmethod
+    def from_config(cls):
+        config = configparser.ConfigParser()
+        config_name = os.path.join(os.path.dirname(__file__), 'BHBconfig.ini')
+        if not os.path.exists(config_name):
+            config_name = 'external_modules/BHBconfig.ini'
+        config.read(config_name, encoding='utf-8')
+        sample_rate = config.getfloat('Sampling', 'sample_rate', fallback=500.0)
+        if not config.has_section('Simulation'):
+            return cls(sample_rate=sample_rate)
+        section = config['Simulation']
+        seed = section.get('seed', '').strip()
+        return cls(
+            sample_rate=sample_rate,
+            packet_rate=section.getfloat('packet_rate', 0.0),
+            jitter_ms=section.getfloat('jitter_ms', 0.0),
+            drop_rate=section.getfloat('drop_rate', 0.0),
+            fragment_size=section.getint('fragment_size', 0),
+            auto_start=section.getboolean('auto_start', False),
+            seed=int(seed) if seed else None,
+        )
+
+
+class SimulatedHeadset:
+    """按设备布局生成数据包的模拟头戴设备"""
+
+    def __init__(self, name, config):
+        self.name = name
+        self.address = f"SIM:{name}"
+        self.profile = resolve_profile(name)
+        self.config = config
+        self.rng = np.random.default_rng(config.seed)
+        self.seq = 0
+        self.sample_index = 0
+        self.trigger = 0
+        self.battery = 4100
+        self.streaming = config.auto_start
+        ch = self.profile.channel_num
+        self._freqs = 8.0 + np.arange(ch) * 0.5      # 每通道不同频率的正弦
+        self._amplitude = 50.0 * 120                   # 约 50 个存储单位 (CSV 中除以 120)
+
+    @property
+    def packet_rate(self):
+        if self.config.packet_rate > 0:
+            return self.config.packet_rate
+        return self.config.sample_rate / self.profile.samples_per_frame
+
+    def handle_command(self, data):
+        """响应控制指令：0x02 0x01 开始采集 / 0x02 0x02 停止采集 / 0xFF x 在下一包打 trigger"""
+        if len(data) < 2:
+            return
+        if data[0] == 0x02:
+            if data[1] == 0x01:
+                self.streaming = True
+            elif data[1] == 0x02:
+                self.streaming = False
+        elif data[0] == 0xFF:
+            self.trigger = data[1]
+
+    def next_packet(self):
+        profile = self.profile
+        n = profile.samples_per_frame
+        ch = profile.channel_num
+        t = (self.sample_index + np.arange(n)) / self.config.sample_rate
+        values = self._amplitude * np.sin(2 * np.pi * self._freqs[None, :] * t[:, None])
+        values += self.rng.normal(0.0, self._amplitude * 0.1, size=values.shape)
+        counts = values.astype(np.int32) & 0xFFFFFF
+        triplets = np.stack([(counts >> 16) & 0xFF, (counts >> 8) & 0xFF, counts & 0xFF], axis=-1)
+
+        packet = np.zeros(profile.data_length, dtype=np.uint8)
+        packet[:len(SIMULATED_SYNC)] = np.frombuffer(SIMULATED_SYNC, dtype=np.uint8)
+        if profile.seq_offset is not None:
+            packet[profile.seq_offset] = self.seq
+        frames = np.zeros((n, profile.single_frame), dtype=np.uint8)
+        frames[:, :ch * 3] = triplets.reshape(n, ch * 3)
+        eeg_end = profile.head_len + profile.single_frame * n
+        packet[profile.head_len:eeg_end] = frames.reshape(-1)
+        if self.trigger:
+            # 单次脉冲：trigger 只出现在紧接指令之后的一个数据包 (逐点 trigger 时为首个采样点)
+            packet[eeg_end] = self.trigger
+            self.trigger = 0
+        packet[profile.battery_offset] = (self.battery >> 8) & 0xFF
+        packet[profile.battery_offset + 1] = self.battery & 0xFF
+
+        self.seq = (self.seq + 1) % 256
+        self.sample_index += n
+        return packet.tobytes()
+
+
+class SimulatedClient:
+    """模拟的 BleakClient"""
+
+    def __init__(self, headset):
+        self.headset = headset
+        self.is_connected = False
+        self.services = []
+        self.mtu_size = 512
+        self._task = None
+        self.packets_sent = 0
+        self.packets_dropped = 0
+
+    async def __aenter__(self):
+        self.is_connected = True
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop_notify(self.headset.profile.notify_handle)
+        self.is_connected = False
+
+    async def start_notify(self, handle, callback):
+        if handle != self.headset.profile.notify_handle:
+            raise ValueError(f"模拟设备 {self.headset.name} 不支持通知句柄 {handle}")
+        self._task = asyncio.get_running_loop().create_task(self._stream(handle, callback))
+
+    async def stop_notify(self, handle):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def write_gatt_char(self, handle, data, response=None):
+        if handle != self.headset.profile.write_handle:
+            raise ValueError(f"模拟设备 {self.headset.name} 不支持写入句柄 {handle}")
+        self.headset.handle_command(bytes(data))
+
+    async def _deliver(self, callback, handle, data):
+        result = callback(handle, bytearray(data))
+        if asyncio.iscoroutine(result):
+            await result
+
+    async def _stream(self, handle, callback):
+        headset = self.headset
+        config = headset.config
+        loop = asyncio.get_running_loop()
+        rng = random.Random(config.seed)
+        interval = 1.0 / headset.packet_rate
+        next_time = loop.time()
+        while True:
+            if not headset.streaming:
+                await asyncio.sleep(0.05)
+                next_time = loop.time()
+                continue
+            next_time += interval
+            delay = next_time - loop.time()
+            if config.jitter_ms > 0:
+                delay += rng.uniform(0.0, config.jitter_ms / 1000.0)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            packet = headset.next_packet()
+            if config.drop_rate > 0 and rng.random() < config.drop_rate:
+                self.packets_dropped += 1
+                continue
+            step = config.fragment_size if config.fragment_size > 0 else len(packet)
+            for start in range(0, len(packet), step):
+                await self._deliver(callback, handle, packet[start:start + step])
+            self.packets_sent += 1
+
+
+class SimulatedTransport:
+    """进程内模拟设备传输，discover() 返回所有已登记的模拟设备"""
+    sync_word = SIMULATED_SYNC
+
+    def __init__(self, device_names, config=None):
+        self.config = config or SimulationConfig.from_config()
+        self.headsets = {}
+        for index, name in enumerate(device_names):
+            cfg = self.config
+            if cfg.seed is not None:
+                cfg = SimulationConfig(**{**vars(cfg), 'seed': cfg.seed + index})
+            headset = SimulatedHeadset(name, cfg)
+            self.headsets[headset.address] = headset
+
+    async def discover(self):
+        return [SimpleNamespace(name=h.name, address=h.address, rssi=-40) for h in self.headsets.values()]
+
+    def client(self, address):
+        return SimulatedClient(self.headsets[address])
+
+
+def is_simulated(device_name):
+    return device_name.upper().startswith(SIMULATED_PREFIX)
+
+
+def create_transport(device_names):
+    """根据设备名称选择传输层：全部为 SIM* 时使用模拟设备，否则使用 bleak"""
+    if isinstance(device_names, str):
+        device_names = [device_names]
+    if device_names and all(is_simulated(name) for name in device_names):
+        return SimulatedTransport(device_names)
+    return BleakTransport()
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+offlinedata CSV 批量转换为 .eegrec
+遍历 offlinedata/，将 EEGLogger 的 Category_{id}_{name}.csv 与 xw_web_C8 的 EEG-offline-data-{k}.csv
+按进程池并行转换为同名 .eegrec (int32 计数，可 memmap)，CSV 保留不动。
+
+    - 可中断续跑：.eegrec 文件头记录源 CSV 的大小、mtime 与 SHA-1，再次运行时大小与 mtime 一致即跳过；
+      mtime 变化但内容哈希相同也跳过，只有内容变化的文件才重新转换
+    - 先写入 .part 临时文件，校验通过后 os.replace，中断时不会留下不完整的 .eegrec
+    - 校验：CSV 行数 (哈希时顺带统计)、解析出的采样数、文件头与文件大小推算的采样数一致，且回读数据逐点相同
+    - 由 .eegrec 导出的 CSV (EXPORT_CSV) 不会反向转换
+    - 转换结果登记到 offlinedata/catalog.sqlite
+
+用法:
+    python external_modules/csv_convert.py offlinedata
+    python external_modules/csv_convert.py offlinedata --workers 4 --force
+"""
+
+import argparse
+import concurrent.futures
+import hashlib
+import os
+import re
+import time
+
+import numpy as np
+
+try:
+    from . import eeg_recording
+    from .session_catalog import SessionCatalog
+except ImportError:
+    import eeg_recording
+    from session_catalog import SessionCatalog
+
+CSV_PATTERN = re.compile(r"^(Category_.+|EEG-offline-data-\d+)\.csv$")
+HASH_BLOCK = 1 << 20
+CSV_SCALE = 120.0   # 旧版 CSV 所有列 (含 trigger) 均为计数除以 120
+
+
+def find_csv_files(root):
+    """递归查找需要转换的 CSV 文件"""
+    found = []
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if CSV_PATTERN.match(name):
+                found.append(os.path.join(dirpath, name))
+    return sorted(found)
+
+
+def target_path(csv_path):
+    return os.path.splitext(csv_path)[0] + eeg_recording.EXTENSION
+
+
+def hash_file(path):
+    """返回 (SHA-1, 行数)，一次读取同时完成"""
+    digest = hashlib.sha1()
+    lines = 0
+    last = b"\n"
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(HASH_BLOCK)
+            if not block:
+                break
+            digest.update(block)
+            lines += block.count(b"\n")
+            last = block[-1:]
+    if last != b"\n":
+        lines += 1
+    return digest.hexdigest(), lines
+
+
+def _source_info(path):
+    st = os.stat(path)
+    return {'name': os.path.basename(path), 'size': st.st_size, 'mtime': st.st_mtime}
+
+
+def check_converted(csv_path):
+    """
+    判断 CSV 是否已转换
+    :return: (是否跳过, 原因, 已计算的 (哈希, 行数) 或 None)
+    """
+    out_path = target_path(csv_path)
+    if not os.path.exists(out_path):
+        return False, None, None
+    try:
+        source = eeg_recording.read_header(out_path).get('source')
+    except (OSError, ValueError):
+        return False, None, None
+    if source is None:
+        # 由 .eegrec 导出的 CSV，.eegrec 才是原始录制
+        return True, "exported from recording", None
+    info = _source_info(csv_path)
+    if source.get('size') == info['size'] and source.get('mtime') == info['mtime']:
+        return True, "up to date", None
+    hashed = hash_file(csv_path)
+    if source.get('sha1') == hashed[0]:
+        # 仅 mtime 变化 (如拷贝)：更新文件头中的记录，下次不必再计算哈希
+        header = eeg_recording.read_header(out_path)
+        header['source'].update(info)
+        with open(out_path, 'r+b') as f:
+            f.write(eeg_recording.encode_header(header))
+        return True, "unchanged content", hashed
+    return False, None, hashed
+
+
+def read_csv_counts(csv_path):
+    """读取旧版 CSV (pandas 索引列 + 计数 / 120) 并还原为 int32 计数，空值为 MISSING"""
+    try:
+        import pandas as pd
+    except ImportError:
+        values = np.genfromtxt(csv_path, delimiter=",", skip_header=1, dtype=np.float64)
+        values = values.reshape(len(values), -1)[:, 1:] if values.size else np.empty((0, 0))
+    else:
+        values = pd.read_csv(csv_path, index_col=0, dtype=np.float64).to_numpy()
+    return eeg_recording.to_counts(values * CSV_SCALE)
+
+
+def convert_file(csv_path, sample_rate, force=False):
+    """
+    转换单个 CSV (在工作进程中执行)
+    :return: 结果 dict，status 为 converted / skipped / failed
+    """
+    result = {'csv': csv_path, 'path': target_path(csv_path)}
+    try:
+        hashed = None
+        if not force:
+            skip, reason, hashed = check_converted(csv_path)
+            if skip:
+                return dict(result, status='skipped', message=reason)
+        info = _source_info(csv_path)
+        sha1, lines = hashed or hash_file(csv_path)
+        counts = read_csv_counts(csv_path)
+        rows = max(lines - 1, 0)   # 去掉表头行
+        if len(counts) != rows:
+            raise ValueError(f"parsed {len(counts)} samples but CSV has {rows} rows")
+
+        extra = {'source': dict(info, sha1=sha1), 'converted_time': time.time()}
+        first_timestamp = None
+        duration = None
+        ts = eeg_recording.open_timestamps(csv_path)
+        if ts is not None and len(ts) == len(counts):
+            # save_data / EEGLogger 写出的 .ts 旁路文件与 .eegrec 同名，直接沿用
+            extra['timestamps'] = os.path.basename(eeg_recording.timestamps_path(csv_path))
+            if np.isfinite(ts[0]) and np.isfinite(ts[-1]):
+                first_timestamp = float(ts[0])
+                duration = float(ts[-1] - ts[0]) + 1.0 / sample_rate
+        del ts
+        gap_samples = int((counts[:, 0] == eeg_recording.MISSING).sum()) if counts.size else 0
+        extra['gap_samples'] = gap_samples
+        if duration is not None:
+            extra['duration'] = duration
+        header = eeg_recording.build_header(counts.shape[1], sample_rate, len(counts),
+                                            first_timestamp=first_timestamp, **extra)
+
+        out_path = result['path']
+        part_path = out_path + ".part"
+        with open(part_path, 'wb') as f:
+            f.write(eeg_recording.encode_header(header))
+            np.ascontiguousarray(counts, dtype=eeg_recording.DTYPE).tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+
+        written, mm = eeg_recording.open_recording(part_path)
+        inferred = (os.path.getsize(part_path) - eeg_recording.HEADER_SIZE) // (
+            eeg_recording.DTYPE.itemsize * max(counts.shape[1], 1))
+        ok = written['samples'] == rows == inferred and np.array_equal(mm, counts)
+        del mm
+        if not ok:
+            os.remove(part_path)
+            raise ValueError(f"verification failed: header {written['samples']}, file {inferred}, rows {rows}")
+        os.replace(part_path, out_path)
+        return dict(result, status='converted', samples=len(counts), channels=counts.shape[1],
+                    gap_samples=gap_samples, duration=duration, first_timestamp=first_timestamp,
+                    message=f"{len(counts)} samples")
+    except Exception as e:
+        return dict(result, status='failed', message=str(e))
+
+
+def convert_tree(root, workers=None, force=False, catalog=True, progress=print):
+    """
+    并行转换 root 下的所有 CSV
+    :return: 各状态的文件数
+    """
+    files = find_csv_files(root)
+    sample_rate = eeg_recording.read_sample_rate()
+    session_catalog = SessionCatalog(root) if catalog and files else None
+    totals = {'converted': 0, 'skipped': 0, 'failed': 0}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(convert_file, path, sample_rate, force) for path in files]
+        for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            result = future.result()
+            totals[result['status']] += 1
+            progress(f"[{done}/{len(files)}] {result['status']:<9} {result['csv']}: {result.get('message', '')}")
+            if result['status'] == 'converted' and session_catalog is not None:
+                try:
+                    session_catalog.add_recording(
+                        result['path'], result['samples'], result['channels'], sample_rate,
+                        duration=result['duration'], gap_samples=result['gap_samples'],
+                        first_timestamp=result['first_timestamp'],
+                    )
+                except Exception as e:
+                    progress(f"catalog update failed for {result['path']}: {e}")
+    return totals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert offlinedata CSV recordings to .eegrec")
+    parser.add_argument("root", nargs="?", default="offlinedata")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认为 CPU 核数")
+    parser.add_argument("--force", action="store_true", help="忽略已有转换结果，全部重新转换")
+    parser.add_argument("--no-catalog", action="store_true", help="不更新 catalog.sqlite")
+    args = parser.parse_args()
+    t0 = time.perf_counter()
+    totals = convert_tree(args.root, args.workers, args.force, catalog=not args.no_catalog)
+    print(f"converted {totals['converted']}, skipped {totals['skipped']}, failed {totals['failed']} "
+          f"in {time.perf_counter() - t0:.1f}s")
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+设备协议配置注册表
+按设备系列与通道数登记数据包布局与 GATT 句柄，连接时根据设备名称解析一次，
+接收回调中不再做任何字符串判断。
+
+已登记的布局:
+    msm  (MSM / MSM_C16 ...):   帧头 3 字节 (第 3 字节为帧序号), 每包 1 个共享 trigger 字节
+    ble  (BCI_BLE_xxx):         帧头 2 字节, 每采样点各 1 个 trigger 字节
+8 通道布局来自设备协议；16/32 通道按相同的帧尾结构 (trigger 后电量偏移不变) 推导。
+两个系列帧头的前 2 字节为固定值；协议中的具体取值已知时登记到 sync_word，未登记时由接收端从数据中学习。
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+try:
+    from .frame_decoder import FrameDecoder, SAMPLES_PER_FRAME
+    from .packet_ring import PacketRingBuffer
+except ImportError:
+    from frame_decoder import FrameDecoder, SAMPLES_PER_FRAME
+    from packet_ring import PacketRingBuffer
+
+DEFAULT_CHANNEL_NUM = 8
+_CHANNEL_SUFFIX = re.compile(r"_C(\d+)\b", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class DeviceProfile:
+    """单个设备型号的数据包布局"""
+    family: str
+    channel_num: int
+    data_length: int          # 单个数据包字节数
+    head_len: int             # 帧头字节数
+    single_frame: int         # 单个采样帧字节数
+    trigger_length: int       # trigger 字段字节数
+    battery_offset: int       # 电量字段起始偏移 (2 字节大端)
+    notify_handle: int        # 数据通知特征句柄
+    write_handle: int         # 控制指令特征句柄
+    seq_offset: Optional[int] = None   # 帧序号字节偏移，None 表示该协议不含序号
+    samples_per_frame: int = SAMPLES_PER_FRAME
+    sync_word: Optional[bytes] = None  # 固定帧头字节，None 表示未登记 (由 PacketRingBuffer 学习)
+    sync_length: int = 2               # 帧头中固定不变的前导字节数 (不含帧序号)
+
+    @property
+    def key(self):
+        return f"{self.family}_{self.channel_num}"
+
+    @property
+    def battery_slice(self):
+        return slice(self.battery_offset, self.battery_offset + 2)
+
+    def make_ring(self, sync_word=None, **kwargs):
+        """按本布局创建重组缓冲区；sync_word 可覆盖登记的帧头 (例如模拟设备)"""
+        return PacketRingBuffer(self.data_length, sync_word=sync_word or self.sync_word,
+                                sync_length=self.sync_length, **kwargs)
+
+    def make_decoder(self):
+        return FrameDecoder(self.channel_num, self.data_length, self.head_len, self.single_frame,
+                            self.trigger_length, self.samples_per_frame)
+
+
+_PROFILES = {}
+
+
+def register_profile(profile):
+    """登记设备布局，相同系列与通道数的布局会被覆盖"""
+    _PROFILES[(profile.family, profile.channel_num)] = profile
+    return profile
+
+
+def get_profile(family, channel_num):
+    try:
+        return _PROFILES[(family, channel_num)]
+    except KeyError:
+        supported = sorted(k for f, k in _PROFILES if f == family)
+        raise ValueError(f"未登记的设备布局: {family} {channel_num} 通道 (已支持: {supported})") from None
+
+
+def device_family(device_name):
+    """根据设备名称判断协议系列"""
+    name = device_name.lower()
+    if "ble" in name and "msm" not in name:
+        return "ble"
+    return "msm"
+
+
+def resolve_profile(device_name, channel_num=None):
+    """
+    解析设备名称对应的布局
+    通道数优先取名称中的 _C16/_C32 后缀，其次为配置文件中的通道数，最后为 8
+    """
+    match = _CHANNEL_SUFFIX.search(device_name)
+    if match:
+        channel_num = int(match.group(1))
+    elif not channel_num:
+        channel_num = DEFAULT_CHANNEL_NUM
+    return get_profile(device_family(device_name), channel_num)
+
+
+def _msm_profile(channel_num):
+    trigger_end = 3 + 3 * channel_num * SAMPLES_PER_FRAME + 1
+    return DeviceProfile(family="msm", channel_num=channel_num, data_length=trigger_end + 16,
+                         head_len=3, single_frame=3 * channel_num, trigger_length=1,
+                         battery_offset=trigger_end + 12, notify_handle=5, write_handle=8, seq_offset=2)
+
+
+def _ble_profile(channel_num):
+    trigger_end = 2 + 3 * channel_num * SAMPLES_PER_FRAME + SAMPLES_PER_FRAME
+    return DeviceProfile(family="ble", channel_num=channel_num, data_length=trigger_end + 17,
+                         head_len=2, single_frame=3 * channel_num, trigger_length=SAMPLES_PER_FRAME,
+                         battery_offset=trigger_end + 11, notify_handle=42, write_handle=40)
+
+
+for _ch in (8, 16, 32):
+    register_profile(_msm_profile(_ch))
+    register_profile(_ble_profile(_ch))
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+实时波形显示数据通路
+采集端把每块新采样 (除以 120 后的 float32) 写入固定大小的共享内存环形缓冲 (SharedSampleRing，带写位置)，
+显示端按各自的读位置只取新增采样，放入本地固定窗口，绘制前按屏幕宽度做 min/max 抽取。
+每帧的开销只与窗口长度和屏幕宽度有关，与录制时长无关，也不再经过 pickle / multiprocessing.Queue。
+
+    DisplayStream  : 采集端，收到第一块数据时按通道数创建共享内存
+    DisplayReader  : 显示端，可传入 DisplayStream (同一进程) 或共享内存名称 (其他进程，如 PSD 服务)
+    minmax_decimate: 每个像素列保留最小值与最大值，尖峰不会因抽取而丢失
+
+用法:
+    stream = DisplayStream()
+    stream.write(chunk, timestamps)             # 采集线程
+    reader = DisplayReader(stream)              # 显示端 (或 DisplayReader(stream.name))
+    if reader.poll():
+        points = reader.decimated(width)        # (2 * width, channels)
+"""
+
+import numpy as np
+
+try:
+    from .sample_buffer import SampleRing
+    from .shm_ring import SharedSampleRing
+except ImportError:
+    from sample_buffer import SampleRing
+    from shm_ring import SharedSampleRing
+
+DISPLAY_SECONDS = 10        # 显示窗口长度
+RING_SECONDS = 30           # 共享内存容量，显示端短暂卡顿时不丢数据
+DISPLAY_SCALE = 1.0 / 120   # 与 CSV 一致：ADC 计数除以 120
+
+
+def minmax_decimate(data, bins):
+    """
+    按列 min/max 抽取
+    :param data: (samples, channels)
+    :param bins: 输出的区间数 (通常为屏幕像素宽度)
+    :return: (2 * bins, channels)，每个区间依次为最小值、最大值；数据不足时原样返回
+    """
+    n = len(data)
+    if n <= 2 * bins:
+        return data
+    edges = np.linspace(0, n, bins + 1).astype(np.int64)[:-1]
+    out = np.empty((2 * bins, data.shape[1]), dtype=data.dtype)
+    # fmin / fmax 忽略 NaN (丢包占位)，整个区间都是 NaN 时结果仍为 NaN
+    out[0::2] = np.fmin.reduceat(data, edges, axis=0)
+    out[1::2] = np.fmax.reduceat(data, edges, axis=0)
+    return out
+
+
+class DisplayStream:
+    """
+    采集端：单写入方的共享内存显示缓冲
+    :param seconds: 共享内存容量 (秒)
+    """
+
+    def __init__(self, seconds=RING_SECONDS, sample_rate=500.0):
+        self.seconds = seconds
+        self.sample_rate = sample_rate
+        self.ring = None
+
+    @property
+    def name(self):
+        return self.ring.name if self.ring is not None else None
+
+    def open(self, channels, sample_rate=None):
+        """按通道数创建共享内存 (通道数变化时重建)"""
+        if self.ring is not None and self.ring.channels == channels:
+            return self.ring
+        self.close()
+        self.sample_rate = sample_rate or self.sample_rate
+        self.ring = SharedSampleRing(channels, int(self.sample_rate * self.seconds), self.sample_rate)
+        return self.ring
+
+    def write(self, chunk, timestamps):
+        """写入一块 LSL 采样 (原始计数，NaN 为丢包占位)"""
+        chunk = np.asarray(chunk, dtype=np.float32)
+        if not len(chunk):
+            return
+        if self.ring is None or self.ring.channels != chunk.shape[1]:
+            self.open(chunk.shape[1])
+        self.ring.write(chunk * np.float32(DISPLAY_SCALE), np.asarray(timestamps, dtype=np.float64))
+
+    def close(self):
+        if self.ring is not None:
+            ring, self.ring = self.ring, None
+            ring.close()
+            ring.unlink()
+
+
+class DisplayReader:
+    """
+    显示端：从写位置读取新增采样，保留最近 seconds 秒
+    :param source: DisplayStream 或共享内存名称
+    """
+
+    def __init__(self, source, seconds=DISPLAY_SECONDS):
+        self.source = source
+        self.seconds = seconds
+        self.ring = None
+        self.read_index = 0
+        self.overrun_samples = 0
+        self.window = None
+
+    def _attach(self):
+        if isinstance(self.source, str):
+            ring = self.ring or SharedSampleRing.attach(self.source)
+        else:
+            ring = self.source.ring
+        if ring is None:
+            return None
+        if ring is not self.ring:
+            # 首次连接或采集端重建了缓冲区：从当前窗口开始读
+            self.ring = ring
+            self.window = SampleRing(int(ring.sample_rate * self.seconds), dtype=np.float32)
+            self.read_index = max(ring.write_index - self.window.capacity, 0)
+        return ring
+
+    def poll(self):
+        """读取新增采样，返回新增的采样点数"""
+        ring = self._attach()
+        if ring is None:
+            return 0
+        data, _, self.read_index, overrun = ring.read(self.read_index)
+        self.overrun_samples += overrun
+        self.window.extend(data)
+        return len(data)
+
+    def latest(self):
+        """当前窗口 (samples, channels)，按时间顺序"""
+        if self.window is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return self.window.latest()
+
+    def decimated(self, bins):
+        """当前窗口按 bins 个区间做 min/max 抽取"""
+        return minmax_decimate(self.latest(), max(int(bins), 1))
+
+    def close(self):
+        if isinstance(self.source, str) and self.ring is not None:
+            self.ring.close()
+        self.ring = None
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+录制文件读取接口 (惰性 memmap)
+打开 EEGLogger 生成的实验文件夹，每首歌对应一个 Recording：
+    - data:     (channels, samples) 的 int32 memmap 视图 (文件按采样点行优先存储，此处为转置视图，不复制)
+    - get_data: 只读取所需窗口并换算为物理量，切片只触及对应的文件页
+    - channel_names / sample_rate / events (trigger 上升沿，首次访问时分块扫描)
+    - markers:  刺激事件标记 (歌曲开始/结束等，来自 .events.tsv)
+
+打开文件只读取 4 KB 文件头，不读取数据；跨被试按歌曲查找时走 offlinedata/catalog.sqlite，
+无需遍历文件夹。
+
+用法:
+    session = open_session("offlinedata/EEGdata-0209-1")
+    rec = session["江南"]                       # 按歌曲名、文件名或序号
+    window = rec.get_data(30, 45)               # 第 30~45 秒，(channels, samples) float64
+    for rec in open_dataset("offlinedata", song="江南"):
+        print(rec.session, rec.device, rec.data.shape)
+"""
+
+import os
+
+import numpy as np
+
+try:
+    from . import eeg_recording
+    from .session_catalog import SessionCatalog, parse_song
+except ImportError:
+    import eeg_recording
+    from session_catalog import SessionCatalog, parse_song
+
+EVENT_DTYPE = np.dtype([('sample', '<i8'), ('code', '<i4')])
+EVENT_SCAN_SAMPLES = 1 << 20     # 扫描 trigger 列时每块的采样点数
+
+
+def find_events(trigger, previous=0):
+    """
+    trigger 上升沿 (编码变为非零值处)，与 BdfWriter 的标注规则一致
+    :param previous: 第一个采样点之前的 trigger 编码
+    :return: EVENT_DTYPE 数组
+    """
+    trigger = np.asarray(trigger)
+    codes = np.where(trigger == eeg_recording.MISSING, 0, trigger)
+    before = np.concatenate([[previous], codes[:-1]])
+    idx = np.flatnonzero((codes != before) & (codes != 0))
+    events = np.empty(len(idx), dtype=EVENT_DTYPE)
+    events['sample'] = idx
+    events['code'] = codes[idx]
+    return events
+
+
+class Recording:
+    """
+    单个 .eegrec 录制文件，数据在首次访问时才 memmap
+    :param device: 设备名 (多设备文件名后缀)，用于解析歌曲名
+    """
+
+    def __init__(self, path, device=None):
+        self.path = path
+        self.header = eeg_recording.read_header(path)
+        self.device = device or self.header.get('device')
+        self.song_id, self.song_name = parse_song(path, self.device)
+        self._counts = None
+        self._timestamps = None
+        self._events = None
+
+    def __repr__(self):
+        return (f"Recording({os.path.basename(self.path)!r}, {self.n_channels} ch x {self.n_samples} samples, "
+                f"{self.sample_rate:g} Hz)")
+
+    @property
+    def name(self):
+        return os.path.splitext(os.path.basename(self.path))[0]
+
+    @property
+    def session(self):
+        return os.path.basename(os.path.dirname(os.path.abspath(self.path)))
+
+    @property
+    def sample_rate(self):
+        return self.header['sample_rate']
+
+    @property
+    def channel_names(self):
+        return self.header['channel_names']
+
+    @property
+    def n_channels(self):
+        return self.header['channels']
+
+    @property
+    def n_samples(self):
+        return self.header['samples']
+
+    @property
+    def duration(self):
+        """按采样点数计算的时长 (秒)"""
+        return self.n_samples / self.sample_rate
+
+    @property
+    def counts(self):
+        """(samples, channels) 的 int32 memmap"""
+        if self._counts is None:
+            self.header, self._counts = eeg_recording.open_recording(self.path)
+        return self._counts
+
+    @property
+    def data(self):
+        """(channels, samples) 的 int32 memmap 视图"""
+        return self.counts.T
+
+    @property
+    def timestamps(self):
+        """每个采样点的 LSL 时间戳 (memmap)，无 .ts 文件时为 None"""
+        if self._timestamps is None:
+            self._timestamps = eeg_recording.open_timestamps(self.path)
+        return self._timestamps
+
+    @property
+    def events(self):
+        """trigger 事件 (sample, code)，首次访问时分块扫描 trigger 列"""
+        if self._events is None:
+            trig = self.header['trigger_channel']
+            parts, previous = [], 0
+            for start in range(0, self.n_samples, EVENT_SCAN_SAMPLES):
+                block = np.asarray(self.counts[start:start + EVENT_SCAN_SAMPLES, trig])
+                found = find_events(block, previous)
+                found['sample'] += start
+                parts.append(found)
+                previous = 0 if block[-1] == eeg_recording.MISSING else int(block[-1])
+            self._events = np.concatenate(parts) if parts else np.empty(0, dtype=EVENT_DTYPE)
+        return self._events
+
+    @property
+    def markers(self):
+        """事件标记 (.events.tsv，见 event_markers)，[dict(onset, sample, timestamp, code, label)]"""
+        return eeg_recording.read_events(self.path)
+
+    def get_data(self, start=None, stop=None, picks=None, physical=True):
+        """
+        读取 [start, stop) 秒的数据，只读取该窗口
+        :param picks: 通道名或序号列表，默认全部通道
+        :param physical: True 时换算为物理量 (丢包占位为 NaN，trigger 保持原始编码)，否则返回 int32 计数
+        :return: (channels, samples) 数组
+        """
+        i0 = 0 if start is None else min(max(int(np.ceil(start * self.sample_rate)), 0), self.n_samples)
+        i1 = self.n_samples if stop is None else min(max(int(np.ceil(stop * self.sample_rate)), i0),
+                                                     self.n_samples)
+        return self._read(self.counts[i0:i1], picks, physical)
+
+    def get_time_window(self, start, end, picks=None, physical=True, relative=True):
+        """
+        按 LSL 时间戳读取窗口 (经 .tsidx 二分查找，丢包未填充时仍准确)
+        :return: (data (channels, samples), timestamps)
+        """
+        counts, timestamps = eeg_recording.time_slice(self.path, start, end, relative)
+        return self._read(counts, picks, physical), timestamps
+
+    def _read(self, counts, picks, physical):
+        if picks is not None:
+            if isinstance(picks, (str, int)):
+                picks = [picks]
+            picks = [self.channel_names.index(p) if isinstance(p, str) else p for p in picks]
+            counts = counts[:, picks]
+        counts = np.asarray(counts)
+        if not physical:
+            return counts.T
+        out = counts.astype(np.float64)
+        out[counts == eeg_recording.MISSING] = np.nan
+        trig = self.header['trigger_channel']
+        columns = picks if picks is not None else range(counts.shape[1])
+        scale = np.array([1.0 if c == trig else self.header['scale'] for c in columns])
+        return (out * scale).T
+
+    def close(self):
+        """释放 memmap (Windows 下删除或覆盖文件前需要)"""
+        self._counts = None
+        self._timestamps = None
+
+
+class Session:
+    """实验文件夹中的全部 .eegrec 录制，按保存顺序排列"""
+
+    def __init__(self, folder):
+        self.folder = folder
+        paths = [os.path.join(folder, name) for name in os.listdir(folder)
+                 if name.endswith(eeg_recording.EXTENSION)]
+        self.recordings = [Recording(path) for path in sorted(paths, key=os.path.getmtime)]
+
+    def __repr__(self):
+        return f"Session({os.path.basename(self.folder)!r}, {len(self.recordings)} recordings)"
+
+    def __len__(self):
+        return len(self.recordings)
+
+    def __iter__(self):
+        return iter(self.recordings)
+
+    def __getitem__(self, key):
+        """按序号、歌曲名或文件名 (不含扩展名) 取录制"""
+        if isinstance(key, int):
+            return self.recordings[key]
+        for rec in self.recordings:
+            if key in (rec.song_name, rec.name):
+                return rec
+        raise KeyError(key)
+
+    @property
+    def songs(self):
+        return [rec.song_name for rec in self.recordings]
+
+
+def open_recording(path):
+    return Recording(path)
+
+
+def open_session(folder):
+    return Session(folder)
+
+
+def open_dataset(offline_dir, song=None, song_id=None, device=None):
+    """
+    通过 catalog.sqlite 打开符合条件的全部录制 (跨被试)
+    :return: Recording 列表
+    """
+    rows = SessionCatalog(offline_dir).recordings(song=song, song_id=song_id, device=device)
+    return [Recording(row['path'], row['device']) for row in rows
+            if row['path'].endswith(eeg_recording.EXTENSION) and os.path.exists(row['path'])]
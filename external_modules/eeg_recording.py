@@ -0,0 +1,498 @@
+# -*- coding: utf-8 -*-
+"""
+EEG 二进制录制格式 (.eegrec)
+保存原始 int32 ADC 计数而非除以 120 后的浮点文本，体积约为 CSV 的 1/5，且可直接 np.memmap 读取。
+
+文件结构 (小端):
+    文件头: 固定 HEADER_SIZE 字节 = MAGIC (8 字节) | JSON 长度 uint32 | UTF-8 JSON，其余以空格填充
+    数据:   int32[samples, channels]，行优先，最后一列为 trigger
+
+时间戳旁路文件 (与 .eegrec 同名):
+    .ts    : float64[samples]，每个采样点的 LSL 时间戳，可 memmap
+    .tsidx : 稀疏时间索引 (offset int64, timestamp float64)，每 INDEX_INTERVAL 秒一条，
+             时间戳不连续 (丢包未填充、重新锚定) 处额外一条；按时间取片段时先在索引上二分查找，
+             再只在两条索引之间的 .ts 范围内精确定位，无需扫描整个文件
+    .events.tsv: 事件标记 (event_markers)，制表符分隔: onset (相对首个采样点的秒数)、sample、
+             timestamp (LSL)、code (设备 trigger 码，无则为 n/a)、label
+
+JSON 字段: version, dtype, channels, samples, sample_rate, scale, channel_names,
+           trigger_channel, first_timestamp (首个采样点的 LSL 时间戳), start_time (wall time) 等。
+丢包占位 (LSL 中的 NaN) 以 MISSING (int32 最小值) 存储，to_physical() 还原为 NaN。
+
+用法:
+    counts, timestamps = time_slice("Category_3_xxx.eegrec", 30, 45)   # 第 30~45 秒
+    python external_modules/eeg_recording.py info  offlinedata/EEGdata-0209-1/Category_1_xxx.eegrec
+    python external_modules/eeg_recording.py csv   offlinedata/EEGdata-0209-1/Category_1_xxx.eegrec
+"""
+
+import argparse
+import ast
+import configparser
+import json
+import os
+import queue
+import struct
+import threading
+import time
+
+import numpy as np
+
+MAGIC = b"EEGREC\x00\x01"
+FORMAT_VERSION = 1
+HEADER_SIZE = 4096
+EXTENSION = ".eegrec"
+DTYPE = np.dtype("<i4")
+MISSING = np.iinfo(np.int32).min
+DEFAULT_SCALE = 1.0 / 120.0     # 与 xw_web_C8.py 的 CSV 保存一致：ADC 计数除以 120
+FSYNC_INTERVAL = 1.0            # 流式写入时 flush + fsync 的间隔 (秒)，崩溃时最多丢失这段数据
+TIMESTAMP_EXTENSION = ".ts"
+INDEX_EXTENSION = ".tsidx"
+TIMESTAMP_DTYPE = np.dtype("<f8")
+INDEX_DTYPE = np.dtype([('offset', '<i8'), ('timestamp', '<f8')])
+INDEX_INTERVAL = 1.0            # 稀疏时间索引的间隔 (秒)
+EVENTS_EXTENSION = ".events.tsv"
+EVENTS_COLUMNS = ("onset", "sample", "timestamp", "code", "label")
+_JSON_LEN = struct.Struct("<I")
+
+
+def _read_config():
+    config = configparser.ConfigParser()
+    config_name = os.path.join(os.path.dirname(__file__), 'BHBconfig.ini')
+    if not os.path.exists(config_name):
+        config_name = 'external_modules/BHBconfig.ini'
+    config.read(config_name, encoding='utf-8')
+    return config
+
+
+def read_sample_rate(default=500.0):
+    """读取 BHBconfig.ini 中的标称采样率"""
+    return _read_config().getfloat('Sampling', 'sample_rate', fallback=default)
+
+
+def channel_names_for(channels):
+    """
+    按 BHBconfig.ini 的通道名生成 channels 列的名称，最后一列为 Trigger
+    配置中的名称不足时以 Ch{n} 补齐
+    """
+    config = _read_config()
+    try:
+        names = list(ast.literal_eval(config['Channel']['channel_names']))
+    except (KeyError, ValueError, SyntaxError):
+        names = []
+    eeg = channels - 1
+    names = [str(n) for n in names[:eeg]]
+    names += [f"Ch{i + 1}" for i in range(len(names), eeg)]
+    return names + ["Trigger"]
+
+
+def to_counts(data):
+    """将 LSL 拉取的采样 (list 或 float 数组，NaN 为丢包占位) 转为 int32 计数"""
+    arr = np.asarray(data, dtype=np.float64)
+    if arr.ndim == 1:
+        arr = arr.reshape(-1, 1)
+    missing = np.isnan(arr)
+    counts = np.rint(np.where(missing, 0.0, arr)).astype(np.int32)
+    counts[missing] = MISSING
+    return counts
+
+
+def build_header(channels, sample_rate, samples=-1, channel_names=None, scale=DEFAULT_SCALE,
+                 first_timestamp=None, **extra):
+    header = {
+        'version': FORMAT_VERSION,
+        'dtype': DTYPE.str,
+        'channels': int(channels),
+        'samples': int(samples),
+        'sample_rate': float(sample_rate),
+        'scale': scale,
+        'channel_names': channel_names or channel_names_for(channels),
+        'trigger_channel': int(channels) - 1,
+        'missing_value': int(MISSING),
+        'first_timestamp': first_timestamp,
+    }
+    header.update(extra)
+    return header
+
+
+def encode_header(header):
+    blob = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    if len(MAGIC) + _JSON_LEN.size + len(blob) > HEADER_SIZE:
+        raise ValueError("录制文件头超过 HEADER_SIZE")
+    head = MAGIC + _JSON_LEN.pack(len(blob)) + blob
+    return head + b" " * (HEADER_SIZE - len(head))
+
+
+def timestamps_path(path):
+    return os.path.splitext(path)[0] + TIMESTAMP_EXTENSION
+
+
+def index_path(path):
+    return os.path.splitext(path)[0] + INDEX_EXTENSION
+
+
+class TimeIndexBuilder:
+    """
+    增量生成稀疏时间索引：每 interval 秒一条，相邻时间戳间隔偏离采样周期超过 1.5 个周期时额外一条
+    """
+
+    def __init__(self, sample_rate, interval=INDEX_INTERVAL):
+        self.period = 1.0 / sample_rate
+        self.step = max(1, int(round(sample_rate * interval)))
+        self.offset = 0
+        self.last = np.nan
+
+    def update(self, timestamps):
+        """登记下一段时间戳，返回新增的索引条目"""
+        ts = np.asarray(timestamps, dtype=np.float64)
+        n = len(ts)
+        if n == 0:
+            return np.empty(0, dtype=INDEX_DTYPE)
+        local = np.arange(n)
+        previous = np.concatenate([[self.last], ts[:-1]])
+        with np.errstate(invalid='ignore'):
+            jump = ~(np.abs(ts - previous - self.period) <= 1.5 * self.period)
+        mask = jump | ((self.offset + local) % self.step == 0)
+        entries = np.empty(int(mask.sum()), dtype=INDEX_DTYPE)
+        entries['offset'] = self.offset + local[mask]
+        entries['timestamp'] = ts[mask]
+        self.offset += n
+        self.last = ts[-1]
+        return entries
+
+    def skip(self, n):
+        """登记 n 个没有时间戳的采样点"""
+        self.offset += n
+        self.last = np.nan
+
+
+def write_timestamps(path, timestamps, sample_rate):
+    """为录制文件 path 写入 .ts 与 .tsidx 旁路文件"""
+    ts = np.ascontiguousarray(timestamps, dtype=TIMESTAMP_DTYPE)
+    ts.tofile(timestamps_path(path))
+    TimeIndexBuilder(sample_rate).update(ts).tofile(index_path(path))
+
+
+def write_recording(path, counts, sample_rate, channel_names=None, scale=DEFAULT_SCALE,
+                    first_timestamp=None, timestamps=None, **extra):
+    """
+    写入完整录制文件
+    :param counts: 形状为 (samples, channels) 的 int32 计数 (可由 to_counts 得到)
+    :param timestamps: 可选，每个采样点的 LSL 时间戳，写入 .ts / .tsidx
+    :return: 文件头 dict
+    """
+    counts = np.ascontiguousarray(counts, dtype=DTYPE)
+    if timestamps is not None and len(timestamps) and first_timestamp is None:
+        first_timestamp = float(timestamps[0])
+    header = build_header(counts.shape[1], sample_rate, len(counts), channel_names, scale,
+                          first_timestamp, **extra)
+    if timestamps is not None:
+        header['timestamps'] = os.path.basename(timestamps_path(path))
+    with open(path, 'wb') as f:
+        f.write(encode_header(header))
+        counts.tofile(f)
+    if timestamps is not None:
+        write_timestamps(path, timestamps, sample_rate)
+    return header
+
+
+class RecordingWriter:
+    """
+    流式录制写入器：采集线程调用 append() 只做入队，专用写入线程将数据块转换为 int32 计数后追加到文件，
+    每 fsync_interval 秒 flush + fsync 一次；finalize() 写完剩余数据并回填文件头中的采样数等信息。
+    文件在收到第一块数据时创建 (此时才能确定通道数)，未收到任何数据时不会产生文件。
+    异常退出时文件头中 samples 为 -1，read_header() 按文件大小推算已写入的采样数。
+    """
+
+    def __init__(self, path, sample_rate, fsync_interval=FSYNC_INTERVAL, channel_names=None, **extra):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.fsync_interval = fsync_interval
+        self.channel_names = channel_names
+        self.extra = extra
+        self.header = None
+        self.samples = 0
+        self.missing_samples = 0
+        self.error = None
+        self._file = None
+        self._ts_file = None
+        self._index_file = None
+        self._index = TimeIndexBuilder(sample_rate)
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name=f"RecordingWriter-{os.path.basename(path)}",
+                                        daemon=True)
+        self._thread.start()
+
+    def append(self, chunk, timestamps=None):
+        """
+        追加一块采样 (samples, channels)，线程安全且不阻塞
+        :param timestamps: 对应的 LSL 时间戳，写入 .ts / .tsidx，首块的第一个时间戳写入文件头
+        """
+        self._queue.put((chunk, timestamps))
+
+    def _open(self, channels, first_timestamp):
+        self.header = build_header(channels, self.sample_rate, -1, self.channel_names,
+                                   first_timestamp=first_timestamp,
+                                   timestamps=os.path.basename(timestamps_path(self.path)), **self.extra)
+        self._file = open(self.path, 'wb')
+        self._file.write(encode_header(self.header))
+        self._ts_file = open(timestamps_path(self.path), 'wb')
+        self._index_file = open(index_path(self.path), 'wb')
+
+    def _sync(self):
+        for f in (self._file, self._ts_file, self._index_file):
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _run(self):
+        last_sync = time.monotonic()
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self.error is not None:
+                continue
+            chunk, timestamps = item
+            try:
+                counts = to_counts(chunk)
+                if self._file is None:
+                    first = float(timestamps[0]) if timestamps is not None and len(timestamps) else None
+                    self._open(counts.shape[1], first)
+                counts.tofile(self._file)
+                if timestamps is None or len(timestamps) != len(counts):
+                    np.full(len(counts), np.nan, dtype=TIMESTAMP_DTYPE).tofile(self._ts_file)
+                    self._index.skip(len(counts))
+                else:
+                    ts = np.asarray(timestamps, dtype=TIMESTAMP_DTYPE)
+                    ts.tofile(self._ts_file)
+                    self._index.update(ts).tofile(self._index_file)
+                self.samples += len(counts)
+                self.missing_samples += int((counts[:, 0] == MISSING).sum())
+                now = time.monotonic()
+                if now - last_sync >= self.fsync_interval:
+                    self._sync()
+                    last_sync = now
+            except Exception as e:
+                self.error = e
+
+    def finalize(self, **extra):
+        """
+        写完队列中剩余数据，回填文件头并关闭文件 (阻塞直到完成)
+        :return: 最终文件头，未写入任何数据时返回 None
+        """
+        self._queue.put(None)
+        self._thread.join()
+        if self._file is None:
+            return None
+        try:
+            self.header['samples'] = self.samples
+            self.header.update(extra)
+            self._sync()
+            self._file.seek(0)
+            self._file.write(encode_header(self.header))
+            self._sync()
+        finally:
+            for f in (self._file, self._ts_file, self._index_file):
+                f.close()
+        if self.error is not None:
+            raise self.error
+        return self.header
+
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        head = f.read(HEADER_SIZE)
+    if not head.startswith(MAGIC):
+        raise ValueError(f"不是有效的录制文件: {path}")
+    (length,) = _JSON_LEN.unpack_from(head, len(MAGIC))
+    start = len(MAGIC) + _JSON_LEN.size
+    header = json.loads(head[start:start + length].decode('utf-8'))
+    # 未正常结束的录制 samples 为 -1，按文件大小推算
+    available = (os.path.getsize(path) - HEADER_SIZE) // (DTYPE.itemsize * header['channels'])
+    if header['samples'] < 0 or header['samples'] > available:
+        header['samples'] = int(available)
+    return header
+
+
+def open_recording(path, mode='r'):
+    """
+    以 np.memmap 打开录制文件，不读入内存
+    :return: (header, counts)，counts 形状为 (samples, channels) 的 int32 memmap
+    """
+    header = read_header(path)
+    shape = (header['samples'], header['channels'])
+    if header['samples'] == 0:
+        return header, np.empty(shape, dtype=DTYPE)
+    counts = np.memmap(path, dtype=DTYPE, mode=mode, offset=HEADER_SIZE, shape=shape)
+    return header, counts
+
+
+def open_timestamps(path):
+    """以 memmap 打开 .ts 旁路文件，不存在时返回 None"""
+    ts_path = timestamps_path(path)
+    if not os.path.exists(ts_path) or os.path.getsize(ts_path) < TIMESTAMP_DTYPE.itemsize:
+        return None
+    return np.memmap(ts_path, dtype=TIMESTAMP_DTYPE, mode='r')
+
+
+def read_time_index(path):
+    """读取稀疏时间索引；索引缺失或损坏时由 .ts 重建"""
+    idx_path = index_path(path)
+    if os.path.exists(idx_path) and os.path.getsize(idx_path) % INDEX_DTYPE.itemsize == 0:
+        index = np.fromfile(idx_path, dtype=INDEX_DTYPE)
+        if len(index):
+            return index
+    timestamps = open_timestamps(path)
+    if timestamps is None:
+        return np.empty(0, dtype=INDEX_DTYPE)
+    return TimeIndexBuilder(read_header(path)['sample_rate']).update(timestamps)
+
+
+def locate_time(t, index, sample_rate, samples, timestamps=None):
+    """
+    返回第一个时间戳不早于 t 的采样点位置
+    先在稀疏索引上二分查找，给定 timestamps (memmap) 时只在相邻两条索引之间精确查找
+    """
+    if not len(index):
+        return 0
+    j = int(np.searchsorted(index['timestamp'], t, side='right')) - 1
+    if j < 0:
+        return int(index['offset'][0])
+    lo = int(index['offset'][j])
+    hi = int(index['offset'][j + 1]) if j + 1 < len(index) else samples
+    if timestamps is not None:
+        hi = min(hi, len(timestamps))
+        return lo + int(np.searchsorted(timestamps[lo:hi], t, side='left'))
+    estimate = lo + int(np.ceil((t - index['timestamp'][j]) * sample_rate - 1e-9))
+    return min(max(estimate, lo), hi)
+
+
+def time_slice(path, start, end, relative=True):
+    """
+    按时间读取片段，例如第 30~45 秒
+    :param relative: True 时 start / end 为相对首个采样点的秒数，否则为 LSL 时间戳
+    :return: (counts, timestamps)，均为 memmap 切片；无时间戳文件时按采样率换算，timestamps 为 None
+    """
+    header, counts = open_recording(path)
+    timestamps = open_timestamps(path)
+    index = read_time_index(path)
+    samples = header['samples']
+    if not len(index) or timestamps is None or not np.isfinite(index['timestamp'][0]):
+        rate = header['sample_rate']
+        if relative or header.get('first_timestamp') is None:
+            i0, i1 = int(np.ceil(start * rate)), int(np.ceil(end * rate))
+        else:
+            i0 = int(np.ceil((start - header['first_timestamp']) * rate))
+            i1 = int(np.ceil((end - header['first_timestamp']) * rate))
+        i0, i1 = min(max(i0, 0), samples), min(max(i1, 0), samples)
+        return counts[i0:i1], None
+    origin = index['timestamp'][0] if relative else 0.0
+    i0 = locate_time(origin + start, index, header['sample_rate'], samples, timestamps)
+    i1 = locate_time(origin + end, index, header['sample_rate'], samples, timestamps)
+    i1 = max(min(i1, samples), i0)
+    return counts[i0:i1], timestamps[i0:i1]
+
+
+def events_path(path):
+    return os.path.splitext(path)[0] + EVENTS_EXTENSION
+
+
+def write_events(path, events, sample_rate, first_timestamp=None):
+    """
+    为录制文件 path 写入 .events.tsv
+    采样点位置与 time_slice 一样由 .ts / .tsidx 定位 (第一个时间戳不早于标记的采样点)；
+    没有时间戳文件时按 first_timestamp 与采样率换算。标记晚于最后一个采样点时 sample 等于采样点数。
+    :param events: [(timestamp, code, label)]，timestamp 为 LSL 时间
+    :return: 写入的事件数
+    """
+    if not events:
+        return 0
+    timestamps = open_timestamps(path)
+    index = read_time_index(path) if timestamps is not None else np.empty(0, dtype=INDEX_DTYPE)
+    if len(index) and np.isfinite(index['timestamp'][0]):
+        origin = float(index['timestamp'][0])
+    else:
+        index = np.empty(0, dtype=INDEX_DTYPE)
+        origin = first_timestamp
+    lines = ["\t".join(EVENTS_COLUMNS)]
+    for timestamp, code, label in sorted(events, key=lambda e: e[0]):
+        if len(index):
+            sample = locate_time(timestamp, index, sample_rate, len(timestamps), timestamps)
+        elif origin is not None:
+            sample = max(int(np.ceil((timestamp - origin) * sample_rate - 1e-9)), 0)
+        else:
+            sample = None
+        onset = timestamp - origin if origin is not None else None
+        lines.append("\t".join([
+            "n/a" if onset is None else f"{onset:.6f}",
+            "n/a" if sample is None else str(sample),
+            f"{timestamp:.6f}",
+            "n/a" if code is None else str(code),
+            str(label).replace("\t", " "),
+        ]))
+    with open(events_path(path), "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return len(events)
+
+
+def read_events(path):
+    """读取 .events.tsv，返回 [dict]，n/a 为 None；文件不存在时返回空列表"""
+    ev_path = events_path(path)
+    if not os.path.exists(ev_path):
+        return []
+    events = []
+    with open(ev_path, encoding="utf-8") as f:
+        columns = f.readline().rstrip("\n").split("\t")
+        for line in f:
+            if not line.strip():
+                continue
+            row = dict(zip(columns, line.rstrip("\n").split("\t")))
+            for key, cast in (("onset", float), ("sample", int), ("timestamp", float), ("code", int)):
+                value = row.get(key)
+                row[key] = None if value in (None, "n/a") else cast(value)
+            events.append(row)
+    return events
+
+
+def to_physical(counts, header, scale_trigger=False):
+    """
+    将计数换算为物理量 (float64)，丢包占位还原为 NaN
+    trigger 列默认保持原始编码；scale_trigger=True 时与旧 CSV 一样整体乘以 scale
+    """
+    counts = np.asarray(counts)
+    out = counts.astype(np.float64)
+    out[counts == MISSING] = np.nan
+    if scale_trigger:
+        out *= header['scale']
+    else:
+        trig = header['trigger_channel']
+        out[:, :trig] *= header['scale']
+        out[:, trig + 1:] *= header['scale']
+    return out
+
+
+def export_csv(path, csv_path=None):
+    """
+    导出为与旧版 EEGLogger 相同格式的 CSV (pandas 索引列 + 所有列除以 120)
+    :return: CSV 文件路径
+    """
+    import pandas as pd
+
+    header, counts = open_recording(path)
+    csv_path = csv_path or os.path.splitext(path)[0] + ".csv"
+    pd.DataFrame(to_physical(counts, header, scale_trigger=True)).to_csv(csv_path)
+    return csv_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="EEG binary recording tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    info = sub.add_parser("info", help="显示文件头")
+    info.add_argument("recording")
+    csv = sub.add_parser("csv", help="导出为 CSV")
+    csv.add_argument("recording", nargs="+")
+    args = parser.parse_args()
+    if args.command == "info":
+        print(json.dumps(read_header(args.recording), ensure_ascii=False, indent=2))
+    else:
+        for recording in args.recording:
+            print(export_csv(recording))
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+刺激事件标记
+每个实验环节切换 (实验开始 / 歌曲开始 / 歌曲结束 / 中断 / 实验结束) 时同时:
+    - 向设备发送 trigger 码 (写入 EEG 数据的 trigger 通道，与采样点严格对齐)
+    - 在 LSL 标记流 (type=Markers, string) 上推送带 local_clock 时间戳的标签，可被 LabRecorder 等录制
+    - 通知监听者 (例如 EEGLogger.add_marker)，由其换算为采样点位置写入每个录制文件的 .events.tsv
+
+trigger 码: 歌曲开始为歌曲 id (1~250，超出时取模)，其余事件使用 251~254。
+标签格式: {事件}/{歌曲 id}/{歌曲名}，例如 song_start/3/江南 (歌曲名来自文件名，不含 "/")。
+歌词换屏标记 lyric/{歌曲 id}/{屏序号} 只推送 LSL 标记并写入 .events.tsv，不占用设备 trigger 码。
+
+用法:
+    markers = EventMarker(trigger_sender=ble_worker.send_trigger)
+    markers.add_listener(eeg_logger.add_marker)
+    markers.song_start(song['id'], song['name'])
+"""
+
+import logging
+
+from pylsl import IRREGULAR_RATE, StreamInfo, StreamOutlet, local_clock
+
+MARKER_STREAM_NAME = "MusicEEG_Markers"
+MARKER_SOURCE_ID = "MusicEEG-Paradigm markers"
+MAX_SONG_CODE = 250
+CODE_SONG_END = 251
+CODE_ABORT = 252
+CODE_EXPERIMENT_START = 253
+CODE_EXPERIMENT_END = 254
+
+logger = logging.getLogger("EventMarker")
+
+
+def song_code(song_id):
+    """歌曲 id 对应的 trigger 码 (1~MAX_SONG_CODE)"""
+    return (int(song_id) - 1) % MAX_SONG_CODE + 1
+
+
+def make_label(event, song_id=None, name=None):
+    parts = [event] + [str(p) for p in (song_id, name) if p is not None]
+    return "/".join(parts)
+
+
+class EventMarker:
+    """
+    事件标记发送器 (在界面线程中调用)
+    :param trigger_sender: 可选回调 fn(code)，向设备发送 trigger；失败只记录警告
+    :param lsl: 是否创建 LSL 标记流
+    """
+
+    def __init__(self, trigger_sender=None, lsl=True, clock=local_clock):
+        self.trigger_sender = trigger_sender
+        self.clock = clock
+        self.listeners = []
+        self.outlet = self._make_outlet() if lsl else None
+
+    @staticmethod
+    def _make_outlet():
+        try:
+            info = StreamInfo(MARKER_STREAM_NAME, 'Markers', 1, IRREGULAR_RATE, 'string', MARKER_SOURCE_ID)
+            return StreamOutlet(info)
+        except Exception as e:
+            logger.warning(f"Failed to create LSL marker stream: {e}")
+            return None
+
+    def add_listener(self, fn):
+        """登记监听者 fn(label, code, timestamp)"""
+        self.listeners.append(fn)
+
+    def mark(self, label, code=None, timestamp=None):
+        """
+        发送一个事件标记
+        :param code: 设备 trigger 码，为 None 时只推送 LSL 标记
+        :param timestamp: 事件的 LSL 时间 (例如由歌曲时长推算的音频结束时刻)，默认为当前时间；
+                          设备 trigger 总是在调用时发送
+        :return: 标记的 LSL 时间戳
+        """
+        timestamp = self.clock() if timestamp is None else timestamp
+        if code is not None and self.trigger_sender is not None:
+            try:
+                self.trigger_sender(code)
+            except Exception as e:
+                logger.warning(f"Failed to send trigger {code}: {e}")
+        if self.outlet is not None:
+            try:
+                self.outlet.push_sample([label], timestamp)
+            except Exception as e:
+                logger.warning(f"Failed to push LSL marker {label}: {e}")
+        for fn in self.listeners:
+            try:
+                fn(label, code, timestamp)
+            except Exception as e:
+                logger.warning(f"Marker listener failed for {label}: {e}")
+        logger.info(f"Marker {label} | code={code} | t={timestamp:.4f}")
+        return timestamp
+
+    def experiment_start(self):
+        return self.mark(make_label("experiment_start"), CODE_EXPERIMENT_START)
+
+    def experiment_end(self):
+        return self.mark(make_label("experiment_end"), CODE_EXPERIMENT_END)
+
+    def song_start(self, song_id, name):
+        return self.mark(make_label("song_start", song_id, name), song_code(song_id))
+
+    def song_end(self, song_id, name, timestamp=None):
+        return self.mark(make_label("song_end", song_id, name), CODE_SONG_END, timestamp)
+
+    def lyric(self, song_id, index, timestamp=None):
+        return self.mark(make_label("lyric", song_id, index), None, timestamp)
+
+    def abort(self, song_id=None, name=None):
+        return self.mark(make_label("abort", song_id, name), CODE_ABORT)
+
+    def close(self):
+        self.outlet = None
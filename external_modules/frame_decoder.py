@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+EEG 数据帧向量化解码模块
+将一个或多个完整的蓝牙数据包一次性解码为 int32 数组，替代逐采样点的
+int.from_bytes 循环。
+
+数据包布局（以 8 通道为例）:
+    [帧头 head_len 字节][SAMPLES_PER_FRAME 个采样帧, 每帧 single_frame 字节][trigger][电量等]
+    每个采样帧内为 channel_num 个 24 位大端有符号整数。
+"""
+
+import numpy as np
+
+SAMPLES_PER_FRAME = 5
+
+
+class FrameDecoder:
+    """
+    按固定数据包布局解码 EEG 数据
+
+    decode() 接受 bytes / bytearray / memoryview，长度为 data_length 的整数倍，
+    返回形状为 (channel_num + 1, 包数 * samples_per_frame) 的 int32 数组，
+    最后一行为 trigger。
+    """
+
+    def __init__(self, channel_num, data_length, head_len, single_frame,
+                 trigger_length, samples_per_frame=SAMPLES_PER_FRAME):
+        if single_frame < channel_num * 3:
+            raise ValueError(f"single_frame ({single_frame}) 小于 {channel_num} 通道所需字节数")
+        self.channel_num = channel_num
+        self.data_length = data_length
+        self.head_len = head_len
+        self.single_frame = single_frame
+        self.trigger_length = trigger_length
+        self.samples_per_frame = samples_per_frame
+
+        self.eeg_start = head_len
+        self.eeg_end = head_len + single_frame * samples_per_frame
+        self.trigger_start = self.eeg_end
+        self.trigger_end = self.eeg_end + trigger_length
+        if self.trigger_end > data_length:
+            raise ValueError("数据包长度不足以容纳 EEG 与 trigger 字段")
+        # trigger 长度与采样点数相同时，每个采样点各有一个 trigger 字节 (BCI_BLE)；
+        # 否则整段 trigger 按大端整数解析后广播到该包的全部采样点 (MSM)
+        self.per_sample_trigger = trigger_length == samples_per_frame
+
+    def packet_count(self, data):
+        """返回 data 中包含的完整数据包个数"""
+        return len(data) // self.data_length
+
+    def decode(self, data):
+        """解码一个或多个连续的数据包"""
+        buf = np.frombuffer(data, dtype=np.uint8)
+        n_packets = buf.size // self.data_length
+        packets = buf[:n_packets * self.data_length].reshape(n_packets, self.data_length)
+        n_samples = n_packets * self.samples_per_frame
+
+        frames = packets[:, self.eeg_start:self.eeg_end].reshape(
+            n_packets, self.samples_per_frame, self.single_frame
+        )
+        triplets = frames[:, :, :self.channel_num * 3].reshape(
+            n_packets, self.samples_per_frame, self.channel_num, 3
+        ).astype(np.int32)
+        values = (triplets[..., 0] << 16) | (triplets[..., 1] << 8) | triplets[..., 2]
+        # 24 位补码符号扩展
+        values = (values ^ 0x800000) - 0x800000
+
+        out = np.empty((self.channel_num + 1, n_samples), dtype=np.int32)
+        out[:self.channel_num] = values.reshape(n_samples, self.channel_num).T
+
+        triggers = packets[:, self.trigger_start:self.trigger_end]
+        if self.per_sample_trigger:
+            out[self.channel_num] = triggers.reshape(n_samples)
+        else:
+            shared = np.zeros(n_packets, dtype=np.int32)
+            for i in range(self.trigger_length):
+                shared = (shared << 8) | triggers[:, i]
+            out[self.channel_num] = np.repeat(shared, self.samples_per_frame)
+        return out
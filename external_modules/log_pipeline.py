@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+非阻塞日志管线
+将 logger 的处理器 (FileHandler 等) 移到后台 QueueListener 线程中执行，采集线程只做入队；
+并提供限频日志与吞吐量统计，替代逐包写日志。
+"""
+
+import atexit
+import logging
+import logging.handlers
+import queue
+import time
+
+_listeners = []
+
+
+def install_queue_logging(target_logger):
+    """
+    将 target_logger 现有的处理器转移到后台线程
+    重复调用是安全的：已安装的 logger 会直接返回原有的 QueueListener
+    """
+    for handler in target_logger.handlers:
+        if isinstance(handler, logging.handlers.QueueHandler):
+            return getattr(handler, 'listener', None)
+
+    handlers = list(target_logger.handlers)
+    if not handlers:
+        return None
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    queue_handler.listener = listener
+    for handler in handlers:
+        target_logger.removeHandler(handler)
+    target_logger.addHandler(queue_handler)
+    listener.start()
+    _listeners.append(listener)
+    return listener
+
+
+@atexit.register
+def _stop_listeners():
+    # 退出时排空队列，保证日志完整落盘
+    while _listeners:
+        _listeners.pop().stop()
+
+
+class RateLimiter:
+    """限频器：两次 ready() 返回 True 之间至少间隔 interval 秒"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.last = 0.0
+        self.suppressed = 0
+
+    def ready(self):
+        now = time.monotonic()
+        if now - self.last >= self.interval:
+            self.last = now
+            return True
+        self.suppressed += 1
+        return False
+
+    def take_suppressed(self):
+        """返回并清零上次输出以来被抑制的次数"""
+        count, self.suppressed = self.suppressed, 0
+        return count
+
+
+class ThroughputStats:
+    """
+    吞吐量统计：每次调用 record() 只做计数，每 interval 秒汇总输出一次
+    输出内容为 items/s、bytes/s 以及处理耗时的均值与最大值
+    """
+
+    def __init__(self, target_logger, label, interval=5.0, unit='packets'):
+        self.logger = target_logger
+        self.label = label
+        self.interval = interval
+        self.unit = unit
+        self._reset(time.monotonic())
+
+    def _reset(self, now):
+        self.window_start = now
+        self.items = 0
+        self.bytes = 0
+        self.busy_time = 0.0
+        self.max_busy = 0.0
+
+    def record(self, n_bytes=0, busy_time=0.0, items=1):
+        self.items += items
+        self.bytes += n_bytes
+        self.busy_time += busy_time
+        if busy_time > self.max_busy:
+            self.max_busy = busy_time
+        now = time.monotonic()
+        if now - self.window_start >= self.interval:
+            self.flush(now)
+
+    def flush(self, now=None):
+        now = time.monotonic() if now is None else now
+        elapsed = now - self.window_start
+        if self.items and elapsed > 0:
+            self.logger.info(
+                f"{self.label} | {self.unit}/s={self.items / elapsed:.1f} | "
+                f"bytes/s={self.bytes / elapsed:.0f} | "
+                f"proc_avg={self.busy_time / self.items * 1e3:.3f}ms | proc_max={self.max_busy * 1e3:.3f}ms"
+            )
+        self._reset(now)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+LSL 分块推流模块
+将解码后的整帧数据通过一次 push_chunk 推送，时间戳由采样计数与标称采样率推算，
+并锚定到 pylsl.local_clock，消除蓝牙到达时刻带来的抖动。
+"""
+
+import numpy as np
+from pylsl import local_clock
+
+
+class ChunkedLslPusher:
+    """
+    按采样计数生成去抖时间戳的分块推流器
+
+    第 k 个采样点的时间戳为 anchor + k / sample_rate。
+    当推算时间与 local_clock 偏差超过 max_drift 秒（丢包、设备时钟漂移或首次推流）时，
+    以当前到达时刻重新锚定，使最新采样点的时间戳等于到达时间。
+
+    sinks 中的对象 (例如共享内存环形缓冲区) 会以 write(chunk, timestamps) 收到同一块数据及逐点时间戳。
+    """
+
+    def __init__(self, outlet, sample_rate, max_drift=0.2, clock=local_clock):
+        self.outlet = outlet
+        self.sample_rate = float(sample_rate)
+        self.max_drift = max_drift
+        self.clock = clock
+        self.anchor = None
+        self.sample_count = 0       # 时间轴上的采样点数 (含 skip 登记的丢失采样)
+        self.received_count = 0     # 实际收到并解码的采样点数
+        self.reanchor_count = 0
+        self.sinks = []
+
+    def reset(self):
+        """重新开始计数（例如重连之后）"""
+        self.anchor = None
+        self.sample_count = 0
+        self.received_count = 0
+
+    def push(self, frame):
+        """
+        推送一帧或多帧数据
+        :param frame: 形状为 (channels, samples) 的数组
+        :return: 本次推送最后一个采样点的时间戳
+        """
+        self.received_count += frame.shape[1]
+        return self._push(frame)
+
+    def _push(self, frame):
+        n = frame.shape[1]
+        if n == 0:
+            return None
+        now = self.clock()
+        last_index = self.sample_count + n - 1
+        if self.anchor is None:
+            self.anchor = now - last_index / self.sample_rate
+        else:
+            expected = self.anchor + last_index / self.sample_rate
+            if abs(now - expected) > self.max_drift:
+                self.anchor = now - last_index / self.sample_rate
+                self.reanchor_count += 1
+        timestamp = self.anchor + last_index / self.sample_rate
+        # (samples, channels) 的 C 连续 float32 数组可被 pylsl 直接按缓冲区传递，无需逐元素转换
+        chunk = np.ascontiguousarray(frame.T, dtype=np.float32)
+        self.outlet.push_chunk(chunk, timestamp=timestamp)
+        if self.sinks:
+            timestamps = timestamp - np.arange(n - 1, -1, -1) / self.sample_rate
+            for sink in self.sinks:
+                sink.write(chunk, timestamps)
+        self.sample_count += n
+        return timestamp
+
+    def skip(self, n, channels=None):
+        """
+        登记 n 个丢失的采样点，使后续时间戳保持在正确的时间轴上
+        给定 channels 时推送 NaN 占位数据，否则仅推进采样计数
+        """
+        if channels:
+            return self._push(np.full((channels, n), np.nan, dtype=np.float32))
+        self.sample_count += n
+        return None
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+多设备并发采集模块
+在同一个 asyncio 事件循环中同时连接多个头戴设备，每个设备对应一个 BleReceiver，
+各自推送名称唯一的 LSL 流 (EEG_{设备名}，source_id 为设备名)，
+并汇总各设备的实际采样率、丢包与电量。
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+try:
+    from .ble_receive_eeg_trigger import BleReceiver
+    from .ble_transport import create_transport
+except ImportError:
+    from ble_receive_eeg_trigger import BleReceiver
+    from ble_transport import create_transport
+
+logger = logging.getLogger("MultiDevice")
+
+INIT_COMMANDS = (bytearray([0x02, 0x02]), bytearray([0x02, 0x01]))
+
+
+def stream_name_for(device_name):
+    """多设备模式下每个设备的 LSL 流名称"""
+    return f"EEG_{device_name}"
+
+
+async def start_device(receiver, timeout=10.0):
+    """
+    等待 receiver.start_notification() 建立连接并发送初始化指令 (停止后重新开始采集)
+    :return: 是否已连接
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if receiver.m_client and receiver.m_client.is_connected:
+            break
+        await asyncio.sleep(0.2)
+    if not (receiver.m_client and receiver.m_client.is_connected):
+        logger.warning(f"Timeout waiting for BLE connection: {receiver.m_device_name}")
+        return False
+    try:
+        for i, command in enumerate(INIT_COMMANDS):
+            if i:
+                await asyncio.sleep(0.5)
+            await receiver.send_control_command(command)
+        logger.info(f"Initialization commands sent: {receiver.m_device_name}")
+    except Exception as e:
+        logger.error(f"Failed to send init commands to {receiver.m_device_name}: {e}")
+    return True
+
+
+class MultiDeviceAcquisition:
+    """
+    多设备采集管理器
+    :param device_names: 设备名称列表
+    :param log_dir: 日志目录（每个设备一个 ble_receiver 日志）
+    :param capture_path: 原始数据捕获文件路径，每个设备追加 _{设备名} 后缀
+    """
+
+    def __init__(self, device_names, log_dir, transport=None, capture_path=None):
+        self.device_names = list(device_names)
+        self.transport = transport if transport is not None else create_transport(self.device_names)
+        self.receivers = {}
+        for name in self.device_names:
+            device_capture = None
+            if capture_path:
+                root, ext = os.path.splitext(capture_path)
+                device_capture = f"{root}_{name}{ext}"
+            device_log = os.path.join(log_dir, f"ble_receiver_{name}.log")
+            self.receivers[name] = BleReceiver(name, device_log, capture_path=device_capture,
+                                               transport=self.transport, stream_name=stream_name_for(name),
+                                               source_id=name)
+        self._last_stats = {}
+
+    async def discover(self, max_retries=3, retry_interval=1.0):
+        """
+        扫描并为每个设备分配地址，名称完全一致者优先（避免 MSM 误匹配 MSM_C16）
+        :return: 未找到的设备名称列表
+        """
+        missing = list(self.device_names)
+        for attempt in range(max_retries):
+            devices = await self.transport.discover()
+            assigned = {r.m_device_mac_address for r in self.receivers.values() if r.m_device_mac_address}
+            for exact in (True, False):
+                for name in list(missing):
+                    for dev in devices:
+                        dev_name = str(dev.name)
+                        matched = dev_name == name if exact else dev_name.find(name) != -1
+                        if matched and dev.address not in assigned:
+                            self.receivers[name].m_device_mac_address = dev.address
+                            assigned.add(dev.address)
+                            missing.remove(name)
+                            logger.info(f"Device {name} found: {dev.address}")
+                            break
+            if not missing:
+                break
+            logger.info(f"Scan {attempt + 1}/{max_retries}: missing {missing}")
+            await asyncio.sleep(retry_interval)
+        return missing
+
+    async def _run_device(self, receiver, timeout=10.0):
+        recv_task = asyncio.create_task(receiver.start_notification())
+        await start_device(receiver, timeout)
+        await recv_task
+
+    async def run(self, report_callback=None, report_interval=5.0):
+        """
+        并发连接并接收所有已找到地址的设备，直到 stop() 被调用
+        :param report_callback: 可选，定期以 stats() 的结果调用
+        """
+        receivers = [r for r in self.receivers.values() if r.m_device_mac_address]
+        tasks = [asyncio.create_task(self._run_device(r)) for r in receivers]
+        reporter = asyncio.create_task(self._report_loop(report_callback, report_interval))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            reporter.cancel()
+            for receiver in receivers:
+                receiver.close_capture()
+
+    async def _report_loop(self, callback, interval):
+        while True:
+            await asyncio.sleep(interval)
+            stats = self.stats()
+            logger.info("Device stats | " + format_stats(stats))
+            if callback is not None:
+                callback(stats)
+
+    def stats(self):
+        """各设备的连接状态、实际采样率 (Hz)、丢包与电量"""
+        now = time.monotonic()
+        result = {}
+        for name, receiver in self.receivers.items():
+            # 只计实际收到的采样，丢包时补入的 NaN 不计入实际采样率
+            samples = receiver.lsl_pusher.received_count
+            last_time, last_samples = self._last_stats.get(name, (now, samples))
+            elapsed = now - last_time
+            rate = (samples - last_samples) / elapsed if elapsed > 0 else 0.0
+            self._last_stats[name] = (now, samples)
+            link = receiver.get_link_stats() or {}
+            tracker = receiver.seq_tracker
+            result[name] = {
+                'connected': bool(receiver.m_client and receiver.m_client.is_connected),
+                'rate': rate,
+                'lost': link.get('lost', 0),
+                'loss_ratio': tracker.loss_ratio if tracker else 0.0,
+                'battery': receiver.battery_level,
+            }
+        return result
+
+    def get_link_stats(self, device_name):
+        receiver = self.receivers.get(device_name)
+        return receiver.get_link_stats() if receiver else None
+
+    async def send_trigger(self, tag):
+        """向所有已连接设备发送同一 trigger"""
+        data = bytearray([0xFF, tag])
+        await asyncio.gather(*(r.send_control_command(data) for r in self.receivers.values()),
+                             return_exceptions=True)
+
+    def stop(self, loop=None):
+        """停止所有设备的接收（可从其他线程调用，需传入事件循环）"""
+        for receiver in self.receivers.values():
+            receiver.is_receiving = False
+            event = getattr(receiver, 'event', None)
+            if event is None:
+                continue
+            if loop is not None and loop.is_running():
+                loop.call_soon_threadsafe(event.set)
+            else:
+                event.set()
+
+
+def format_stats(stats):
+    parts = []
+    for name, s in stats.items():
+        battery = s['battery'] if s['battery'] is not None else '--'
+        state = "" if s['connected'] else " (未连接)"
+        parts.append(f"{name}: {s['rate']:.0f}Hz 丢包{s['loss_ratio'] * 100:.1f}% 电量{battery}{state}")
+    return " | ".join(parts)
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+蓝牙数据包重组环形缓冲区
+每个接收器持有一个预分配的 bytearray，通知数据写入后按帧头搜索对齐，
+以 memoryview 的形式零拷贝地交出完整数据帧。
+
+实现为"镜像"环形缓冲区：底层存储为 2 倍容量，每个字节同时写入 pos 与
+pos + capacity 两处，因此任意不超过 capacity 的窗口在内存中都是连续的，
+跨越环尾的数据帧也无需拼接拷贝。
+
+帧头未知时不依赖通知长度：连续 learn_frames 帧前 sync_length 字节一致才确认帧头
+(优先尝试各次通知的起点)；学习得到的帧头连续 relearn_after 次找不到时重新学习。
+"""
+
+from collections import deque
+
+
+class PacketRingBuffer:
+    """
+    按固定帧长重组数据帧
+
+    :param frame_length: 单个完整数据帧的字节数
+    :param sync_word: 固定帧头字节串；为 None 时从数据中学习
+    :param sync_length: 自动学习帧头时取用的字节数
+    :param capacity_frames: 缓冲区可容纳的最大帧数
+    :param learn_frames: 学习帧头时要求前几个字节一致的连续帧数
+    :param relearn_after: 学习得到的帧头连续多少次搜索失败后重新学习
+    """
+
+    def __init__(self, frame_length, sync_word=None, sync_length=2, capacity_frames=64,
+                 learn_frames=3, relearn_after=8):
+        self.frame_length = frame_length
+        self.sync_word = bytes(sync_word) if sync_word else None
+        self.sync_fixed = self.sync_word is not None
+        self.sync_length = len(self.sync_word) if self.sync_word else sync_length
+        self.learn_frames = max(learn_frames, 2)
+        self.relearn_after = relearn_after
+        self.capacity = frame_length * capacity_frames
+        self._storage = bytearray(self.capacity * 2)
+        self._view = memoryview(self._storage)
+        self._read = 0      # 读指针 (单调递增，取模得到存储位置)
+        self._write = 0     # 写指针 (单调递增)
+        self._starts = deque(maxlen=capacity_frames * 4)    # 学习帧头时各次通知的起点
+        self._misses = 0    # 连续搜索帧头失败的次数
+
+        # 统计信息
+        self.frames_out = 0
+        self.resync_count = 0
+        self.dropped_bytes = 0
+        self.overflow_bytes = 0
+        self.relearn_count = 0
+
+    def __len__(self):
+        return self._write - self._read
+
+    def reset(self):
+        """丢弃所有未完成的数据"""
+        self.dropped_bytes += len(self)
+        self._read = self._write
+
+    def feed(self, data):
+        """
+        写入一次通知的数据
+        帧头已知时，恰好为一整帧且以帧头开始的通知视为对齐点，丢弃之前残留的半帧数据
+        """
+        n = len(data)
+        if n == 0:
+            return
+        if self.sync_word is None:
+            self._starts.append(self._write)
+        elif n == self.frame_length:
+            if len(self) and bytes(data[:self.sync_length]) == self.sync_word:
+                self.resync_count += 1
+                self.reset()
+
+        if n > self.capacity:
+            # 单次通知超过容量时仅保留尾部
+            self.overflow_bytes += n - self.capacity
+            data = memoryview(data)[n - self.capacity:]
+            n = self.capacity
+        overflow = len(self) + n - self.capacity
+        if overflow > 0:
+            self.overflow_bytes += overflow
+            self._read += overflow
+
+        pos = self._write % self.capacity
+        first = min(n, self.capacity - pos)
+        self._storage[pos:pos + first] = data[:first]
+        self._storage[pos + self.capacity:pos + self.capacity + first] = data[:first]
+        if first < n:
+            rest = n - first
+            self._storage[0:rest] = data[first:]
+            self._storage[self.capacity:self.capacity + rest] = data[first:]
+        self._write += n
+
+    def _header_at(self, position):
+        pos = position % self.capacity
+        return bytes(self._storage[pos:pos + self.sync_length])
+
+    def _learn(self):
+        """
+        学习帧头：寻找连续 learn_frames 帧前 sync_length 字节一致的位置，优先尝试通知起点，
+        其次逐字节尝试一帧范围内的所有偏移。找到时丢弃之前的字节并返回 True
+        """
+        need = self.frame_length * (self.learn_frames - 1) + self.sync_length
+        if len(self) < need:
+            return False
+        while self._starts and self._starts[0] < self._read:
+            self._starts.popleft()
+        candidates = [s for s in self._starts if self._write - s >= need]
+        # 已积累两个学习窗口仍未确认时，通知起点不可靠 (例如分片不在帧边界)，逐字节尝试
+        if len(self) >= 2 * need:
+            candidates += range(self._read, self._read + self.frame_length)
+        for start in candidates:
+            header = self._header_at(start)
+            if all(self._header_at(start + k * self.frame_length) == header
+                   for k in range(1, self.learn_frames)):
+                self.sync_word = header
+                self._starts.clear()
+                self.dropped_bytes += start - self._read
+                self._read = start
+                return True
+        if len(self) >= 2 * need:
+            # 一帧范围内都没有一致的帧头，丢弃一帧数据后等待更多数据
+            self.dropped_bytes += self.frame_length
+            self._read += self.frame_length
+        return False
+
+    def _resync(self):
+        """将读指针移动到下一个帧头位置，返回是否找到"""
+        start = self._read % self.capacity
+        end = start + len(self)
+        idx = self._storage.find(self.sync_word, start, end)
+        if idx < 0:
+            # 保留末尾可能是不完整帧头的字节
+            keep = min(len(self), self.sync_length - 1)
+            skipped = len(self) - keep
+            self.dropped_bytes += skipped
+            self._read += skipped
+            return False
+        skipped = idx - start
+        if skipped:
+            self.dropped_bytes += skipped
+            self._read += skipped
+            self.resync_count += 1
+        return True
+
+    def pop_frame(self):
+        """
+        取出下一个完整数据帧
+        返回指向内部存储的 memoryview (零拷贝)，仅在下一次 feed 之前有效；
+        数据不足一帧时返回 None
+        """
+        while len(self) >= self.frame_length:
+            start = self._read % self.capacity
+            if self.sync_word is None:
+                if not self._learn():
+                    return None
+                continue
+            if self._view[start:start + self.sync_length] != self.sync_word:
+                if not self._resync():
+                    self._missed()
+                    return None
+                continue
+            # 后续数据已到达时，校验下一帧帧头，排除中间插入了残缺数据的帧
+            nxt = start + self.frame_length
+            if len(self) >= self.frame_length + self.sync_length and \
+                    self._view[nxt:nxt + self.sync_length] != self.sync_word:
+                self.dropped_bytes += 1
+                self._read += 1
+                if not self._resync():
+                    self._missed()
+                    return None
+                continue
+            self._misses = 0
+            self._read += self.frame_length
+            self.frames_out += 1
+            return self._view[start:start + self.frame_length]
+        return None
+
+    def _missed(self):
+        """学习得到的帧头 (可能来自损坏的数据) 连续找不到时清除，重新学习"""
+        self._misses += 1
+        if not self.sync_fixed and self._misses >= self.relearn_after:
+            self._misses = 0
+            self.sync_word = None
+            self.relearn_count += 1
+
+    def frames(self):
+        """依次取出当前所有完整数据帧"""
+        frame = self.pop_frame()
+        while frame is not None:
+            yield frame
+            frame = self.pop_frame()
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+预分配采样缓冲区
+以 int32 原始计数保存 (samples, channels) 数据及每个采样点的 float64 LSL 时间戳，
+容量不足时按几何倍数扩容 (均摊 O(1) 追加)。
+与 list.extend(chunk) 相比，每个采样值只占 4 字节而不是一个 Python float 对象，
+取出数据时直接交出已填充部分的视图并换上新的空缓冲区，不做复制。
+SampleRing 为固定容量的环形缓冲，只保留最近的窗口 (波形显示用)。
+"""
+
+import numpy as np
+
+try:
+    from .eeg_recording import to_counts
+except ImportError:
+    from eeg_recording import to_counts
+
+INITIAL_SAMPLES = 500 * 60      # 初始容量约为 500Hz 下 1 分钟
+GROWTH_FACTOR = 2
+
+
+class SampleBuffer:
+    """
+    可增长的 int32 采样缓冲区
+    :param channels: 通道数，为 None 时由第一块数据确定
+    :param capacity: 初始容量 (采样点数)
+    """
+
+    def __init__(self, channels=None, capacity=INITIAL_SAMPLES, dtype=np.int32):
+        self.channels = channels
+        self.initial_capacity = capacity
+        self.dtype = np.dtype(dtype)
+        self._data = None
+        self._timestamps = None
+        self._size = 0
+        self.grow_count = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def capacity(self):
+        return 0 if self._data is None else len(self._data)
+
+    @property
+    def nbytes(self):
+        """已分配的字节数"""
+        return 0 if self._data is None else self._data.nbytes + self._timestamps.nbytes
+
+    def _reserve(self, needed):
+        if self._data is None:
+            capacity = max(self.initial_capacity, needed)
+            self._data = np.empty((capacity, self.channels), dtype=self.dtype)
+            self._timestamps = np.empty(capacity, dtype=np.float64)
+            return
+        capacity = len(self._data)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= GROWTH_FACTOR
+        grown = np.empty((capacity, self.channels), dtype=self.dtype)
+        grown[:self._size] = self._data[:self._size]
+        grown_ts = np.empty(capacity, dtype=np.float64)
+        grown_ts[:self._size] = self._timestamps[:self._size]
+        self._data, self._timestamps = grown, grown_ts
+        self.grow_count += 1
+
+    def extend(self, chunk, timestamps=None):
+        """
+        追加一块采样 (LSL pull_chunk 的 list 或数组，NaN 丢包占位转为 MISSING)
+        :param timestamps: 对应的 LSL 时间戳，缺省时记为 NaN
+        """
+        if self.dtype == np.int32:
+            counts = to_counts(chunk)
+        else:
+            counts = np.asarray(chunk, dtype=self.dtype)
+        n = len(counts)
+        if n == 0:
+            return
+        if self.channels is None:
+            self.channels = counts.shape[1]
+        self._reserve(self._size + n)
+        self._data[self._size:self._size + n] = counts
+        self._timestamps[self._size:self._size + n] = timestamps if timestamps is not None else np.nan
+        self._size += n
+
+    def view(self):
+        """已填充部分的 (计数, 时间戳) 视图 (后续 extend 可能使其失效)"""
+        if self._data is None:
+            return np.empty((0, self.channels or 0), dtype=self.dtype), np.empty(0, dtype=np.float64)
+        return self._data[:self._size], self._timestamps[:self._size]
+
+    def take(self):
+        """交出已填充部分 (计数, 时间戳) 并换上新的空缓冲区，返回的数组归调用方所有"""
+        data = self.view()
+        self._data = self._timestamps = None
+        self._size = 0
+        return data
+
+
+class SampleRing:
+    """
+    固定容量的环形缓冲，只保留最近 capacity 个采样点 (用于波形显示等固定窗口)
+    :param capacity: 采样点数
+    """
+
+    def __init__(self, capacity, dtype=np.float64):
+        self.capacity = int(capacity)
+        self.dtype = np.dtype(dtype)
+        self._data = None
+        self._pos = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def extend(self, chunk):
+        """追加一块采样 (samples, channels)，超出容量时覆盖最旧的数据"""
+        chunk = np.asarray(chunk, dtype=self.dtype)
+        n = len(chunk)
+        if n == 0:
+            return
+        if self._data is None:
+            self._data = np.zeros((self.capacity, chunk.shape[1]), dtype=self.dtype)
+        if n >= self.capacity:
+            self._data[:] = chunk[-self.capacity:]
+            self._pos, self._size = 0, self.capacity
+            return
+        end = self._pos + n
+        if end <= self.capacity:
+            self._data[self._pos:end] = chunk
+        else:
+            split = self.capacity - self._pos
+            self._data[self._pos:] = chunk[:split]
+            self._data[:n - split] = chunk[split:]
+        self._pos = end % self.capacity
+        self._size = min(self._size + n, self.capacity)
+
+    def latest(self):
+        """按时间顺序返回当前窗口的副本 (samples, channels)"""
+        if self._data is None:
+            return np.empty((0, 0), dtype=self.dtype)
+        if self._size < self.capacity:
+            return self._data[:self._size].copy()
+        return np.concatenate([self._data[self._pos:], self._data[:self._pos]])
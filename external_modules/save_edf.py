@@ -0,0 +1,372 @@
+# -*- coding: utf-8 -*-
+"""
+BDF / EDF+ 流式写入模块
+录制过程中按数据记录 (默认 1 秒) 追加写入，可直接被 EEGLAB、MNE、EDFbrowser 等工具读取。
+
+    BDF+ (默认): 24 位采样，与设备 ADC 精度一致，不损失分辨率；体积约为 CSV 的 1/3
+    EDF+       : 16 位采样，EEG 通道按满量程缩放，兼容只支持 EDF 的软件
+
+通道名取自 BHBconfig.ini，最后一个信号为 Trigger (原始编码)，另有一个 "BDF/EDF Annotations" 信号
+保存歌曲起止、trigger 事件 (trigger 通道的上升沿) 与丢包区段 (Signal lost)。
+丢包占位采样点 (eeg_recording.MISSING) 写为 0。
+
+用法:
+    writer = BdfWriter("session.bdf", sample_rate=500)
+    writer.append(chunk, timestamps)        # 采集线程中调用，只做入队
+    writer.annotate("Song start: xxx")      # 按当前数据位置打标记
+    writer.close()                          # 写完剩余数据并回填记录数
+
+    save_edf(save_path, name)               # 将已保存的 .eegrec / CSV 录制离线转换为 {name}.bdf
+"""
+
+import datetime
+import glob
+import os
+import queue
+import re
+import threading
+
+import numpy as np
+
+try:
+    from . import eeg_recording
+except ImportError:
+    import eeg_recording
+
+RECORD_DURATION = 1.0           # 每个数据记录的时长 (秒)
+BDF_DIGITAL = (-8388600, 8388600)   # 8388600 / 120 = 69905 恰好可用 8 个字符表示物理范围
+EDF_DIGITAL = (-32767, 32767)
+ANNOTATION_BYTES = 256          # 每个数据记录中标注信号的最小字节数
+
+
+def _field(value, width):
+    text = str(value)
+    if len(text) > width:
+        raise ValueError(f"EDF 头字段过长: {text!r} (最多 {width} 字符)")
+    return text.ljust(width).encode('ascii')
+
+
+def _format_number(value):
+    """格式化为不超过 8 个字符的数字"""
+    text = f"{value:.8g}"
+    if len(text) > 8:
+        text = f"{value:.8f}"[:8].rstrip('.')
+    return text
+
+
+def _format_onset(seconds):
+    return f"{'+' if seconds >= 0 else '-'}{abs(seconds):.4f}".rstrip('0').rstrip('.')
+
+
+class BdfWriter:
+    """
+    BDF+ / EDF+ 流式写入器
+    append() 与 annotate() 只做入队，由专用线程按顺序写文件，因此标注的位置与数据顺序一致
+    :param path: 输出文件 (.bdf 或 .edf)
+    :param sample_rate: 采样率，需与 RECORD_DURATION 相乘为整数
+    :param fmt: 'bdf' 或 'edf'，默认按扩展名判断
+    :param channel_names: 信号名称 (含最后的 Trigger)，默认由 BHBconfig.ini 生成
+    :param scale: ADC 计数到物理量 (uV) 的比例
+    """
+
+    def __init__(self, path, sample_rate, fmt=None, channel_names=None, scale=eeg_recording.DEFAULT_SCALE,
+                 start_time=None, record_duration=RECORD_DURATION):
+        self.path = path
+        self.fmt = (fmt or os.path.splitext(path)[1].lstrip('.') or 'bdf').lower()
+        if self.fmt not in ('bdf', 'edf'):
+            raise ValueError(f"不支持的格式: {self.fmt}")
+        self.sample_rate = float(sample_rate)
+        self.record_duration = record_duration
+        self.samples_per_record = int(round(self.sample_rate * record_duration))
+        if abs(self.samples_per_record - self.sample_rate * record_duration) > 1e-6:
+            raise ValueError("sample_rate * record_duration 必须为整数")
+        self.channel_names = channel_names
+        self.scale = scale
+        self.start_time = start_time
+        self.bytes_per_sample = 3 if self.fmt == 'bdf' else 2
+        self.annotation_samples = -(-ANNOTATION_BYTES // self.bytes_per_sample)
+        self.records = 0
+        self.samples = 0
+        self.error = None
+        self._file = None
+        self._channels = None
+        self._pending = np.empty((0, 0), dtype=np.int32)
+        self._annotations = []
+        self._first_timestamp = None
+        self._last_trigger = 0
+        self._gap_start = None
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name=f"BdfWriter-{os.path.basename(path)}", daemon=True)
+        self._thread.start()
+
+    # ---- 采集线程接口 ----
+    def append(self, chunk, timestamps=None):
+        """追加一块采样 (samples, channels)：LSL 浮点数据或 int32 计数"""
+        self._queue.put(('data', chunk, timestamps))
+
+    def annotate(self, text, timestamp=None, duration=None):
+        """
+        添加标注
+        :param timestamp: LSL 时间戳；为 None 时标注在此前已追加数据的末尾
+        """
+        self._queue.put(('annotation', text, timestamp, duration))
+
+    def close(self):
+        """写完剩余数据与标注，回填数据记录数并关闭文件"""
+        self._queue.put(None)
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+    # ---- 写入线程 ----
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            if self.error is not None:
+                continue
+            try:
+                if item[0] == 'data':
+                    self._write_data(item[1], item[2])
+                else:
+                    self._add_annotation(*item[1:])
+            except Exception as e:
+                self.error = e
+        try:
+            self._finish()
+        except Exception as e:
+            if self.error is None:
+                self.error = e
+
+    def _position_seconds(self):
+        return (self.samples + len(self._pending)) / self.sample_rate
+
+    def _add_annotation(self, text, timestamp, duration):
+        if timestamp is not None and self._first_timestamp is not None:
+            onset = timestamp - self._first_timestamp
+        else:
+            onset = self._position_seconds()
+        self._annotations.append((max(onset, 0.0), duration, text))
+
+    def _write_data(self, chunk, timestamps):
+        if isinstance(chunk, np.ndarray) and chunk.dtype == np.int32:
+            counts = chunk
+        else:
+            counts = eeg_recording.to_counts(chunk)
+        if len(counts) == 0:
+            return
+        if self._file is None:
+            if timestamps is not None and len(timestamps):
+                self._first_timestamp = float(timestamps[0])
+            self._open(counts.shape[1])
+        self._detect_events(counts)
+        self._pending = np.concatenate([self._pending, counts]) if len(self._pending) else counts
+        n_records = len(self._pending) // self.samples_per_record
+        if n_records:
+            n = n_records * self.samples_per_record
+            self._write_records(self._pending[:n])
+            self._pending = self._pending[n:]
+
+    def _detect_events(self, counts):
+        """trigger 上升沿与丢包区段转为标注"""
+        base = self.samples + len(self._pending)
+        trigger = counts[:, -1]
+        valid = trigger != eeg_recording.MISSING
+        codes = np.where(valid, trigger, 0)
+        previous = np.concatenate([[self._last_trigger], codes[:-1]])
+        for i in np.flatnonzero((codes != previous) & (codes != 0)):
+            self._annotations.append(((base + i) / self.sample_rate, None, f"Trigger {int(codes[i])}"))
+        self._last_trigger = int(codes[-1])
+
+        missing = counts[:, 0] == eeg_recording.MISSING
+        if not missing.any() and self._gap_start is None:
+            return
+        edges = np.diff(np.concatenate([[self._gap_start is not None], missing, [False]]).astype(np.int8))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        if self._gap_start is not None:
+            starts = np.concatenate([[self._gap_start - base], starts])
+        for start, end in zip(starts, ends):
+            if end == len(counts) and missing[-1]:
+                self._gap_start = base + start     # 缺口延续到下一块
+                break
+            onset = (base + start) / self.sample_rate
+            self._annotations.append((onset, (end - start) / self.sample_rate, "Signal lost"))
+            self._gap_start = None
+
+    def _open(self, channels):
+        self._channels = channels
+        if self.channel_names is None or len(self.channel_names) != channels:
+            self.channel_names = eeg_recording.channel_names_for(channels)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'wb', buffering=1 << 20)
+        self._file.write(self._header(-1))
+
+    def _header(self, n_records):
+        bdf = self.fmt == 'bdf'
+        eeg_dmin, eeg_dmax = BDF_DIGITAL if bdf else EDF_DIGITAL
+        full_scale = BDF_DIGITAL[1] * self.scale
+        trig_dmin, trig_dmax = (-8388608, 8388607) if bdf else (-32768, 32767)
+        signals = []
+        for name in self.channel_names[:-1]:
+            signals.append((name, 'uV', -full_scale, full_scale, eeg_dmin, eeg_dmax, self.samples_per_record))
+        signals.append((self.channel_names[-1], '', trig_dmin, trig_dmax, trig_dmin, trig_dmax,
+                        self.samples_per_record))
+        signals.append(('BDF Annotations' if bdf else 'EDF Annotations', '', -1, 1, trig_dmin, trig_dmax,
+                        self.annotation_samples))
+
+        start = datetime.datetime.fromtimestamp(self.start_time) if self.start_time else datetime.datetime.now()
+        months = ['JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN', 'JUL', 'AUG', 'SEP', 'OCT', 'NOV', 'DEC']
+        ns = len(signals)
+        head = [
+            b"\xffBIOSEMI" if bdf else _field('0', 8),
+            _field('X X X X', 80),
+            _field(f"Startdate {start.day:02d}-{months[start.month - 1]}-{start.year} X X MusicEEG", 80),
+            _field(start.strftime('%d.%m.%y'), 8),
+            _field(start.strftime('%H.%M.%S'), 8),
+            _field(256 * (ns + 1), 8),
+            _field('BDF+C' if bdf else 'EDF+C', 44),
+            _field(n_records, 8),
+            _field(_format_number(self.record_duration), 8),
+            _field(ns, 4),
+        ]
+        columns = [
+            (16, lambda s: s[0]),
+            (80, lambda s: ''),
+            (8, lambda s: s[1]),
+            (8, lambda s: _format_number(s[2])),
+            (8, lambda s: _format_number(s[3])),
+            (8, lambda s: s[4]),
+            (8, lambda s: s[5]),
+            (80, lambda s: ''),
+            (8, lambda s: s[6]),
+            (32, lambda s: ''),
+        ]
+        for width, getter in columns:
+            head.extend(_field(getter(signal), width) for signal in signals)
+        return b"".join(head)
+
+    def _digital(self, counts):
+        """(samples, channels) int32 计数 -> 各信号的数字值"""
+        eeg = counts[:, :-1]
+        missing = eeg == eeg_recording.MISSING
+        if self.fmt == 'bdf':
+            digital_eeg = np.clip(eeg, *BDF_DIGITAL)
+        else:
+            digital_eeg = np.rint(eeg * (EDF_DIGITAL[1] / BDF_DIGITAL[1])).astype(np.int32)
+            np.clip(digital_eeg, *EDF_DIGITAL, out=digital_eeg)
+        digital_eeg[missing] = 0
+        trigger = counts[:, -1:]
+        trigger = np.where(trigger == eeg_recording.MISSING, 0, trigger)
+        return np.concatenate([digital_eeg, trigger], axis=1)
+
+    def _encode(self, values):
+        """小端 16/24 位编码，values 形状 (..., n)，返回 (..., n * bytes_per_sample) 的 uint8"""
+        raw = np.ascontiguousarray(values, dtype='<i4').view(np.uint8).reshape(values.shape + (4,))
+        return raw[..., :self.bytes_per_sample].reshape(values.shape[:-1] + (-1,))
+
+    def _annotation_block(self, record_index, final):
+        size = self.annotation_samples * self.bytes_per_sample
+        record_start = record_index * self.record_duration
+        block = f"{_format_onset(record_start)}\x14\x14\x00".encode('utf-8')
+        remaining = []
+        for onset, duration, text in self._annotations:
+            if onset >= record_start + self.record_duration and not final:
+                remaining.append((onset, duration, text))
+                continue
+            tal = _format_onset(onset)
+            if duration is not None:
+                tal += f"\x15{duration:.4f}".rstrip('0').rstrip('.')
+            tal = f"{tal}\x14{text}\x14\x00".encode('utf-8')
+            if len(block) + len(tal) > size:
+                remaining.append((onset, duration, text))
+                continue
+            block += tal
+        self._annotations = remaining
+        return np.frombuffer(block.ljust(size, b"\x00"), dtype=np.uint8)
+
+    def _write_records(self, counts, final=False):
+        n_records = len(counts) // self.samples_per_record
+        digital = self._digital(counts)
+        # (records, samples, channels) -> (records, channels, samples)，每个信号在记录内连续存放
+        per_record = digital.reshape(n_records, self.samples_per_record, -1).transpose(0, 2, 1)
+        data = self._encode(per_record).reshape(n_records, -1)
+        annotations = np.stack([self._annotation_block(self.records + i, final) for i in range(n_records)])
+        self._file.write(np.concatenate([data, annotations], axis=1).tobytes())
+        self.records += n_records
+        self.samples += len(counts)
+
+    def _finish(self):
+        if self._file is None:
+            return
+        try:
+            if self._gap_start is not None:
+                end = self.samples + len(self._pending)
+                self._annotations.append((self._gap_start / self.sample_rate,
+                                          (end - self._gap_start) / self.sample_rate, "Signal lost"))
+                self._gap_start = None
+            # 最后不足一个记录的数据以 0 补齐；剩余标注放不下时追加空记录
+            tail = self._pending
+            pad = -len(tail) % self.samples_per_record
+            if pad:
+                tail = np.concatenate([tail, np.zeros((pad, self._channels), dtype=np.int32)])
+            if len(tail):
+                self._write_records(tail, final=True)
+            while self._annotations:
+                self._write_records(np.zeros((self.samples_per_record, self._channels), dtype=np.int32),
+                                    final=True)
+            self._pending = self._pending[:0]
+            self._file.seek(0)
+            self._file.write(self._header(self.records))
+        finally:
+            self._file.close()
+
+
+def _find_recording(save_path, name):
+    for ext in (eeg_recording.EXTENSION, '.csv'):
+        candidate = os.path.join(save_path, f"{name}{ext}")
+        if os.path.exists(candidate):
+            return [candidate]
+    # xw_web_C8 的分段文件 EEG-offline-data-{k}.csv，按编号顺序拼接
+    segments = glob.glob(os.path.join(save_path, "EEG-offline-data-*.csv"))
+    order = lambda p: int(re.findall(r"(\d+)\.csv$", p)[0])
+    return sorted(segments, key=order)
+
+
+def _load_counts(path):
+    if path.endswith(eeg_recording.EXTENSION):
+        header, counts = eeg_recording.open_recording(path)
+        return header, counts
+    # CSV 为 pandas 写出的除以 120 的数据 (首列为索引)
+    import pandas as pd
+    values = pd.read_csv(path, index_col=0).to_numpy()
+    return None, eeg_recording.to_counts(values * 120.0)
+
+
+def save_edf(save_path, name, fmt='bdf', sample_rate=None):
+    """
+    将 save_path 下名为 name 的录制 (.eegrec 或 CSV，找不到时使用分段 CSV) 转换为 {name}.bdf / .edf
+    :return: 输出文件路径，没有可转换的数据时返回 None
+    """
+    sources = _find_recording(save_path, name)
+    if not sources:
+        print(f"未找到可转换的录制文件: {save_path}/{name}")
+        return None
+    out_path = os.path.join(save_path, f"{name}.{fmt}")
+    writer = None
+    for source in sources:
+        header, counts = _load_counts(source)
+        if writer is None:
+            rate = sample_rate or (header['sample_rate'] if header else eeg_recording.read_sample_rate())
+            names = header['channel_names'] if header else None
+            start = header.get('start_time') if header else os.path.getmtime(source)
+            writer = BdfWriter(out_path, rate, fmt=fmt, channel_names=names, start_time=start)
+        step = writer.samples_per_record * 60
+        for i in range(0, len(counts), step):
+            writer.append(np.asarray(counts[i:i + step]))
+    writer.close()
+    print(f"已保存 {out_path} ({writer.records} 个数据记录)")
+    return out_path
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+数据包序号跟踪模块
+根据帧头中的序号字节实时检测丢包与重复包，并累计本次连接 (会话) 的丢包统计。
+"""
+
+
+class SequenceTracker:
+    """
+    循环序号跟踪器
+
+    update() 返回当前包之前缺失的包数 (>= 0)；若为重复或过期的包则返回 -1，
+    调用方应丢弃该包。序号差超过半个周期视为过期包而非丢包。
+    中断超过半个周期 (256 时约 1.3 s) 后，新到的包看起来都是"过期"的：连续 resync_after 个序号连续、
+    且不紧挨在期望序号之前的"过期"包视为长时间中断，以最新的包重新同步，跳过的包 (含此前丢弃的几个) 计为丢包。
+    跳过的整周期数无法由序号得知，丢包数按一个周期内计。
+    """
+
+    def __init__(self, modulo=256, resync_after=3):
+        self.modulo = modulo
+        self.resync_after = resync_after
+        self.expected = None
+        self.stale = 0              # 连续 "过期" 包的个数
+        self.last_stale = None
+        self.received = 0
+        self.lost = 0
+        self.duplicates = 0
+        self.gap_events = 0
+        self.resyncs = 0
+        self.filled_samples = 0     # 由调用方登记的 NaN 占位采样点数
+
+    def reset(self):
+        """重新开始跟踪（例如重连之后），保留累计计数"""
+        self.expected = None
+        self.stale = 0
+
+    def update(self, seq):
+        if self.expected is None:
+            self.expected = (seq + 1) % self.modulo
+            self.received += 1
+            return 0
+        gap = (seq - self.expected) % self.modulo
+        if gap >= self.modulo // 2:
+            if self.stale and seq == (self.last_stale + 1) % self.modulo:
+                self.stale += 1
+            else:
+                self.stale = 1
+            self.last_stale = seq
+            behind = (self.expected - seq) % self.modulo
+            if self.stale < self.resync_after or behind <= self.resync_after:
+                self.duplicates += 1
+                return -1
+            # 长时间中断：此前按重复包丢弃的 stale - 1 个包实际是新数据，改计为丢包
+            self.duplicates -= self.stale - 1
+            self.resyncs += 1
+        self.stale = 0
+        if gap:
+            self.lost += gap
+            self.gap_events += 1
+        self.expected = (seq + 1) % self.modulo
+        self.received += 1
+        return gap
+
+    @property
+    def loss_ratio(self):
+        total = self.received + self.lost
+        return self.lost / total if total else 0.0
+
+    def snapshot(self):
+        """返回当前累计计数的副本"""
+        return {
+            'received': self.received,
+            'lost': self.lost,
+            'duplicates': self.duplicates,
+            'gap_events': self.gap_events,
+            'resyncs': self.resyncs,
+            'filled_samples': self.filled_samples,
+        }
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""
+离线数据目录 (offlinedata/catalog.sqlite)
+记录每个实验文件夹 (EEGdata-{MMDD}-{n}) 及其中每个录制文件的设备、歌曲、采样点数、时长、
+有效采样率与丢包情况，每次保存时在一个事务中写入 (WAL 模式，多进程/多线程安全)。
+
+用途:
+    - 新建实验文件夹时直接从目录取下一个编号，不再逐个 os.path.exists / os.listdir 探测
+    - 跨被试查询，例如某首歌的全部录制，不必遍历所有文件夹、读取所有文件
+
+目录缺失或损坏时可由现有文件重建 (rebuild)，其内容完全可由 offlinedata/ 下的文件推导。
+
+用法:
+    catalog = SessionCatalog("offlinedata")
+    for rec in catalog.recordings(song="江南"):
+        print(rec['path'], rec['duration'], rec['loss'])
+    python external_modules/session_catalog.py song 江南
+    python external_modules/session_catalog.py sessions
+    python external_modules/session_catalog.py --dir offlinedata rebuild
+"""
+
+import argparse
+import contextlib
+import os
+import re
+import sqlite3
+import time
+
+try:
+    from . import eeg_recording
+except ImportError:
+    import eeg_recording
+
+CATALOG_NAME = "catalog.sqlite"
+SESSION_PREFIX = "EEGdata"
+BUSY_TIMEOUT = 10.0     # 其他进程持有写锁时的等待时间 (秒)
+
+_SESSION_RE = re.compile(rf"^{SESSION_PREFIX}-(\d{{4}})-(\d+)$")
+# main.py 的歌曲文件名: Category_{id}_{name}，多设备时追加 _{设备名}
+_SONG_RE = re.compile(r"^Category_([^_]+)_(.+)$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    folder  TEXT PRIMARY KEY,           -- 相对 offlinedata/ 的文件夹名
+    day     TEXT NOT NULL,              -- MMDD
+    seq     INTEGER NOT NULL,
+    created REAL,
+    device  TEXT,
+    UNIQUE (day, seq)
+);
+CREATE TABLE IF NOT EXISTS recordings (
+    path            TEXT PRIMARY KEY,   -- 相对 offlinedata/ 的文件路径
+    session         TEXT NOT NULL,
+    device          TEXT,
+    song_id         TEXT,
+    song_name       TEXT,
+    format          TEXT,
+    samples         INTEGER,
+    channels        INTEGER,
+    duration        REAL,
+    sample_rate     REAL,
+    effective_rate  REAL,
+    gap_samples     INTEGER,
+    packets_lost    INTEGER,
+    loss            REAL,               -- 丢包率 (有链路统计时按包计，否则按占位采样点计)
+    first_timestamp REAL,
+    saved           REAL
+);
+CREATE INDEX IF NOT EXISTS recordings_song ON recordings (song_name);
+CREATE INDEX IF NOT EXISTS recordings_session ON recordings (session);
+"""
+
+
+def parse_song(path, device=None):
+    """从文件名解析 (歌曲编号, 歌曲名)，非歌曲文件返回 (None, None)"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    if device and stem.endswith(f"_{device}"):
+        stem = stem[:-len(device) - 1]
+    match = _SONG_RE.match(stem)
+    if not match:
+        return None, None
+    return match.group(1), match.group(2)
+
+
+class SessionCatalog:
+    """
+    offlinedata/ 下的 SQLite 目录
+    每次操作使用独立连接，可在保存线程与采集进程中直接调用
+    :param offline_dir: offlinedata 目录
+    """
+
+    def __init__(self, offline_dir):
+        self.offline_dir = os.path.abspath(offline_dir)
+        self.path = os.path.join(self.offline_dir, CATALOG_NAME)
+        os.makedirs(self.offline_dir, exist_ok=True)
+        created = not os.path.exists(self.path)
+        conn = self._connect()
+        try:
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+        if created:
+            # 首次使用：登记已有的文件夹与录制文件
+            self.rebuild()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """BEGIN IMMEDIATE ... COMMIT：写入要么完整生效，要么不生效"""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def _relative(self, path):
+        return os.path.relpath(os.path.abspath(path), self.offline_dir)
+
+    def _absolute(self, rows, key):
+        out = []
+        for row in rows:
+            item = dict(row)
+            item[key] = os.path.join(self.offline_dir, item[key])
+            out.append(item)
+        return out
+
+    def allocate_session(self, day=None, device=None):
+        """
+        分配并创建下一个实验文件夹 EEGdata-{MMDD}-{n}
+        当天最近一个文件夹仍为空时沿用它 (与原先的探测逻辑一致)
+        :return: 文件夹绝对路径
+        """
+        day = day or time.strftime("%m%d", time.localtime())
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT folder, seq FROM sessions WHERE day = ? ORDER BY seq DESC LIMIT 1", (day,)
+            ).fetchone()
+            if row is not None:
+                path = os.path.join(self.offline_dir, row['folder'])
+                if not os.path.isdir(path) or not os.listdir(path):
+                    os.makedirs(path, exist_ok=True)
+                    return path
+            seq = row['seq'] + 1 if row is not None else 1
+            folder = f"{SESSION_PREFIX}-{day}-{seq}"
+            # 目录之外创建的同名非空文件夹 (如手工拷入) 不覆盖
+            while os.path.isdir(os.path.join(self.offline_dir, folder)) and \
+                    os.listdir(os.path.join(self.offline_dir, folder)):
+                seq += 1
+                folder = f"{SESSION_PREFIX}-{day}-{seq}"
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (folder, day, seq, created, device) VALUES (?, ?, ?, ?, ?)",
+                (folder, day, seq, time.time(), device),
+            )
+            path = os.path.join(self.offline_dir, folder)
+            os.makedirs(path, exist_ok=True)
+        return path
+
+    def add_recording(self, path, samples, channels, sample_rate, duration=None, gap_samples=0,
+                      link_stats=None, device=None, first_timestamp=None):
+        """
+        登记 (或更新) 一个已保存的录制文件
+        :param duration: 录制时长 (秒)，用于计算有效采样率
+        :param link_stats: BLE 链路统计 (received / lost / duplicates)
+        """
+        rel = self._relative(path)
+        session = rel.split(os.sep)[0]
+        song_id, song_name = parse_song(path, device)
+        effective_rate = samples / duration if duration else None
+        packets_lost = None
+        loss = gap_samples / samples if samples else None
+        if link_stats:
+            packets_lost = link_stats.get('lost', 0)
+            total = link_stats.get('received', 0) + packets_lost
+            loss = packets_lost / total if total else 0.0
+        fmt = os.path.splitext(path)[1].lstrip('.')
+        match = _SESSION_RE.match(session)
+        with self._transaction() as conn:
+            if match:
+                conn.execute(
+                    "INSERT OR IGNORE INTO sessions (folder, day, seq, created) VALUES (?, ?, ?, ?)",
+                    (session, match.group(1), int(match.group(2)), time.time()),
+                )
+                if device:
+                    conn.execute("UPDATE sessions SET device = COALESCE(device, ?) WHERE folder = ?",
+                                 (device, session))
+            conn.execute(
+                "INSERT OR REPLACE INTO recordings (path, session, device, song_id, song_name, format, samples, "
+                "channels, duration, sample_rate, effective_rate, gap_samples, packets_lost, loss, "
+                "first_timestamp, saved) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (rel, session, device, song_id, song_name, fmt, int(samples), int(channels), duration,
+                 sample_rate, effective_rate, gap_samples, packets_lost, loss, first_timestamp, time.time()),
+            )
+
+    def add_eegrec(self, path, device=None):
+        """按 .eegrec 文件头登记录制文件"""
+        header, counts = eeg_recording.open_recording(path)
+        gap_samples = header.get('gap_samples')
+        if gap_samples is None:
+            # 旧文件头未记录占位采样点数，按第一列统计
+            gap_samples = int((counts[:, 0] == eeg_recording.MISSING).sum()) if len(counts) else 0
+        del counts
+        self.add_recording(
+            path, header['samples'], header['channels'], header['sample_rate'],
+            duration=header.get('duration'), gap_samples=gap_samples,
+            link_stats=header.get('link_stats'), device=device or header.get('device'),
+            first_timestamp=header.get('first_timestamp'),
+        )
+
+    def recordings(self, song=None, song_id=None, device=None, session=None):
+        """
+        查询录制文件，条件均为可选；song 为歌曲名 (精确匹配，走索引)
+        :return: dict 列表，path 为绝对路径
+        """
+        clauses, params = [], []
+        for column, value in (('song_name', song), ('song_id', song_id), ('device', device),
+                              ('session', session)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        sql = "SELECT * FROM recordings"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY session, saved"
+        conn = self._connect()
+        try:
+            return self._absolute(conn.execute(sql, params).fetchall(), 'path')
+        finally:
+            conn.close()
+
+    def sessions(self):
+        """所有实验文件夹及其录制数量"""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT s.*, COUNT(r.path) AS recordings FROM sessions s "
+                "LEFT JOIN recordings r ON r.session = s.folder GROUP BY s.folder ORDER BY s.day, s.seq"
+            ).fetchall()
+            return self._absolute(rows, 'folder')
+        finally:
+            conn.close()
+
+    def rebuild(self):
+        """扫描 offlinedata/ 登记已有的实验文件夹与 .eegrec 文件 (目录丢失或首次使用时)"""
+        with self._transaction() as conn:
+            for entry in os.scandir(self.offline_dir):
+                match = _SESSION_RE.match(entry.name)
+                if entry.is_dir() and match:
+                    conn.execute(
+                        "INSERT OR IGNORE INTO sessions (folder, day, seq, created) VALUES (?, ?, ?, ?)",
+                        (entry.name, match.group(1), int(match.group(2)), entry.stat().st_mtime),
+                    )
+        for entry in os.scandir(self.offline_dir):
+            if not (entry.is_dir() and _SESSION_RE.match(entry.name)):
+                continue
+            for name in sorted(os.listdir(entry.path)):
+                if name.endswith(eeg_recording.EXTENSION):
+                    try:
+                        self.add_eegrec(os.path.join(entry.path, name))
+                    except (OSError, ValueError, KeyError):
+                        continue
+
+
+def _print_rows(rows, columns):
+    for row in rows:
+        print("  ".join(str(row[column]) for column in columns))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="offlinedata session catalog")
+    parser.add_argument("--dir", default="offlinedata")
+    sub = parser.add_subparsers(dest="command", required=True)
+    song = sub.add_parser("song", help="某首歌的全部录制")
+    song.add_argument("name")
+    sub.add_parser("sessions", help="列出实验文件夹")
+    sub.add_parser("rebuild", help="由现有文件重建目录")
+    args = parser.parse_args()
+    catalog = SessionCatalog(args.dir)
+    if args.command == "song":
+        _print_rows(catalog.recordings(song=args.name),
+                    ('path', 'device', 'samples', 'duration', 'effective_rate', 'loss'))
+    elif args.command == "sessions":
+        _print_rows(catalog.sessions(), ('folder', 'device', 'recordings'))
+    else:
+        catalog.rebuild()
+        print(f"{len(catalog.sessions())} sessions, {len(catalog.recordings())} recordings")
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+共享内存采样环形缓冲区
+采集进程将解码后的采样点 (float32) 及其 LSL 时间戳 (float64) 写入 multiprocessing.shared_memory，
+录制与显示端在其他进程中按各自的读位置读取，数据不经过 pickle。
+
+内存布局:
+    头部 64 字节: 已写入的采样总数 int64 | 通道数 int64 | 容量 int64 | 采样率 float64
+    时间戳:       float64[capacity]
+    数据:         float32[capacity, channels]
+
+单写多读：写入方先写数据再更新采样总数；读取方复制完成后再检查一次采样总数，
+复制期间可能被覆盖的采样点计为溢出丢弃。
+"""
+
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+HEADER_BYTES = 64
+
+
+def _attach(name):
+    """连接已存在的共享内存，由创建方负责释放"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 没有 track 参数；采集进程由主进程启动，两者共用同一个 resource_tracker，
+        # 重复登记不会导致提前释放
+        return shared_memory.SharedMemory(name=name)
+
+
+class SharedSampleRing:
+    """
+    共享内存中的采样点环形缓冲区
+    :param channels: 通道数 (含 trigger 通道)，创建时必填
+    :param capacity: 可容纳的采样点数，创建时必填
+    :param name: 连接已有缓冲区时使用的共享内存名称
+    """
+
+    def __init__(self, channels=None, capacity=None, sample_rate=0.0, name=None, create=True):
+        self.owner = create
+        if create:
+            size = HEADER_BYTES + capacity * 8 + capacity * channels * 4
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            header = np.ndarray((4,), dtype=np.int64, buffer=self.shm.buf)
+            header[:3] = (0, channels, capacity)
+            header[3:4].view(np.float64)[0] = sample_rate
+        else:
+            self.shm = _attach(name)
+        self._header = np.ndarray((4,), dtype=np.int64, buffer=self.shm.buf)
+        self.channels = int(self._header[1])
+        self.capacity = int(self._header[2])
+        self.sample_rate = float(self._header[3:4].view(np.float64)[0])
+        self.timestamps = np.ndarray((self.capacity,), dtype=np.float64, buffer=self.shm.buf,
+                                     offset=HEADER_BYTES)
+        self.data = np.ndarray((self.capacity, self.channels), dtype=np.float32, buffer=self.shm.buf,
+                               offset=HEADER_BYTES + self.capacity * 8)
+
+    @classmethod
+    def attach(cls, name):
+        return cls(name=name, create=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def write_index(self):
+        """已写入的采样点总数"""
+        return int(self._header[0])
+
+    def write(self, chunk, timestamps):
+        """
+        追加一块采样点 (仅限单一写入方)
+        :param chunk: 形状为 (samples, channels) 的数组
+        :param timestamps: 每个采样点的时间戳
+        """
+        n = len(chunk)
+        if n == 0:
+            return
+        index = int(self._header[0])
+        if n > self.capacity:
+            chunk, timestamps = chunk[-self.capacity:], timestamps[-self.capacity:]
+            index += n - self.capacity
+            n = self.capacity
+        pos = index % self.capacity
+        first = min(n, self.capacity - pos)
+        self.data[pos:pos + first] = chunk[:first]
+        self.timestamps[pos:pos + first] = timestamps[:first]
+        if first < n:
+            self.data[:n - first] = chunk[first:]
+            self.timestamps[:n - first] = timestamps[first:]
+        self._header[0] = index + n
+
+    def read(self, start, max_samples=None):
+        """
+        读取从 start 开始的采样点副本
+        :return: (data, timestamps, next_index, overrun)，overrun 为因读取过慢被覆盖而跳过的采样点数
+        """
+        end = int(self._header[0])
+        overrun = 0
+        oldest = end - self.capacity
+        if start < oldest:
+            overrun = oldest - start
+            start = oldest
+        if max_samples is not None:
+            end = min(end, start + max_samples)
+        n = end - start
+        if n <= 0:
+            return self.data[:0].copy(), self.timestamps[:0].copy(), start, overrun
+        idx = np.arange(start, end) % self.capacity
+        data = self.data[idx]
+        timestamps = self.timestamps[idx]
+        # 复制期间写入方可能已绕回覆盖了最早的部分
+        oldest = int(self._header[0]) - self.capacity
+        if start < oldest:
+            torn = min(oldest - start, n)
+            overrun += torn
+            data, timestamps, start = data[torn:], timestamps[torn:], start + torn
+        return data, timestamps, end, overrun
+
+    def close(self):
+        self.timestamps = self.data = self._header = None
+        self.shm.close()
+
+    def unlink(self):
+        if self.owner:
+            self.shm.unlink()
+
+
+class RingInlet:
+    """
+    以 pylsl.StreamInlet.pull_chunk 的接口读取 SharedSampleRing，
+    可直接替代 EEGLogger 中的 LSL inlet。从连接时的最新位置开始读取。
+    """
+
+    def __init__(self, ring, poll_interval=0.005):
+        self.ring = ring
+        self.poll_interval = poll_interval
+        self.read_index = ring.write_index
+        self.overrun_samples = 0
+
+    def pull_chunk(self, timeout=0.0, max_samples=1024):
+        """
+        :return: (chunk, timestamps)，chunk 为 (samples, channels) 的 float32 数组，无数据时为空
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            data, timestamps, self.read_index, overrun = self.ring.read(self.read_index, max_samples)
+            self.overrun_samples += overrun
+            if len(data) or time.monotonic() >= deadline:
+                return data, timestamps
+            time.sleep(self.poll_interval)
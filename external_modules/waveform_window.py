@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+实时波形预览控件 (PyQt5，供 xw_web_C8 使用)
+定时从 DisplayReader 读取新增采样，按控件宽度做 min/max 抽取后用 QPainter 绘制，
+每帧最多绘制 2 x 像素宽度 个点，与录制时长无关。最后一列 (trigger) 不绘制波形，非零处画竖线。
+"""
+
+import numpy as np
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+try:
+    from .display_stream import DISPLAY_SECONDS, DisplayReader
+    from .eeg_recording import channel_names_for
+except ImportError:
+    from display_stream import DISPLAY_SECONDS, DisplayReader
+    from eeg_recording import channel_names_for
+
+REFRESH_FPS = 30
+LABEL_WIDTH = 48
+BACKGROUND = QtGui.QColor("#1e1e1e")
+TRACE = QtGui.QColor("#4fc3f7")
+TRIGGER = QtGui.QColor("#ff7043")
+TEXT = QtGui.QColor("#bdbdbd")
+
+
+class WaveformWindow(QtWidgets.QWidget):
+    """
+    多通道波形预览
+    :param source: DisplayStream (同一进程) 或共享内存名称
+    """
+
+    def __init__(self, source, parent=None, seconds=DISPLAY_SECONDS, fps=REFRESH_FPS):
+        super().__init__(parent)
+        self.reader = DisplayReader(source, seconds)
+        self.channel_names = None
+        self.setMinimumHeight(200)
+        self.timer = QtCore.QTimer(self)
+        self.timer.timeout.connect(self._refresh)
+        self.timer.start(int(1000 / fps))
+
+    def _refresh(self):
+        # 只有新数据到达时才重绘
+        if self.reader.poll():
+            self.update()
+
+    def paintEvent(self, event):
+        painter = QtGui.QPainter(self)
+        painter.fillRect(self.rect(), BACKGROUND)
+        plot_width = self.width() - LABEL_WIDTH
+        points = self.reader.decimated(plot_width)
+        if points.ndim != 2 or len(points) < 2 or points.shape[1] < 2 or plot_width <= 0:
+            painter.end()
+            return
+        eeg, trigger = points[:, :-1], points[:, -1]
+        if self.channel_names is None or len(self.channel_names) != points.shape[1]:
+            self.channel_names = channel_names_for(points.shape[1])
+        n_channels = eeg.shape[1]
+        lane = self.height() / n_channels
+        x = LABEL_WIDTH + np.linspace(0, plot_width, len(points))
+
+        painter.setPen(QtGui.QPen(TRIGGER, 1))
+        for i in np.flatnonzero(np.nan_to_num(trigger) != 0):
+            painter.drawLine(QtCore.QPointF(x[i], 0), QtCore.QPointF(x[i], self.height()))
+
+        with np.errstate(all='ignore'):
+            center = np.nanmedian(eeg, axis=0)
+            span = np.nanmax(np.abs(eeg - center), axis=0)
+        span = np.where(np.isfinite(span) & (span > 0), span, 1.0)
+        painter.setRenderHint(QtGui.QPainter.Antialiasing, False)
+        for ch in range(n_channels):
+            mid = lane * (ch + 0.5)
+            y = mid - (eeg[:, ch] - center[ch]) / span[ch] * lane * 0.45
+            path = QtGui.QPainterPath()
+            pen_down = False
+            for xi, yi in zip(x, y):
+                if not np.isfinite(yi):
+                    # 丢包区段断开曲线
+                    pen_down = False
+                elif pen_down:
+                    path.lineTo(xi, yi)
+                else:
+                    path.moveTo(xi, yi)
+                    pen_down = True
+            painter.setPen(QtGui.QPen(TRACE, 1))
+            painter.drawPath(path)
+            painter.setPen(TEXT)
+            painter.drawText(QtCore.QRectF(0, mid - 10, LABEL_WIDTH - 4, 20),
+                             QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter, self.channel_names[ch])
+        painter.end()
+
+    def closeEvent(self, event):
+        self.timer.stop()
+        self.reader.close()
+        super().closeEvent(event)
@@ -28,12 +28,11 @@ Change Log:
 
 import multiprocessing
 import os
-from queue import Empty, Full
+from queue import Empty, Full, Queue
 import shutil
 import sys
 import threading
 import time
-from EEG_merge import eeg_merge
 from PyQt5 import QtCore, QtWebEngineWidgets, QtWidgets, QtGui
 import numpy as np
 import pandas as pd
@@ -44,6 +43,21 @@ try:
 except ImportError:
     from ble_receive_eeg_trigger import breceive
 
+try:
+    from .EEG_merge import start_merge
+    from .display_stream import DisplayStream
+    from .eeg_recording import MISSING, read_sample_rate, write_timestamps
+    from .log_pipeline import RateLimiter
+    from .sample_buffer import SampleBuffer, SampleRing
+    from .session_catalog import SessionCatalog
+except ImportError:
+    from EEG_merge import start_merge
+    from display_stream import DisplayStream
+    from eeg_recording import MISSING, read_sample_rate, write_timestamps
+    from log_pipeline import RateLimiter
+    from sample_buffer import SampleBuffer, SampleRing
+    from session_catalog import SessionCatalog
+
 from ble_receive_impedance import impedance_receive
 from save_edf import save_edf
 from PSD_online import EEG_PSD_web_start
@@ -61,56 +75,120 @@ from waveform_window import WaveformWindow
 import warnings
 warnings.filterwarnings("ignore")
 
-def save_data(eeg_data,word,save_path,k):
-    eeg_data = np.array(eeg_data) /120
+SEGMENT_SECONDS = 30        # 每段 EEG-offline-data-{k}.csv 的时长
+DISPLAY_SECONDS = 10        # 送往 PSD 显示队列的固定窗口长度
+DISPLAY_FPS = 30            # PSD 显示队列的更新频率上限
+PULL_TIMEOUT = 0.05         # pull_chunk 等待时间，避免空转占满 CPU
+
+
+def save_data(eeg_data,word,save_path,k,eeg_timestamps=None):
+    """保存一段数据 (int32 计数，MISSING 为丢包占位) 为 EEG-offline-data-{k}.csv 及时间戳旁路文件"""
+    eeg_data = np.asarray(eeg_data)
+    eeg_data = np.where(eeg_data == MISSING, np.nan, eeg_data / 120)
     print("time: {}, 存储数据: {}, shape: {} ".format(time.time(), word, eeg_data.shape))
-    pd.DataFrame(eeg_data).to_csv(os.path.join(save_path, "EEG-offline-data-{}.csv".format(k)))
-    
-def received_data(queue, save_path, display_queue: multiprocessing.Queue):
+    csv_path = os.path.join(save_path, "EEG-offline-data-{}.csv".format(k))
+    pd.DataFrame(eeg_data).to_csv(csv_path)
+    sample_rate = read_sample_rate()
+    duration = None
+    first_timestamp = None
+    if eeg_timestamps is not None and len(eeg_timestamps):
+        # 同名 .ts / .tsidx：逐点 LSL 时间戳与稀疏时间索引，按时间截取时二分查找
+        write_timestamps(csv_path, eeg_timestamps, sample_rate)
+        duration = float(eeg_timestamps[-1] - eeg_timestamps[0]) + 1.0 / sample_rate
+        first_timestamp = float(eeg_timestamps[0])
+    if eeg_data.ndim == 2 and len(eeg_data):
+        try:
+            SessionCatalog(os.path.dirname(os.path.abspath(save_path))).add_recording(
+                csv_path, eeg_data.shape[0], eeg_data.shape[1], sample_rate, duration=duration,
+                gap_samples=int(np.isnan(eeg_data[:, 0]).sum()), first_timestamp=first_timestamp)
+        except Exception as e:
+            print("更新 session 目录失败: {}".format(e))
+
+
+def segment_writer(segments: Queue, save_path):
+    # 后台写段线程：采集循环只交出缓冲区，CSV 转换与写盘不阻塞拉取
+    while True:
+        item = segments.get()
+        if item is None:
+            break
+        eeg_data, eeg_timestamps, word, k = item
+        try:
+            save_data(eeg_data, word, save_path, k, eeg_timestamps)
+        except Exception as e:
+            print("存储数据失败: {}".format(e))
+
+
+def send_display(display_queue, data):
+    # 非阻塞方式发送数据，如果队列满则丢弃旧数据
+    try:
+        display_queue.put(data, block=False)
+    except Full:
+        try:
+            display_queue.get_nowait()
+            display_queue.put(data, block=False)
+        except (Empty, Full):
+            pass
+
+
+def received_data(queue, save_path, display_queue: multiprocessing.Queue, save_state=None, display_stream=None):
     # 采集脑电数据线程
+    # 数据追加到预分配的 SampleBuffer (均摊 O(1))，每 SEGMENT_SECONDS 秒整块交给后台写段线程；
+    # display_stream: 波形显示的共享内存环形缓冲 (DisplayStream)，每块新数据直接写入，显示端按需读取
+    # display_queue: 可选，PSD 服务使用，只发送最近 DISPLAY_SECONDS 秒的固定窗口，且不超过 DISPLAY_FPS 次/秒
+    # save_state: 可选 dict，记录本次保存的第一个与最后一个分段编号 (first_segment / last_segment)，
+    #             最后一段写完后置位 flushed (threading.Event)，供合并线程使用
+    sample_rate = read_sample_rate()
     while True:
         streams = resolve_stream('type', 'EEG')
         inlet = StreamInlet(streams[0],max_chunklen=10)
-        eeg_data = []
+        buffer = SampleBuffer(capacity=int(sample_rate * SEGMENT_SECONDS * 1.2))
+        display = SampleRing(int(sample_rate * DISPLAY_SECONDS))
+        display_limiter = RateLimiter(1.0 / DISPLAY_FPS)
         word = queue.get()
         print("time: {}, 开始记录数据: {}".format(time.time(), word))
         k = 0
         start = time.time()
         if word.startswith("start"):
-            print(1)
+            if save_state is not None:
+                save_state['flushed'].clear()
+                save_state['last_segment'] = None
+            segments = Queue()
+            writer = threading.Thread(target=segment_writer, args=(segments, save_path), daemon=True)
+            writer.start()
             while True:
-                sample , timestamps= inlet.pull_chunk()
-                eeg_data = eeg_data +sample
-                # print(timestamps)
+                sample , timestamps= inlet.pull_chunk(timeout=PULL_TIMEOUT)
+                if len(sample):
+                    buffer.extend(sample, timestamps)
+                    if display_stream is not None:
+                        display_stream.write(sample, timestamps)
+                    if display_queue is not None:
+                        display.extend(sample)
                 current = time.time()
-                if current - start >= 30:
-                    print(current - start)
+                if current - start >= SEGMENT_SECONDS:
                     start = current
-                    save_data(eeg_data,word,save_path,k)
-                    eeg_data =[]
+                    eeg_data, eeg_timestamps = buffer.take()
+                    segments.put((eeg_data, eeg_timestamps, word, k))
                     k += 1
-                if display_queue is not None:
-                    try:
-                        # 非阻塞方式发送数据，如果队列满则丢弃旧数据
-                        display_queue.put(np.array(eeg_data) / 120, block=False)
-                        # print(np.array(eeg_data).shape)
-                    except Full:
-                        try:
-                            # 队列满时，取出旧数据后再放入新数据
-                            display_queue.get_nowait()
-                            display_queue.put(np.array(eeg_data) / 120, block=False)
-                            # print(np.array(eeg_data).shape)
-                        except Empty:
-                            pass
+                if display_queue is not None and len(sample) and display_limiter.ready():
+                    send_display(display_queue, display.latest() / 120)
                     
                 if not queue.empty():
                     end_word = queue.get()
-                    # print(222222222222222)
                     if end_word == "end":
                         break
                     if end_word == "save":
-                        eeg_data = []
-            save_data(eeg_data,word,save_path,k)
+                        buffer.take()
+                        if save_state is not None:
+                            save_state['first_segment'] = k
+            eeg_data, eeg_timestamps = buffer.take()
+            segments.put((eeg_data, eeg_timestamps, word, k))
+            segments.put(None)
+            if save_state is not None:
+                save_state['last_segment'] = k
+            # 等待最后一段写完，之后才能合并
+            writer.join()
+            if save_state is not None:
+                save_state['flushed'].set()
         elif word == "del":
             print("存储脑电程序退出")
             break
@@ -118,21 +196,16 @@ def received_data(queue, save_path, display_queue: multiprocessing.Queue):
 class Ui_MainWindow(object):
     def setupUi(self, MainWindow):
         # 获取当前日期和时间作为文件夹名称
-        current_time = time.strftime("%m%d", time.localtime())    
-        # 检查文件夹是否存在且非空时才自动编号
-        folder_index = 1
-        target_path = os.path.join('offlinedata', f"EEGdata-{current_time}-{folder_index}")
-        while os.path.exists(target_path) and os.listdir(target_path):
-            folder_index += 1
-            target_path = os.path.join('offlinedata', f"EEGdata-{current_time}-{folder_index}")
-        self.save_path = target_path
-        # 创建文件夹
-        os.makedirs(self.save_path, exist_ok=True)
+        # 由 offlinedata/catalog.sqlite 分配下一个 EEGdata-{MMDD}-{n} 文件夹 (当天最近的文件夹为空时沿用)
+        self.catalog = SessionCatalog('offlinedata')
+        self.save_path = os.path.relpath(self.catalog.allocate_session(device="MSM"))
 
         self.queue = multiprocessing.Queue()
         self.host = '127.0.0.1'
         self.port = 8866
         self.display_queue = multiprocessing.Queue(maxsize=1)
+        # 波形预览：采集线程写入共享内存环形缓冲，WaveformWindow 只读取新增采样
+        self.display_stream = DisplayStream(sample_rate=read_sample_rate())
         self.shutdown_flag = threading.Event()
         self.is_open = False
         self.save_time = 0
@@ -140,6 +213,9 @@ class Ui_MainWindow(object):
         self.is_save = False
         self.is_impedance = False
         self.is_preview = False
+        # 采集线程与合并线程共享：本次保存的第一个分段编号，最后一段是否已写完
+        self.save_state = {'first_segment': 0, 'last_segment': None, 'flushed': threading.Event()}
+        self.merge_thread = None  # 后台合并线程，合并完成前不导出 BDF
         self.impedance = None
         self.web = None
         self.is_PSD_online = 0
@@ -311,14 +387,17 @@ class Ui_MainWindow(object):
         print(word)
         time.sleep(1)
         if not self.is_preview:
-            self.process = threading.Thread(target=received_data, args=(self.queue, self.save_path, self.display_queue))
+            psd_queue = self.display_queue if self.is_PSD_online else None
+            self.process = threading.Thread(target=received_data,
+                                            args=(self.queue, self.save_path, psd_queue, self.save_state,
+                                                  self.display_stream))
             self.process.start()
             self.is_preview = True
             self.queue.put("start")
             self.pushButton1.setText(_translate("MainWindow", "预览模式"))
             print("开始预览波形")
             if not hasattr(self, 'waveform_window'):
-                self.waveform_window = WaveformWindow(self.display_queue, self.waveform_container)
+                self.waveform_window = WaveformWindow(self.display_stream, self.waveform_container)
                 if self.is_PSD_online:
                     # 启动带有Web服务的PSD处理
                     self.psd_processor_instance = EEG_PSD_web_start(self.display_queue, host='0.0.0.0', port=8878)
@@ -355,8 +434,11 @@ class Ui_MainWindow(object):
             self.queue.put("end")
             self.pushButton2.setText(_translate("MainWindow", "开始保存"))
             print("停止保存")
-            time.sleep(1)
-            eeg_merge(self.save_path,name)
+            # 后台合并为 {name}{save_time}.eegrec (与 ClickButton5 的文件名一致)，等待最后一段写完后开始
+            # 只合并本次保存的分段 [first_segment, last_segment]，排除之前保存遗留的编号更大的旧分段
+            self.merge_thread = start_merge(self.save_path, name + self.save_time, self.save_state['first_segment'],
+                                            wait=self.save_state['flushed'],
+                                            last_segment=lambda: self.save_state['last_segment'])
             self.is_save = False
         else:
             if self.is_first:
@@ -426,6 +508,10 @@ class Ui_MainWindow(object):
         if not name or name == "请输入保存文件名":
             print("请输入有效文件名")
             return
+        if self.merge_thread is not None and self.merge_thread.is_alive():
+            # 合并未完成时 .eegrec 尚未写完 (或尚未创建)，此时转换会得到不完整的数据
+            print("分段合并尚未完成，请稍后再导出 BDF")
+            return
         name = name + self.save_time
         print(name)
         save_edf(self.save_path,name)
@@ -447,4 +533,6 @@ if __name__ == '__main__':
         MainWindow.move(screen_geometry.x(), screen_geometry.y())
 
     MainWindow.showMaximized()  # 显示窗体
-    sys.exit(app.exec_())  # 程序关闭时退出进程
\ No newline at end of file
+    exit_code = app.exec_()
+    ui.display_stream.close()  # 释放波形显示的共享内存
+    sys.exit(exit_code)  # 程序关闭时退出进程
\ No newline at end of file
@@ -2,11 +2,25 @@
 """
 歌词展示窗口模块
 定义了全屏展示歌词的窗口类。
+歌曲开始前把每一屏歌词 (原文 + 译文) 预先绘制为 QPixmap，刺激开始时只需绘制一张图片，
+不再重新排版大号文字；LRC 歌词按音频时钟定时切换，纯文本歌词整首一屏静态显示。
 """
 
-from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLabel
-from PyQt6.QtCore import Qt, pyqtSignal
-from PyQt6.QtGui import QFont, QPalette, QColor
+import math
+
+from pylsl import local_clock
+from PyQt6.QtWidgets import QWidget
+from PyQt6.QtCore import Qt, QTimer, QRectF, pyqtSignal
+from PyQt6.QtGui import QColor, QFont, QFontMetrics, QPainter, QPalette, QPixmap
+
+from timed_lyrics import line_index_at
+
+FONT_FAMILY = "Microsoft YaHei"
+MAIN_FONT_SIZE = 80     # 原文 (每组第一行)
+SUB_FONT_SIZE = 48      # 译文
+LINE_SPACING = 30
+SIDE_MARGIN = 60
+SUB_COLOR = QColor("#bdbdbd")
 
 class LyricsWindow(QWidget):
     """
@@ -14,36 +28,127 @@ class LyricsWindow(QWidget):
     """
     # 定义停止信号
     stop_signal = pyqtSignal()
+    # 每屏歌词显示后发出: (屏序号, 显示时的 LSL 时间)
+    line_shown = pyqtSignal(int, float)
 
-    def __init__(self):
+    def __init__(self, clock=local_clock):
         super().__init__()
         self.setWindowTitle("Experiment")
         self.setWindowFlags(Qt.WindowType.FramelessWindowHint) # 无边框
         self.showFullScreen()
-        
+
         # 黑色背景
         palette = self.palette()
         palette.setColor(QPalette.ColorRole.Window, Qt.GlobalColor.black)
         self.setPalette(palette)
-        
-        layout = QVBoxLayout()
-        self.label = QLabel("")
-        self.label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.label.setWordWrap(False)
-        
-        # 设置字体 (80号字体，确保单行显示)
-        font = QFont("Microsoft YaHei", 80, QFont.Weight.Bold)
-        self.label.setFont(font)
-        self.label.setStyleSheet("color: white;")
-        
-        layout.addWidget(self.label)
-        self.setLayout(layout)
+
+        self.clock = clock
+        self.pixmap = None          # 当前显示的图片
+        self.lines = []             # 当前歌曲的 LyricLine
+        self.line_pixmaps = []      # 与 lines 一一对应的预绘制图片
+        self.line_index = -1
+        self.play_time = None       # 声音开始输出的 LSL 时间
+        self.line_timer = QTimer(self)
+        self.line_timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.line_timer.setSingleShot(True)
+        self.line_timer.timeout.connect(self._advance)
+
+    def render_lines(self, texts):
+        """
+        把一屏文字绘制为 QPixmap (宽度为屏幕宽度)
+        每组第一行 (第一行或空行之后的行) 为原文大字，其余为译文；空行只占间距。
+        超宽的行缩小字号以保持单行，总高度超过屏幕时整体缩小。
+        """
+        ratio = self.devicePixelRatioF()
+        geometry = self.screen().geometry() if self.screen() else self.rect()
+        width, screen_height = max(geometry.width(), 1), max(geometry.height(), 1)
+        mains = [bool(text) and (i == 0 or not texts[i - 1]) for i, text in enumerate(texts)]
+        fonts = []
+        for text, main in zip(texts, mains):
+            font = QFont(FONT_FAMILY, MAIN_FONT_SIZE if main else SUB_FONT_SIZE,
+                         QFont.Weight.Bold if main else QFont.Weight.Normal)
+            advance = QFontMetrics(font).horizontalAdvance(text)
+            if advance > width - 2 * SIDE_MARGIN:
+                font.setPointSizeF(font.pointSizeF() * (width - 2 * SIDE_MARGIN) / advance)
+            fonts.append(font)
+        heights = [QFontMetrics(font).height() if text else 0 for text, font in zip(texts, fonts)]
+        height = sum(heights) + LINE_SPACING * (len(texts) - 1)
+        if height > screen_height - 2 * SIDE_MARGIN:
+            scale = (screen_height - 2 * SIDE_MARGIN) / height
+            for font in fonts:
+                font.setPointSizeF(font.pointSizeF() * scale)
+            heights = [QFontMetrics(font).height() if text else 0 for text, font in zip(texts, fonts)]
+            height = sum(heights) + LINE_SPACING * (len(texts) - 1)
+        height = max(height, 1)
+
+        pixmap = QPixmap(int(width * ratio), int(height * ratio))
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(Qt.GlobalColor.transparent)
+        painter = QPainter(pixmap)
+        painter.setRenderHint(QPainter.RenderHint.TextAntialiasing)
+        y = 0
+        for text, font, h, main in zip(texts, fonts, heights, mains):
+            painter.setFont(font)
+            painter.setPen(QColor("white") if main else SUB_COLOR)
+            painter.drawText(QRectF(0, y, width, h), Qt.AlignmentFlag.AlignCenter, text)
+            y += h + LINE_SPACING
+        painter.end()
+        return pixmap
 
     def set_text(self, text):
-        self.label.setText(text)
-    
+        """显示静态文字 (准备阶段提示等)，停止歌词定时切换"""
+        self.stop_lines()
+        self.pixmap = self.render_lines(text.split("\n"))
+        self.update()
+
+    def load_lines(self, lines):
+        """预绘制一首歌的全部歌词 (在开始录制之前调用)"""
+        self.stop_lines()
+        self.lines = lines
+        self.line_pixmaps = [self.render_lines(line.text) if line.text else None for line in lines]
+
+    def start_lines(self, play_time):
+        """
+        按音频时钟显示歌词
+        :param play_time: 声音开始输出的 LSL 时间 (play() 返回时刻加混音器输出延迟)，
+                          第 i 屏在 play_time + lines[i].start 时显示，line_shown 的时间戳即该屏对应歌词的发声时刻
+        """
+        self.play_time = play_time
+        self.line_index = -1
+        self.pixmap = None
+        self.update()
+        self._advance()
+
+    def stop_lines(self):
+        self.line_timer.stop()
+        self.play_time = None
+
+    def _advance(self):
+        if self.play_time is None or not self.lines:
+            return
+        index = line_index_at(self.lines, self.clock() - self.play_time)
+        if index >= 0 and index != self.line_index:
+            self.line_index = index
+            self.pixmap = self.line_pixmaps[index]
+            # 同步重绘，使 line_shown 的时间戳尽量接近实际显示时刻
+            self.repaint()
+            self.line_shown.emit(index, self.clock())
+        if index + 1 < len(self.lines):
+            delay = self.play_time + self.lines[index + 1].start - self.clock()
+            self.line_timer.start(max(math.ceil(delay * 1000), 0))
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), Qt.GlobalColor.black)
+        if self.pixmap is not None:
+            ratio = self.pixmap.devicePixelRatio()
+            w, h = self.pixmap.width() / ratio, self.pixmap.height() / ratio
+            painter.drawPixmap(int((self.width() - w) / 2), int((self.height() - h) / 2), self.pixmap)
+        painter.end()
+
     def keyPressEvent(self, event):
         # 允许按 ESC 退出
         if event.key() == Qt.Key.Key_Escape:
+            self.stop_lines()
             self.stop_signal.emit() # 发送停止信号
             self.close()
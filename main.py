@@ -6,7 +6,9 @@
 
 import sys
 import os
+import time
 import logging
+from functools import partial
 from typing import List
 
 from PyQt6.QtWidgets import (
@@ -20,6 +22,7 @@ from PyQt6.QtGui import QPixmap, QIcon
 
 # 导入 pygame 用于音频播放
 import pygame
+from pylsl import local_clock
 
 # 导入自定义模块
 import styles
@@ -27,6 +30,11 @@ from ble_worker import BLEWorker
 from lyrics_window import LyricsWindow
 from ui_components import SongCard
 from eeg_logger import EEGLogger
+from external_modules.log_pipeline import install_queue_logging
+from external_modules.event_markers import EventMarker, CODE_SONG_END
+from playback_monitor import PlaybackMonitor
+from stimulus_prefetch import StimulusPrefetcher, read_lyrics
+from timed_lyrics import parse_lyrics
 
 # 配置日志
 logging.basicConfig(
@@ -35,6 +43,23 @@ logging.basicConfig(
 )
 logger = logging.getLogger("Main")
 
+# 将蓝牙原始通知写入实验文件夹，作为可回放的无损存档 (external_modules/ble_capture.py)
+RAW_CAPTURE_ON = True
+# 单设备时在独立进程中接收与解码，EEGLogger 经共享内存读取数据，避免与 GUI / 保存线程争抢 GIL
+ACQUISITION_PROCESS_ON = False
+# 实验环节切换时向设备发送 trigger 码，并发布 LSL 标记流 (external_modules/event_markers.py)
+DEVICE_TRIGGER_ON = True
+LSL_MARKERS_ON = True
+# 歌曲结束时按音频结束时刻 (按歌曲时长推算) 结束 EEG 录制，否则在检测到结束时立即停止。
+# 设备 trigger 可用时继续录制到结束 trigger (251) 写入数据为止、不截断，使其留在每首歌的录制文件中，
+# 音频结束位置见 .events.tsv 的 song_end 行；否则截断，只保留音频结束之前的采样
+TRIM_TO_AUDIO = True
+# 混音器缓冲 (采样帧)，决定 play() 到声音输出的延迟 (512 / 44100 Hz ≈ 12 ms)
+MIXER_BUFFER = 512
+# 播放前等待后台预加载完成的最长时间 (秒)，在开始录制之前等待，超时则退回流式播放
+PREFETCH_WAIT = 5.0
+PREFETCH_POLL_MS = 20  # 等待期间检查预加载是否完成的间隔，不阻塞界面线程
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -52,15 +77,23 @@ class MainWindow(QMainWindow):
             self.setWindowIcon(QIcon(logo_path))
 
         # 初始化 Pygame Mixer
-        pygame.mixer.init()
+        pygame.mixer.init(buffer=MIXER_BUFFER)
         
         # 数据
         self.song_cards: List[SongCard] = []
         self.current_playlist = []
         self.current_song_index = 0
         self.is_playing = False
+        # 后台预解码音频并读取歌词：第 N 首播放时加载第 N+1 首
+        self.prefetcher = StimulusPrefetcher()
+        self.pending_song = None  # 正在等待预加载完成、尚未开始播放的歌曲
+        self.lyrics_timed = False  # 当前歌曲的歌词是否带 LRC 时间标签 (只有此时才发送歌词标记)
+        self.prefetch_deadline = 0.0
         self.ble_worker = None
         self.eeg_logger = EEGLogger(self.base_dir)
+        # 事件标记: 设备 trigger + LSL 标记流，EEGLogger 按时间戳写入每个录制文件的 .events.tsv
+        self.markers = EventMarker(trigger_sender=self.send_device_trigger, lsl=LSL_MARKERS_ON)
+        self.markers.add_listener(self.eeg_logger.add_marker)
         
         # 配置日志文件输出到实验文件夹
         if self.eeg_logger.save_path:
@@ -68,6 +101,8 @@ class MainWindow(QMainWindow):
             file_handler = logging.FileHandler(log_file_path, mode='a', encoding='utf-8')
             file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
             logging.getLogger().addHandler(file_handler)
+            # 控制台与文件输出均移到后台线程，避免阻塞采集与界面线程
+            install_queue_logging(logging.getLogger())
             logger.info(f"Log file moved to: {log_file_path}")
         
         # 应用样式
@@ -77,10 +112,9 @@ class MainWindow(QMainWindow):
         self.init_ui()
         self.load_songs()
         
-        # 定时器用于检查播放状态
-        self.play_timer = QTimer()
-        self.play_timer.setInterval(100) # 100ms 检查一次
-        self.play_timer.timeout.connect(self.check_playback_status)
+        # 播放结束检测：按歌曲时长精确定时，结束前才短间隔检测
+        self.playback_monitor = PlaybackMonitor(self)
+        self.playback_monitor.finished.connect(self.on_song_finished)
 
     def init_ui(self):
         central_widget = QWidget()
@@ -119,7 +153,7 @@ class MainWindow(QMainWindow):
         # 设备连接区
         dev_layout = QVBoxLayout()
         dev_layout.setSpacing(10)
-        dev_layout.addWidget(QLabel("蓝牙设备名称"))
+        dev_layout.addWidget(QLabel("蓝牙设备名称 (多台设备用逗号分隔)"))
         
         # 使用下拉框替代输入框，并允许手动输入
         self.device_combo = QComboBox()
@@ -223,7 +257,10 @@ class MainWindow(QMainWindow):
         for idx, filename in enumerate(mp3_files):
             name = os.path.splitext(filename)[0]
             music_path = os.path.join(self.music_dir, filename)
-            lyrics_path = os.path.join(self.lyrics_dir, name + ".txt")
+            # 带时间标签的 .lrc 优先于纯文本 .txt
+            lyrics_path = os.path.join(self.lyrics_dir, name + ".lrc")
+            if not os.path.exists(lyrics_path):
+                lyrics_path = os.path.join(self.lyrics_dir, name + ".txt")
             has_lyrics = os.path.exists(lyrics_path)
             
             song_data = {
@@ -272,7 +309,10 @@ class MainWindow(QMainWindow):
         
         # 使用实验文件夹作为日志路径
         log_path = self.eeg_logger.save_path if self.eeg_logger and self.eeg_logger.save_path else self.base_dir
-        self.ble_worker = BLEWorker(device_name, log_path)
+        capture_path = None
+        if RAW_CAPTURE_ON:
+            capture_path = os.path.join(log_path, f"ble_raw_{time.strftime('%H%M%S')}.bcap")
+        self.ble_worker = BLEWorker(device_name, log_path, capture_path, use_process=ACQUISITION_PROCESS_ON)
         self.ble_worker.status_changed.connect(self.update_status)
         self.ble_worker.connection_success.connect(self.on_connection_result)
         self.ble_worker.start()
@@ -284,6 +324,14 @@ class MainWindow(QMainWindow):
     def on_connection_result(self, success):
         self.btn_connect.setEnabled(True)
         if success:
+            # 多设备时每个设备分别录制；按歌曲统计丢包
+            device_names = self.ble_worker.device_names
+            self.eeg_logger.set_devices(device_names)
+            for name in device_names:
+                self.eeg_logger.set_link_stats_provider(partial(self.ble_worker.get_link_stats, name), name)
+            shared_inlet = self.ble_worker.make_shared_inlet()
+            if shared_inlet is not None:
+                self.eeg_logger.attach_inlet(shared_inlet)
             self.btn_start.setEnabled(True)
             self.btn_connect.setText("重新连接")
             self.show_message("成功", "设备连接成功！")
@@ -291,6 +339,15 @@ class MainWindow(QMainWindow):
             self.btn_start.setEnabled(False)
             self.show_message("失败", "设备连接失败，请查看日志或重试。", is_error=True)
 
+    @property
+    def device_trigger_ready(self):
+        return DEVICE_TRIGGER_ON and self.ble_worker is not None and self.ble_worker.connected
+
+    def send_device_trigger(self, code):
+        """向已连接的设备发送 trigger 码 (未连接时跳过)"""
+        if self.device_trigger_ready:
+            self.ble_worker.send_trigger(code)
+
     def start_experiment(self):
         self.current_playlist = []
         for card in self.song_cards:
@@ -308,8 +365,10 @@ class MainWindow(QMainWindow):
         # 创建并显示全屏窗口
         self.lyrics_window = LyricsWindow()
         self.lyrics_window.stop_signal.connect(self.on_experiment_aborted)
+        self.lyrics_window.line_shown.connect(self.on_lyric_line)
         
         self.lyrics_window.showFullScreen()
+        self.markers.experiment_start()
         
         # 立即开始第一首歌的流程（准备阶段）
         self.prepare_next_song()
@@ -320,6 +379,9 @@ class MainWindow(QMainWindow):
             self.finish_experiment()
             return
 
+        # 通常已在上一首播放时开始预加载，这里确保第一首 (或预加载失败的歌曲) 也已提交
+        self.prefetcher.prefetch(self.current_playlist[self.current_song_index])
+
         # 显示等待提示
         self.lyrics_window.set_text("等待实验开始")
         logger.info(f"Preparing song {self.current_song_index + 1}, waiting 3s...")
@@ -335,44 +397,101 @@ class MainWindow(QMainWindow):
             
         song = self.current_playlist[self.current_song_index]
         logger.info(f"Starting playback: {song['name']} (ID: {song['id']})")
-        
-        # 1. 开始单曲录制
+        self.pending_song = song
+        self.prefetch_deadline = time.monotonic() + PREFETCH_WAIT
+        self._start_when_prefetched()
+
+    def _start_when_prefetched(self):
+        """
+        预加载完成 (或等待超时) 后开始录制与播放
+        未完成时用短定时器重试，等待期间界面可响应 (ESC 可中断)，等待时间不计入录制
+        """
+        song = self.pending_song
+        if song is None:
+            return  # 等待期间实验已中断
+        if not self.prefetcher.ready(song) and time.monotonic() < self.prefetch_deadline:
+            QTimer.singleShot(PREFETCH_POLL_MS, self._start_when_prefetched)
+            return
+        self.pending_song = None
+
+        # 1. 取出预加载的音频与歌词
+        # 歌词在开始录制之前逐屏预绘制，播放后按音频时钟切换
+        stimulus = self.prefetcher.get(song)
+        if stimulus is None:
+            logger.warning(f"Stimulus not prefetched, falling back to streaming playback: {song['name']}")
+            lyrics, timed = parse_lyrics(read_lyrics(song))
+        else:
+            lyrics, timed = stimulus.lyrics, stimulus.lyrics_timed
+        self.lyrics_window.load_lines(lyrics)
+        self.lyrics_timed = timed
+        logger.info(f"Lyrics: {len(lyrics)} screens ({'LRC timed' if timed else 'untimed, static'})")
+
+        # 2. 开始单曲录制
         # 文件名格式: Category_{id}_{name}
         filename = f"Category_{song['id']}_{song['name']}"
         if self.eeg_logger:
             self.eeg_logger.start_recording(filename)
+        record_time = local_clock()
 
-        # 2. 加载并显示歌词
-        lyrics_text = f"正在播放: {song['name']}..."
-        if song['lyrics_path']:
-            try:
-                with open(song['lyrics_path'], 'r', encoding='utf-8') as f:
-                    lyrics_text = f.read()
-            except Exception as e:
-                logger.error(f"Failed to read lyrics: {e}")
-                lyrics_text = f"{song['name']}\n(读取歌词失败)"
-        else:
-            lyrics_text = f"{song['name']}\n(无歌词文件)"
-            
-        self.lyrics_window.set_text(lyrics_text)
-        
         # 3. 播放音乐
         try:
-            pygame.mixer.music.load(song['music_path'])
-            pygame.mixer.music.play()
+            channel = None
+            if stimulus is not None:
+                channel = stimulus.sound.play()
+                if channel is None:
+                    raise RuntimeError("no free mixer channel")
+            else:
+                pygame.mixer.music.load(song['music_path'])
+                pygame.mixer.music.play()
+            play_time = self.markers.song_start(song['id'], song['name'])
+            # play() 返回后声音还要经过一个混音器缓冲才输出，歌词按实际发声时刻切换
+            self.lyrics_window.start_lines(play_time + self.mixer_latency)
             self.is_playing = True
-            self.play_timer.start()
+            self.playback_monitor.start(stimulus.duration if stimulus else None, play_time, channel)
         except Exception as e:
             logger.error(f"Failed to play music: {e}")
             self.finish_experiment()
+            return
+
+        logger.info(
+            f"Onset delay | recording start -> play: {(play_time - record_time) * 1000:.1f} ms | "
+            f"+ mixer buffer {self.mixer_latency * 1000:.1f} ms | prefetched={stimulus is not None} | "
+            f"song={song['name']}"
+        )
+
+        # 4. 播放期间预加载下一首，只保留当前与下一首的解码数据
+        upcoming = self.current_playlist[self.current_song_index:self.current_song_index + 2]
+        self.prefetcher.keep_only(upcoming)
+        if len(upcoming) > 1:
+            self.prefetcher.prefetch(upcoming[1])
+
+    @property
+    def mixer_latency(self):
+        """play() 到声音输出的延迟 (秒)：一个混音器缓冲"""
+        init = pygame.mixer.get_init()
+        return MIXER_BUFFER / init[0] if init else 0.0
+
+    def on_lyric_line(self, index, timestamp):
+        """每屏 LRC 歌词显示时发送事件标记，便于按歌词截取 EEG；纯文本歌词没有演唱时刻，不发送"""
+        if self.is_playing and self.lyrics_timed:
+            song = self.current_playlist[self.current_song_index]
+            self.markers.lyric(song['id'], index, timestamp)
 
     def on_experiment_aborted(self):
         """处理实验中断（用户按ESC）"""
         logger.info("Experiment aborted by user (ESC pressed)")
-        self.play_timer.stop()
+        self.pending_song = None
+        self.playback_monitor.stop()
+        # 停止预加载 Sound 所在的通道及流式播放
+        pygame.mixer.stop()
         if pygame.mixer.music.get_busy():
             pygame.mixer.music.stop()
         self.is_playing = False
+        if self.current_song_index < len(self.current_playlist):
+            song = self.current_playlist[self.current_song_index]
+            self.markers.abort(song['id'], song['name'])
+        else:
+            self.markers.abort()
         
         # 停止记录 EEG
         if self.eeg_logger:
@@ -384,18 +503,30 @@ class MainWindow(QMainWindow):
         """(Deprecated) 已被分解为 prepare_next_song 和 start_song_playback"""
         pass
 
-    def check_playback_status(self):
-        if not pygame.mixer.music.get_busy() and self.is_playing:
-            self.is_playing = False
-            self.play_timer.stop()
-            self.on_song_finished()
-
-    def on_song_finished(self):
-        logger.info(f"Song finished: {self.current_playlist[self.current_song_index]['name']}")
-        
-        # 立即停止录制 (与音乐结束对齐)
-        if self.eeg_logger:
+    def on_song_finished(self, audio_end, detected):
+        """
+        播放结束 (PlaybackMonitor.finished)
+        :param audio_end: 音频结束的 LSL 时间
+        :param detected: 检测到结束的 LSL 时间
+        """
+        if not self.is_playing:
+            return
+        self.is_playing = False
+        self.lyrics_window.stop_lines()
+        song = self.current_playlist[self.current_song_index]
+        logger.info(f"Song finished: {song['name']}")
+        
+        # 停止录制 (与音乐结束对齐)；TRIM_TO_AUDIO 时先登记等待的结束 trigger 再发送，避免 trigger 先于等待状态到达
+        if self.eeg_logger and TRIM_TO_AUDIO:
+            self.eeg_logger.stop_recording(end_timestamp=audio_end,
+                                           until_code=CODE_SONG_END if self.device_trigger_ready else None)
+        self.markers.song_end(song['id'], song['name'], timestamp=audio_end)
+        if self.eeg_logger and not TRIM_TO_AUDIO:
             self.eeg_logger.stop_recording()
+        logger.info(
+            f"Audio end -> stop_recording latency: {(local_clock() - audio_end) * 1000:.1f} ms "
+            f"(detection {(detected - audio_end) * 1000:.1f} ms) | song={song['name']} | trim={TRIM_TO_AUDIO}"
+        )
         
         self.current_song_index += 1
         # 立即进入下一首歌的准备阶段
@@ -408,9 +539,10 @@ class MainWindow(QMainWindow):
 
     def finish_experiment(self):
         logger.info("Experiment finished")
+        self.markers.experiment_end()
         
-        # 确保录制已停止
-        if self.eeg_logger:
+        # 确保录制已停止 (最后一首歌正在截断到音频结束时由采集线程自行结束)
+        if self.eeg_logger and not self.eeg_logger.stop_pending:
             self.eeg_logger.stop_recording()
             
         if hasattr(self, 'lyrics_window'):
@@ -419,11 +551,12 @@ class MainWindow(QMainWindow):
 
     def closeEvent(self, event):
         if hasattr(self, 'eeg_logger') and self.eeg_logger:
-            self.eeg_logger.stop_recording()
+            self.eeg_logger.close()
             
         if self.ble_worker:
             self.ble_worker.stop()
             self.ble_worker.wait()
+        self.prefetcher.close()
         pygame.mixer.quit()
         event.accept()
 
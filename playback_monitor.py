@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+播放结束检测模块
+代替 100ms 轮询 get_busy：已知歌曲时长时按时长精确定时，只在预计结束前 LEAD_SECONDS 内以 5ms 间隔检测，
+时长未知时全程以 5ms 间隔检测；
+pygame 事件系统可用时同时使用 Channel / mixer.music 的 set_endevent。结束时发出 finished(音频结束时间, 检测到的时间)，
+均为 LSL 时间 (local_clock)，音频结束时间 = 开始播放时刻 + 歌曲时长 (时长未知时为检测时刻)。
+
+用法:
+    monitor = PlaybackMonitor()
+    monitor.finished.connect(on_song_finished)
+    channel = sound.play()
+    monitor.start(sound.get_length(), channel=channel)
+"""
+
+import logging
+
+import pygame
+from pylsl import local_clock
+from PyQt6.QtCore import QObject, QTimer, Qt, pyqtSignal
+
+END_EVENT = pygame.USEREVENT + 1
+LEAD_SECONDS = 0.25      # 预计结束前多久开始精细检测
+FINE_INTERVAL_MS = 5     # 精细检测间隔
+COARSE_INTERVAL_MS = 250 # 已知时长且距结束较远时的检测间隔上限
+
+logger = logging.getLogger("PlaybackMonitor")
+
+
+class PlaybackMonitor(QObject):
+    """
+    检测播放结束 (在界面线程中使用)：预加载的 Sound 所在的 Channel，或流式播放的 pygame.mixer.music
+    """
+    finished = pyqtSignal(float, float)  # (音频结束时间, 检测到结束的时间)
+
+    def __init__(self, parent=None, clock=local_clock):
+        super().__init__(parent)
+        self.clock = clock
+        self.play_time = None
+        self.duration = None
+        self.channel = None
+        # 只有 pygame 显示模块已初始化时事件队列才可用，不为此额外初始化 SDL 视频 (避免与 Qt 争抢窗口消息)
+        self.use_end_event = pygame.display.get_init()
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self._check)
+
+    @property
+    def active(self):
+        return self.play_time is not None
+
+    def start(self, duration=None, play_time=None, channel=None):
+        """
+        在 Sound.play() / pygame.mixer.music.play() 之后调用
+        :param duration: 歌曲时长 (秒)，未知时为 None
+        :param play_time: 开始播放的 LSL 时间，默认为当前时间
+        :param channel: Sound.play() 返回的 Channel；为 None 时检测 pygame.mixer.music
+        """
+        self.play_time = play_time if play_time is not None else self.clock()
+        self.duration = duration
+        self.channel = channel
+        if self.use_end_event:
+            (channel or pygame.mixer.music).set_endevent(END_EVENT)
+            pygame.event.clear(END_EVENT)
+        self._schedule()
+
+    def stop(self):
+        self.timer.stop()
+        self.play_time = None
+
+    def _schedule(self):
+        # 时长未知 (未预加载) 时无法推算结束时刻，全程以精细间隔检测，get_busy 开销可以忽略
+        interval = FINE_INTERVAL_MS
+        if self.duration:
+            interval = COARSE_INTERVAL_MS
+            remaining = self.play_time + self.duration - self.clock()
+            if remaining <= LEAD_SECONDS:
+                interval = FINE_INTERVAL_MS
+            else:
+                interval = min(interval, (remaining - LEAD_SECONDS) * 1000)
+        self.timer.start(max(int(interval), FINE_INTERVAL_MS))
+
+    def _ended(self):
+        if self.use_end_event and pygame.event.get(END_EVENT):
+            return True
+        return not (self.channel or pygame.mixer.music).get_busy()
+
+    def _check(self):
+        if not self.active:
+            return
+        if not self._ended():
+            self._schedule()
+            return
+        detected = self.clock()
+        # 实际提前结束 (时长不准) 时以检测时刻为准
+        audio_end = min(self.play_time + self.duration, detected) if self.duration else detected
+        self.play_time = None
+        self.finished.emit(audio_end, detected)
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+刺激预加载模块
+在后台线程中把歌曲完整解码为 pygame.mixer.Sound (PCM 常驻内存) 并读取、解析歌词时间轴，
+播放开始时只需 Sound.play()，解码与磁盘读取不再落在 EEG 录制窗口内。
+第 N 首播放时即开始预加载第 N+1 首；同时只保留当前与下一首，已播放的及时释放。
+
+用法:
+    prefetcher = StimulusPrefetcher()
+    prefetcher.prefetch(song)                   # 准备阶段 / 上一首播放时
+    if prefetcher.ready(song):                  # 界面线程中用定时器检查，不阻塞等待
+        stimulus = prefetcher.get(song)         # 未提交或加载失败时返回 None
+        channel = stimulus.sound.play()
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import pygame
+
+from timed_lyrics import parse_lyrics
+
+logger = logging.getLogger("StimulusPrefetch")
+
+
+def read_lyrics(song):
+    """读取歌词文本，失败或无歌词时返回提示文字"""
+    if not song.get('lyrics_path'):
+        return f"{song['name']}\n(无歌词文件)"
+    try:
+        with open(song['lyrics_path'], 'r', encoding='utf-8') as f:
+            return f.read()
+    except Exception as e:
+        logger.error(f"Failed to read lyrics: {e}")
+        return f"{song['name']}\n(读取歌词失败)"
+
+
+class PreparedStimulus:
+    """一首歌已解码的音频与歌词 (lyrics 为 [LyricLine]，lyrics_timed 表示歌词带 LRC 时间标签)"""
+
+    def __init__(self, song, sound, lyrics_text, load_seconds):
+        self.song = song
+        self.sound = sound
+        self.duration = sound.get_length()
+        self.lyrics_text = lyrics_text
+        self.lyrics, self.lyrics_timed = parse_lyrics(lyrics_text)
+        self.load_seconds = load_seconds
+
+
+class StimulusPrefetcher:
+    """单线程后台预加载，按音频路径缓存"""
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="StimulusPrefetch")
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load(song):
+        t0 = time.perf_counter()
+        sound = pygame.mixer.Sound(song['music_path'])
+        lyrics_text = read_lyrics(song)
+        stimulus = PreparedStimulus(song, sound, lyrics_text, time.perf_counter() - t0)
+        logger.info(f"Prefetched {song['name']}: {stimulus.duration:.1f}s audio in {stimulus.load_seconds:.2f}s")
+        return stimulus
+
+    def prefetch(self, song):
+        """提交后台预加载 (已提交的歌曲不重复加载)"""
+        with self._lock:
+            if song['music_path'] not in self._futures:
+                self._futures[song['music_path']] = self._executor.submit(self._load, song)
+
+    def ready(self, song):
+        """预加载已完成 (含失败) 或未提交时返回 True"""
+        with self._lock:
+            future = self._futures.get(song['music_path'])
+        return future is None or future.done()
+
+    def get(self, song, timeout=0.0):
+        """
+        取出预加载结果
+        :param timeout: 尚未完成时最多等待的秒数
+        :return: PreparedStimulus；未提交、超时或加载失败时返回 None
+        """
+        with self._lock:
+            future = self._futures.get(song['music_path'])
+        if future is None:
+            return None
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            logger.warning(f"Prefetch of {song['name']} not ready")
+        except Exception as e:
+            logger.error(f"Prefetch of {song['name']} failed: {e}")
+            self.discard(song)
+        return None
+
+    def discard(self, song):
+        """释放一首歌的解码数据"""
+        with self._lock:
+            future = self._futures.pop(song['music_path'], None)
+        if future is not None:
+            future.cancel()
+
+    def keep_only(self, songs):
+        """只保留给定歌曲 (当前与下一首) 的预加载结果"""
+        keep = {song['music_path'] for song in songs}
+        with self._lock:
+            dropped = [path for path in self._futures if path not in keep]
+            for path in dropped:
+                self._futures.pop(path).cancel()
+
+    def close(self):
+        with self._lock:
+            self._futures.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+PacketRingBuffer 帧头学习回归测试
+
+运行: python -m pytest -q tests
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from external_modules.packet_ring import PacketRingBuffer  # noqa: E402
+
+FRAME = 20
+HEADER = b"\x5A\xA5"
+
+
+def make_frames(count, first=0):
+    return [HEADER + bytes([(first + i) % 256]) + bytes([(first + i) * 7 % 256]) * (FRAME - 3)
+            for i in range(count)]
+
+
+def feed_fragmented(ring, data, size):
+    out = []
+    for start in range(0, len(data), size):
+        ring.feed(data[start:start + size])
+        out += [bytes(frame) for frame in ring.frames()]
+    return out
+
+
+def test_learns_header_from_fragmented_notifications():
+    ring = PacketRingBuffer(FRAME)
+    frames = make_frames(10)
+    out = feed_fragmented(ring, b"".join(frames), 7)
+    assert ring.sync_word == HEADER
+    assert out == frames[:len(out)]
+    assert len(out) >= 8
+
+
+def test_leading_partial_frame_is_skipped_when_learning():
+    ring = PacketRingBuffer(FRAME)
+    frames = make_frames(10)
+    out = feed_fragmented(ring, b"".join(frames)[5:], 6)
+    assert ring.sync_word == HEADER
+    assert out == frames[1:1 + len(out)]
+    assert len(out) >= 7
+
+
+def test_corrupt_first_frame_does_not_lock_header():
+    ring = PacketRingBuffer(FRAME)
+    frames = make_frames(10)
+    frames[0] = b"\x00\x00" + frames[0][2:]
+    out = []
+    for frame in frames:
+        ring.feed(frame)
+        out += [bytes(f) for f in ring.frames()]
+    assert ring.sync_word == HEADER
+    assert out == frames[1:1 + len(out)]
+
+
+def test_relearns_after_wrong_header():
+    ring = PacketRingBuffer(FRAME, relearn_after=4)
+    ring.sync_word = b"\x00\x00"    # 错误的帧头 (例如从损坏的数据中学得)
+    frames = make_frames(40)
+    out = feed_fragmented(ring, b"".join(frames), FRAME)
+    assert ring.relearn_count == 1
+    assert ring.sync_word == HEADER
+    assert out and out == frames[-len(out):]
+
+
+def test_fixed_header_is_never_relearned():
+    ring = PacketRingBuffer(FRAME, sync_word=b"\x00\x00", relearn_after=4)
+    feed_fragmented(ring, b"".join(make_frames(40)), FRAME)
+    assert ring.relearn_count == 0
+    assert ring.sync_word == b"\x00\x00"
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+SequenceTracker 回归测试
+
+运行: python -m pytest -q tests
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from external_modules.sequence_tracker import SequenceTracker  # noqa: E402
+
+
+def feed(tracker, seqs):
+    return [tracker.update(seq % tracker.modulo) for seq in seqs]
+
+
+def test_long_outage_resyncs_and_counts_loss():
+    # 150 个包 (约 1.5 s) 的中断超过半个周期，之后的包不应被永久当作重复包丢弃
+    tracker = SequenceTracker()
+    feed(tracker, range(0, 100))
+    results = feed(tracker, range(250, 400))
+    kept = [r for r in results if r >= 0]
+    assert results[:2] == [-1, -1]
+    assert results[2] == 152          # 150 个中断 + 重新同步前丢弃的 2 个
+    assert results[3:] == [0] * 147
+    assert len(kept) == 148
+    assert tracker.lost == 152
+    assert tracker.gap_events == 1
+    assert tracker.duplicates == 0
+    assert tracker.resyncs == 1
+
+
+def test_late_packets_are_still_duplicates():
+    tracker = SequenceTracker()
+    feed(tracker, range(0, 100))
+    assert feed(tracker, [97, 98, 99]) == [-1, -1, -1]
+    assert tracker.update(100) == 0
+    assert tracker.duplicates == 3
+    assert tracker.lost == 0
+    assert tracker.resyncs == 0
+
+
+def test_short_gap():
+    tracker = SequenceTracker()
+    feed(tracker, range(0, 10))
+    assert tracker.update(15) == 5
+    assert tracker.lost == 5
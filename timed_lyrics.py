@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+歌词时间轴解析模块
+支持 LRC 格式 ([mm:ss.xx] 时间标签，同一时间标签的多行 (原文 + 译文) 合为一屏)，按时间逐屏切换。
+没有时间标签的 Lyrics/*.txt 无法得知每句的演唱时刻，整首歌词作为一屏静态显示 (与原来一致)，
+按空行分组 (每组为原文 + 译文)，全文没有空行时每两行一组，组之间以空行分隔。
+
+用法:
+    lines, timed = parse_lyrics(text)
+    index = line_index_at(lines, elapsed)       # 当前应显示的屏，开始前为 -1
+"""
+
+import bisect
+import re
+
+LRC_TIME = re.compile(r"\[(\d+):(\d+(?:[.:]\d+)?)\]")
+LRC_OFFSET = re.compile(r"^\[offset:\s*([+-]?\d+)\s*\]$", re.IGNORECASE)
+LRC_META = re.compile(r"^\[[a-zA-Z]+:.*\]$")
+
+
+class LyricLine:
+    """一屏歌词：开始时间 (相对播放开始的秒数) 与各行文本"""
+    __slots__ = ('start', 'text')
+
+    def __init__(self, start, text):
+        self.start = start
+        self.text = text
+
+    def __repr__(self):
+        return f"LyricLine({self.start:.2f}, {self.text!r})"
+
+
+def parse_lrc(text):
+    """解析 LRC 歌词，没有时间标签时返回 None"""
+    offset = 0.0
+    entries = {}
+    for raw in text.splitlines():
+        raw = raw.strip()
+        match = LRC_OFFSET.match(raw)
+        if match:
+            # LRC 规定 offset 为毫秒，正值表示歌词提前
+            offset = -int(match.group(1)) / 1000.0
+            continue
+        tags = LRC_TIME.findall(raw)
+        if not tags:
+            continue
+        content = LRC_TIME.sub("", raw).strip()
+        for minutes, seconds in tags:
+            start = int(minutes) * 60 + float(seconds.replace(":", "."))
+            entries.setdefault(start, []).append(content)
+    if not entries:
+        return None
+    lines = []
+    for start in sorted(entries):
+        texts = [t for t in entries[start] if t]
+        lines.append(LyricLine(max(start + offset, 0.0), texts))
+    return lines
+
+
+def split_blocks(text):
+    """按空行分组；全文没有空行时每两行 (原文 + 译文) 一组"""
+    rows = [row.strip() for row in text.splitlines()]
+    rows = [row for row in rows if not LRC_META.match(row)]
+    if "" not in rows:
+        return [rows[i:i + 2] for i in range(0, len(rows), 2)]
+    blocks, current = [], []
+    for row in rows:
+        if row:
+            current.append(row)
+        elif current:
+            blocks.append(current)
+            current = []
+    if current:
+        blocks.append(current)
+    return blocks
+
+
+def parse_lyrics(text):
+    """
+    解析歌词文本
+    :return: ([LyricLine]，是否带时间标签)；没有时间标签时为从 0 秒开始的单屏，各组之间以 "" 分隔
+    """
+    lines = parse_lrc(text)
+    if lines is not None:
+        return lines, True
+    rows = []
+    for block in split_blocks(text):
+        rows += ([""] if rows else []) + block
+    return ([LyricLine(0.0, rows)] if rows else []), False
+
+
+def line_index_at(lines, elapsed):
+    """播放 elapsed 秒时应显示的屏序号，第一屏开始前为 -1"""
+    return bisect.bisect_right([line.start for line in lines], elapsed) - 1